@@ -0,0 +1,137 @@
+"""
+Сравнение стоимости выбора хендлера для одного сообщения:
+старая цепочка фильтров F.text.lower()... (каждый фильтр заново берет текст
+и приводит его к нижнему регистру) против индекса команд (один проход по дереву
+и проверки по словарю).
+
+Запуск: python bench_dispatch.py [количество сообщений]
+Нужен .env, как и для бота (импортируются роутеры), к БД и Telegram не обращается.
+"""
+import re
+import sys
+import time
+import random
+import datetime
+from aiogram import F, types
+from bot.handlers import groups
+from bot.utils.commands import CommandFilter, match_commands
+
+ORDINARY_MESSAGES = [
+    "привет всем", "как дела?", "ахахах", "кто-нибудь играет сегодня вечером?",
+    "ну такое", "спасибо, понял", "го в войс", "а где ссылка на чат",
+    "Доброе утро!", "это просто шедевр", "ок", "я тоже так думаю",
+]
+COMMAND_MESSAGES = [
+    "бан @spammer 1д флуд", "мут 30м", "профиль", "кто админ", "обнять @friend",
+    "напоить водой @friend", "топ реп", "баланс", "кланы", "данет сегодня будет дождь?",
+    "  обнять @friend",
+]
+
+
+def collect_filters():
+    """Все CommandFilter в порядке обхода роутеров aiogram."""
+    result = []
+
+    def walk(router):
+        for handler in router.message.handlers:
+            for flt in handler.filters or []:
+                if isinstance(flt.callback, CommandFilter):
+                    result.append((router, flt.callback))
+        for sub in router.sub_routers:
+            walk(sub)
+
+    walk(groups.router)
+    return result
+
+
+def legacy_filter(flt: CommandFilter):
+    """Фильтр в том виде, в котором он был записан до индекса команд."""
+    checks = []
+    if flt.prefixes:
+        if flt.with_caption:
+            prefixes, strip = flt.prefixes, flt.strip
+            checks.append(lambda m: (m.text or m.caption) and any(
+                ((m.text or m.caption).lower().strip() if strip else (m.text or m.caption).lower()).startswith(p)
+                for p in prefixes
+            ))
+        else:
+            checks.append(F.text.lower().startswith(flt.prefixes).resolve)
+    if flt.exact:
+        checks.append(F.text.lower().in_(set(flt.exact)).resolve)
+    if flt.words:
+        pattern = re.compile(r"(?i)^(?:" + "|".join(map(re.escape, flt.words)) + r")\b")
+        checks.append(F.text.regexp(pattern).resolve)
+    return lambda m: any(check(m) for check in checks)
+
+
+def make_message(text: str) -> types.Message:
+    return types.Message(
+        message_id=1,
+        date=datetime.datetime.now(),
+        chat=types.Chat(id=-100, type="supergroup"),
+        from_user=types.User(id=1, is_bot=False, first_name="Bench"),
+        text=text,
+    )
+
+
+def bench(fn, messages, rounds: int = 3) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for message in messages:
+            fn(message)
+        best = min(best, time.perf_counter() - start)
+    return best / len(messages) * 1e6
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    filters = collect_filters()
+    legacy = [legacy_filter(flt) for _, flt in filters]
+    # Хендлер определяется позицией его фильтра в порядке обхода роутеров
+    routers = {}
+    for position, (router, flt) in enumerate(filters):
+        routers.setdefault(id(router), []).append((position, flt.filter_id))
+    router_filters = list(routers.values())
+
+    random.seed(0)
+    # Примерно как в живом чате: большинство сообщений — не команды
+    texts = [
+        random.choice(COMMAND_MESSAGES) if random.random() < 0.1 else random.choice(ORDINARY_MESSAGES)
+        for _ in range(count)
+    ]
+    messages = [make_message(text) for text in texts]
+
+    def legacy_dispatch(message):
+        for position, check in enumerate(legacy):
+            if check(message):
+                return position
+        return None
+
+    def indexed_dispatch(message):
+        matched = match_commands(message)
+        # AnyCommandFilter: обычное сообщение отсекается сразу у каждого роутера
+        for router_entries in router_filters:
+            if not matched:
+                continue
+            for position, filter_id in router_entries:
+                if filter_id in matched:
+                    return position
+        return None
+
+    # Оба способа должны выбирать один и тот же хендлер
+    for text in ORDINARY_MESSAGES + COMMAND_MESSAGES:
+        message = make_message(text)
+        legacy_choice, indexed_choice = legacy_dispatch(message), indexed_dispatch(message)
+        assert legacy_choice == indexed_choice, (text, legacy_choice, indexed_choice)
+
+    legacy_us = bench(legacy_dispatch, messages)
+    indexed_us = bench(indexed_dispatch, messages)
+    print(f"Фильтров команд: {len(filters)}, роутеров: {len(router_filters)}, сообщений: {count}")
+    print(f"Цепочка фильтров F.text: {legacy_us:8.2f} мкс/сообщение")
+    print(f"Индекс команд:          {indexed_us:8.2f} мкс/сообщение")
+    print(f"Ускорение: x{legacy_us / indexed_us:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Стоимость одной отрисовки картинок профиля: без реестра шрифтов и шаблонов
+(как раньше — шрифты ищутся и загружаются, фон, сетка и все надписи рисуются
+на каждый запрос) против загруженных заранее шрифтов, готовых статичных слоев
+и кэша растеризованных надписей.
+Отдельно показано время без кодирования PNG, которое одинаково в обоих случаях.
+
+Запуск: python bench_render.py [количество отрисовок]
+К БД и Telegram не обращается.
+"""
+import sys
+import time
+import random
+from datetime import datetime, timedelta
+from bot.modules import images
+
+
+def cold():
+    """Сбрасывает реестр шрифтов, шаблоны и надписи — каждая отрисовка как до их появления."""
+    images._font_path.cache_clear()
+    images.get_font.cache_clear()
+    images._chart_template.cache_clear()
+    images._level_card_template.cache_clear()
+    images._text_sprite.cache_clear()
+    images._text_size.cache_clear()
+
+
+def bench(fn, args_list, before=None, rounds: int = 3) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for args in args_list:
+            if before:
+                before()
+            fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best / len(args_list) * 1000
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    random.seed(0)
+    start_day = datetime(2026, 1, 1)
+    charts = [
+        ([(start_day + timedelta(days=i), random.randint(0, 300)) for i in range(30)],)
+        for _ in range(count)
+    ]
+    cards = [
+        (f"User {i}", random.randint(0, 50), random.randint(0, 1000), 1000)
+        for i in range(count)
+    ]
+
+    # Без кодирования PNG: только рисование
+    encode = images._encode_png
+    images._encode_png = lambda image: image
+    try:
+        # Результат не должен зависеть от шаблонов
+        for render, args in ((images.render_activity_chart, charts[0]), (images.render_level_card, cards[0])):
+            cold()
+            expected = render(*args).tobytes()
+            assert render(*args).tobytes() == expected, render.__name__
+
+        draw_only = [
+            (name, bench(render, args_list, cold), bench(render, args_list))
+            for name, render, args_list in (
+                ("график активности", images.render_activity_chart, charts),
+                ("карточка уровня", images.render_level_card, cards),
+            )
+        ]
+    finally:
+        images._encode_png = encode
+
+    full = [
+        (bench(render, args_list, cold), bench(render, args_list))
+        for render, args_list in (
+            (images.render_activity_chart, charts),
+            (images.render_level_card, cards),
+        )
+    ]
+
+    print(f"Отрисовок каждого вида: {count}")
+    for (name, cold_ms, warm_ms), (cold_png_ms, warm_png_ms) in zip(draw_only, full):
+        print(f"{name}:")
+        print(f"  рисование:   {cold_ms:7.2f} мс -> {warm_ms:7.2f} мс (x{cold_ms / warm_ms:.1f})")
+        print(f"  вместе с PNG: {cold_png_ms:6.2f} мс -> {warm_png_ms:7.2f} мс (x{cold_png_ms / warm_png_ms:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import SecretStr
+from typing import Literal, Optional
 
 
 class Settings(BaseSettings):
@@ -8,6 +9,94 @@ class Settings(BaseSettings):
     supabase_url: str
     supabase_key: SecretStr
 
+    # Способ получения апдейтов: polling или webhook (за reverse proxy)
+    bot_mode: Literal["polling", "webhook"] = "polling"
+    webhook_url: str = ""  # Публичный адрес, например https://bot.example.com
+    webhook_path: str = "/webhook"
+    webhook_secret: Optional[SecretStr] = None  # X-Telegram-Bot-Api-Secret-Token (A-Z, a-z, 0-9, _ и -)
+    webhook_host: str = "0.0.0.0"
+    webhook_port: int = 8080
+    webhook_max_connections: int = 40
+    health_path: str = "/health"
+
+    # Шина инвалидаций кэшей между процессами: local (один процесс) или postgres (LISTEN/NOTIFY)
+    cache_bus: Literal["local", "postgres"] = "local"
+    database_url: Optional[SecretStr] = None  # postgresql://... (прямое подключение или pooler в режиме session)
+    cache_ttl: float = 300.0
+    cache_bus_ttl: float = 3600.0  # TTL кэшей настроек при cache_bus=postgres
+
+    # Несколько процессов-воркеров: апдейты раздаются по хэшу chat_id (1 — один процесс)
+    workers: int = 1
+    worker_queue_size: int = 10000  # Апдейтов в очереди одного воркера, сверх — отбрасываются
+    worker_restart_delay: float = 1.0
+    worker_stats_interval: float = 300.0  # Как часто логировать нагрузку по воркерам
+
+    # Пул HTTP-соединений к Supabase (PostgREST)
+    supabase_http2: bool = True
+    supabase_pool_size: int = 20  # Максимум одновременных запросов/соединений
+    supabase_pool_keepalive: int = 10  # Сколько соединений держать открытыми
+    supabase_keepalive_expiry: float = 30.0  # Секунды простоя до закрытия соединения
+    supabase_timeout: float = 10.0
+    supabase_connect_timeout: float = 5.0
+    supabase_queue_warn_ms: int = 200  # Предупреждать, если запрос ждал слота дольше
+    supabase_page_size: int = 1000  # Размер страницы при чтении больших выборок (не больше max-rows PostgREST)
+
+    # Как часто сбрасывать накопленную активность в БД (секунды)
+    activity_flush_interval: float = 30.0
+
+    # Запись имен пользователей в users: только изменения, пакетами
+    user_cache_flush_interval: float = 15.0
+    user_cache_fingerprint_ttl: float = 86400.0  # Раз в сутки имя перезаписывается, даже если не менялось
+    user_cache_fingerprint_size: int = 200000
+
+    # Лимиты исходящих запросов к Telegram (сообщений в секунду и размер всплеска)
+    telegram_global_rate: float = 30.0
+    telegram_global_burst: float = 30.0
+    telegram_chat_rate: float = 1.0  # Личные чаты
+    telegram_chat_burst: float = 3.0
+    telegram_group_rate: float = 20 / 60  # Группы: 20 сообщений в минуту
+    telegram_group_burst: float = 20.0
+    telegram_chat_buckets_max: int = 10000
+    telegram_max_retries: int = 3  # Повторы после TelegramRetryAfter
+
+    # Планировщик хендлеров: апдейты чата по очереди, общий лимит одновременных
+    scheduler_max_in_flight: int = 64
+    scheduler_shed_queue: int = 200  # Ожидающих больше — развлекательные апдейты отбрасываются сразу
+    scheduler_shed_wait: float = 10.0  # Развлекательный апдейт, ждавший дольше (в секундах), отбрасывается
+
+    # Отложенные события: истечение приглашений на дуэль и предложений брака
+    timer_tick: float = 1.0  # Точность срабатывания, в секундах
+    timer_sync_interval: float = 30.0  # Как часто подгружать из БД таймеры других процессов и после перезапуска
+    duel_invite_timeout: int = 120
+    marriage_proposal_timeout: int = 600
+
+    # Удаление истекших мутов, банов и варнов из БД
+    expiry_sweep_interval: float = 300.0
+    expiry_sweep_batch: int = 1000  # Строк из каждой таблицы за один вызов
+
+    # Очистка сообщений командой "удалить"
+    purge_max_messages: int = 500
+    purge_concurrency: int = 3  # Сколько вызовов deleteMessages (по 100 ID) выполняется одновременно
+    purge_single_concurrency: int = 5  # Сколько одиночных deleteMessage (если пачку отклонили) выполняется одновременно на весь бот
+
+    # Отрисовка картинок профиля в отдельных процессах
+    render_workers: int = 2
+    render_max_pending: int = 16  # Сверх этого профиль отправляется без картинки
+    render_timeout: float = 10.0
+    # Кэш готовых картинок профиля и их file_id в Telegram
+    image_cache_size: int = 200  # PNG в памяти (~15-40 КБ каждая)
+    file_id_cache_size: int = 20000
+    image_cache_ttl: float = 86400.0
+
+    # Очередь фоновых задач (обновление кэша пользователей и т.п.)
+    work_queue_size: int = 1000  # При переполнении новые задачи отбрасываются
+    work_queue_workers: int = 4
+    work_queue_drain_timeout: float = 10.0  # Сколько ждать выполнения очереди при остановке
+
+    # Синхронизация черного списка антиспама (секунды)
+    blacklist_sync_interval: float = 60.0  # Догрузка новых записей
+    blacklist_full_sync_interval: float = 3600.0  # Полная перезагрузка (учитывает удаления)
+
     model_config = SettingsConfigDict(env_file='.env', env_file_encoding='utf-8', extra='ignore')
 
 
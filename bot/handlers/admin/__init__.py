@@ -1,3 +1,5 @@
 from aiogram import Router
+from bot.utils.scheduler import set_update_class, CLASS_DEFAULT
 
 router = Router()
+set_update_class(router, CLASS_DEFAULT)
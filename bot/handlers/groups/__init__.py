@@ -1,4 +1,7 @@
 from aiogram import Router
+from bot.utils.scheduler import (
+    set_update_class, CLASS_MODERATION, CLASS_ECONOMY, CLASS_DEFAULT, CLASS_ENTERTAINMENT
+)
 
 from .moderation import router as moderation_router
 from .events import router as events_router
@@ -29,6 +32,23 @@ from .antispam import router as antispam_router
 from .module_management import router as module_mgmt_router
 from .permission_management import router as permission_mgmt_router
 
+# Классы для планировщика: модерация получает слоты первой,
+# развлекательные команды при перегрузке отбрасываются
+for _router in (moderation_router, antispam_router, events_router, module_mgmt_router, permission_mgmt_router):
+    set_update_class(_router, CLASS_MODERATION)
+for _router in (economy_router, reputation_router, clans_router, clubs_router, marriages_router):
+    set_update_class(_router, CLASS_ECONOMY)
+for _router in (
+    duels_router, roulette_router, relationships_router, jokes_router, shippering_router,
+    repeat_router, yesno_router, who_router, choose_router
+):
+    set_update_class(_router, CLASS_ENTERTAINMENT)
+for _router in (
+    weather_router, ranks_router, invites_router, nicknames_router, profile_router,
+    welcome_router, info_router, ping_router, catalog_router
+):
+    set_update_class(_router, CLASS_DEFAULT)
+
 router = Router()
 router.include_router(module_mgmt_router)
 router.include_router(permission_mgmt_router)
@@ -1,14 +1,16 @@
 from aiogram import Router, types, F
-from bot.utils.db_manager import add_antispam_report, is_user_blacklisted
+from bot.utils.db_manager import add_antispam_report
+from bot.utils.blacklist_sync import antispam_blacklist
 from bot.utils.filters import ModuleEnabledFilter
+from bot.utils.commands import CommandFilter, AnyCommandFilter
 import logging
 
 router = Router()
 # Применяем фильтр модуля ко всему роутеру
-router.message.filter(F.chat.type.in_({"group", "supergroup"}), ModuleEnabledFilter("antispam"))
+router.message.filter(AnyCommandFilter(), F.chat.type.in_({"group", "supergroup"}), ModuleEnabledFilter("antispam"))
 router.chat_member.filter(ModuleEnabledFilter("antispam"))
 
-@router.message(F.text.lower().startswith(".жб антиспам"))
+@router.message(CommandFilter(".жб антиспам"))
 async def handle_antispam_report(message: types.Message):
     """Обрабатывает жалобу на спам."""
     target_user = None
@@ -59,6 +61,7 @@ async def handle_antispam_report(message: types.Message):
 
     # 3. Если пользователь только что попал в ЧС — кикаем его
     if res.get("is_blacklisted"):
+        antispam_blacklist.add(target_user.id)
         try:
             await message.chat.ban(user_id=target_user.id)
             await message.answer(
@@ -75,7 +78,7 @@ async def on_user_join(event: types.ChatMemberUpdated):
     # Проверяем только если пользователь вступил или был разбанен
     if event.new_chat_member.status in ["member", "administrator"]:
         user_id = event.new_chat_member.user.id
-        if await is_user_blacklisted(user_id):
+        if antispam_blacklist.contains(user_id):
             try:
                 await event.chat.ban(user_id=user_id)
                 # Опционально: написать в чат, почему кикнули
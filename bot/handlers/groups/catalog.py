@@ -5,15 +5,16 @@ from bot.utils.db_manager import (
     add_catalog_request, get_catalog_chat, update_catalog_link, delete_catalog_link, get_approved_chats
 )
 from bot.utils.filters import ModuleEnabledFilter
+from bot.utils.commands import CommandFilter, AnyCommandFilter
 import logging
 
 router = Router()
-router.message.filter(F.chat.type.in_({"group", "supergroup"}), ModuleEnabledFilter("catalog"))
+router.message.filter(AnyCommandFilter(), F.chat.type.in_({"group", "supergroup"}), ModuleEnabledFilter("catalog"))
 
 # Константы
 CATALOG_MIN_BALANCE = 35000
 
-@router.message(F.text.lower() == "каталог добавить")
+@router.message(CommandFilter(exact="каталог добавить"))
 async def handle_catalog_add(message: types.Message):
     """Подает заявку на добавление чата в каталог."""
     # 1. Проверяем баланс чата
@@ -72,7 +73,7 @@ async def process_cat_add(callback: types.CallbackQuery):
         await callback.message.edit_text("❌ Ошибка при подаче заявки.")
     await callback.answer()
 
-@router.message(F.text.lower().startswith("+чат"))
+@router.message(CommandFilter("+чат"))
 async def handle_set_link(message: types.Message):
     """Устанавливает ссылку на чат."""
     parts = message.text.split(maxsplit=1)
@@ -97,7 +98,7 @@ async def handle_set_link(message: types.Message):
     else:
         await message.reply("❌ Ошибка при обновлении ссылки.")
 
-@router.message(F.text.lower().startswith("-чат"))
+@router.message(CommandFilter("-чат"))
 async def handle_remove_link(message: types.Message):
     """Удаляет ссылку на чат."""
     # Проверяем, есть ли чат в каталоге
@@ -112,7 +113,7 @@ async def handle_remove_link(message: types.Message):
     else:
         await message.reply("❌ Ошибка при удалении ссылки.")
 
-@router.message(F.text.lower() == "каталог")
+@router.message(CommandFilter(exact="каталог"))
 async def handle_catalog_list(message: types.Message):
     """Показывает категории каталога."""
     categories = await get_catalog_categories()
@@ -2,11 +2,12 @@ import random
 import re
 from aiogram import Router, types, F
 from bot.utils.filters import ModuleEnabledFilter
+from bot.utils.commands import CommandFilter, AnyCommandFilter
 
 router = Router()
-router.message.filter(F.chat.type.in_({"group", "supergroup"}), ModuleEnabledFilter("choose"))
+router.message.filter(AnyCommandFilter(), F.chat.type.in_({"group", "supergroup"}), ModuleEnabledFilter("choose"))
 
-@router.message(F.text.regexp(r"(?i)^!?выбери\b"))
+@router.message(CommandFilter(words=("выбери", "!выбери")))
 async def handle_choose(message: types.Message):
     """Выбирает один из предложенных вариантов."""
     text = message.text
@@ -11,12 +11,13 @@ from bot.utils.db_manager import (
     apply_once_level_bonus
 )
 from bot.utils.filters import RankFilter, ModuleEnabledFilter
+from bot.utils.commands import CommandFilter, AnyCommandFilter
 import re
 
 router = Router()
-router.message.filter(F.chat.type.in_({"group", "supergroup"}), ModuleEnabledFilter("clans"))
+router.message.filter(AnyCommandFilter(), F.chat.type.in_({"group", "supergroup"}), ModuleEnabledFilter("clans"))
 
-@router.message(F.text.lower().startswith("+клан"))
+@router.message(CommandFilter("+клан"))
 async def handle_create_clan(message: types.Message):
     """Создает новый клан. Формат: +клан Название"""
     parts = message.text.split(maxsplit=1)
@@ -48,7 +49,7 @@ async def handle_create_clan(message: types.Message):
     else:
         await message.reply("❌ Произошла ошибка при создании клана.")
 
-@router.message(F.text.lower().startswith("-клан"))
+@router.message(CommandFilter("-клан"))
 async def handle_delete_or_leave_clan(message: types.Message):
     """Удаляет клан (если создатель) или выходит из него. Формат: -клан"""
     user_clan = await get_user_clan(message.chat.id, message.from_user.id)
@@ -65,7 +66,7 @@ async def handle_delete_or_leave_clan(message: types.Message):
         await leave_clan(message.chat.id, message.from_user.id)
         await message.reply(f"🚪 Вы покинули клан <b>{user_clan['name']}</b>.")
 
-@router.message(F.text.lower().startswith("клан "))
+@router.message(CommandFilter("клан "))
 async def handle_join_clan(message: types.Message):
     """Вступает в клан. Формат: клан Название"""
     parts = message.text.split(maxsplit=1)
@@ -89,7 +90,7 @@ async def handle_join_clan(message: types.Message):
     else:
         await message.reply("❌ Не удалось вступить в клан.")
 
-@router.message(F.text.lower() == "клан")
+@router.message(CommandFilter(exact="клан"))
 async def handle_my_clan(message: types.Message):
     """Показывает клан пользователя."""
     user_clan = await get_user_clan(message.chat.id, message.from_user.id)
@@ -104,7 +105,7 @@ async def handle_my_clan(message: types.Message):
     
     await message.reply(text, parse_mode="HTML")
 
-@router.message(F.text.lower() == "кланы")
+@router.message(CommandFilter(exact="кланы"))
 async def handle_clans_list(message: types.Message):
     """Показывает список всех кланов чата."""
     clans = await get_all_clans(message.chat.id)
@@ -11,12 +11,13 @@ from bot.utils.db_manager import (
     apply_once_level_bonus
 )
 from bot.utils.filters import RankFilter, ModuleEnabledFilter
+from bot.utils.commands import CommandFilter, AnyCommandFilter
 import re
 
 router = Router()
-router.message.filter(F.chat.type.in_({"group", "supergroup"}), ModuleEnabledFilter("clubs"))
+router.message.filter(AnyCommandFilter(), F.chat.type.in_({"group", "supergroup"}), ModuleEnabledFilter("clubs"))
 
-@router.message(F.text.lower().startswith("+кружок"))
+@router.message(CommandFilter("+кружок"))
 async def handle_create_club(message: types.Message):
     """Создает новый кружок. Формат: +кружок Название"""
     parts = message.text.split(maxsplit=1)
@@ -42,7 +43,7 @@ async def handle_create_club(message: types.Message):
     else:
         await message.reply("❌ Произошла ошибка при создании кружка.")
 
-@router.message(F.text.lower().startswith("-кружок"))
+@router.message(CommandFilter("-кружок"))
 async def handle_delete_or_leave_club(message: types.Message):
     """Удаляет кружок (если создатель) или выходит из него. Формат: -кружок Название"""
     parts = message.text.split(maxsplit=1)
@@ -73,7 +74,7 @@ async def handle_delete_or_leave_club(message: types.Message):
         await leave_club(message.chat.id, club["id"], message.from_user.id)
         await message.reply(f"🚪 Вы покинули кружок <b>{club['name']}</b>.")
 
-@router.message(F.text.lower().startswith("кружок "))
+@router.message(CommandFilter("кружок "))
 async def handle_join_club(message: types.Message):
     """Вступает в кружок. Формат: кружок Название"""
     parts = message.text.split(maxsplit=1)
@@ -94,7 +95,7 @@ async def handle_join_club(message: types.Message):
     else:
         await message.reply("❌ Не удалось вступить в кружок.")
 
-@router.message(F.text.lower() == "кружок")
+@router.message(CommandFilter(exact="кружок"))
 async def handle_my_clubs(message: types.Message):
     """Показывает кружки пользователя."""
     user_clubs = await get_user_clubs(message.chat.id, message.from_user.id)
@@ -110,7 +111,7 @@ async def handle_my_clubs(message: types.Message):
     
     await message.reply(text, parse_mode="HTML")
 
-@router.message(F.text.lower() == "кружки")
+@router.message(CommandFilter(exact="кружки"))
 async def handle_clubs_list(message: types.Message):
     """Показывает список всех кружков чата."""
     clubs = await get_all_clubs(message.chat.id)
@@ -1,14 +1,16 @@
 import random
-import asyncio
-from aiogram import Router, types, F
+from aiogram import Bot, Router, types, F
 from aiogram.filters.callback_data import CallbackData
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from bot.utils.db_manager import get_mention_by_id, update_user_cache
+from bot.utils.db_manager import get_mention_by_id, get_mentions_by_ids, update_user_cache
 from bot.handlers.groups.moderation import get_target_id
 from bot.utils.filters import ModuleEnabledFilter
+from bot.utils.commands import CommandFilter, AnyCommandFilter
+from bot.utils.timers import timer_service
+from bot.config_reader import config
 
 router = Router()
-router.message.filter(ModuleEnabledFilter(module_id="duels"))
+router.message.filter(AnyCommandFilter(), ModuleEnabledFilter(module_id="duels"))
 router.callback_query.filter(ModuleEnabledFilter(module_id="duels"))
 
 # Callback data для дуэлей
@@ -18,9 +20,27 @@ class DuelAction(CallbackData, prefix="duel"):
     target_id: int
     current_turn: int = 0
 
-# Хранилище активных дуэлей и приглашений
-active_duels = {}
-pending_invitations = {} # {message_id: bool}
+def invitation_key(chat_id: int, message_id: int) -> str:
+    """Ключ таймера истечения приглашения (приглашение — сообщение с кнопками)."""
+    return f"duel:{chat_id}:{message_id}"
+
+async def expire_invitations(bot: Bot, timers: list):
+    """Авто-отмена приглашений, на которые не ответили вовремя."""
+    mentions = await get_mentions_by_ids(list({timer["payload"]["target_id"] for timer in timers}))
+    for timer in timers:
+        chat_id = timer["chat_id"]
+        target_mention = mentions[timer["payload"]["target_id"]]
+        try:
+            await bot.edit_message_reply_markup(chat_id=chat_id, message_id=timer["payload"]["message_id"], reply_markup=None)
+            await bot.send_message(
+                chat_id,
+                f"⏰ Время вызова истекло. {target_mention} так и не решился принять дуэль.",
+                parse_mode="HTML"
+            )
+        except Exception:
+            pass
+
+timer_service.register("duel_invite", expire_invitations)
 
 def get_duel_keyboard(challenger_id, target_id, is_invitation=True, current_turn=None):
     builder = InlineKeyboardBuilder()
@@ -33,7 +53,7 @@ def get_duel_keyboard(challenger_id, target_id, is_invitation=True, current_turn
     builder.adjust(2)
     return builder.as_markup()
 
-@router.message(F.text.lower().startswith("дуэль"))
+@router.message(CommandFilter("дуэль"))
 async def handle_duel_command(message: types.Message):
     """Приглашение на дуэль."""
     target_user_id, _ = await get_target_id(message, "дуэль")
@@ -51,37 +71,25 @@ async def handle_duel_command(message: types.Message):
         await message.reply("🤖 Я не участвую в дуэлях, у меня встроенный аимбот.")
         return
 
-    challenger_mention = await get_mention_by_id(message.from_user.id)
-    target_mention = await get_mention_by_id(target_user_id)
+    mentions = await get_mentions_by_ids([message.from_user.id, target_user_id])
+    challenger_mention, target_mention = mentions[message.from_user.id], mentions[target_user_id]
     
     sent_message = await message.answer(
         f"⚔️ {challenger_mention} вызывает на дуэль {target_mention}!\n\n"
         f"{target_mention}, вы принимаете вызов?\n"
-        f"<i>⏳ Предложение автоматически отклонится через 2 минуты.</i>",
+        f"<i>⏳ Предложение автоматически отклонится через {config.duel_invite_timeout // 60} мин.</i>",
         reply_markup=get_duel_keyboard(message.from_user.id, target_user_id),
         parse_mode="HTML"
     )
 
-    # Логика авто-отмены через 2 минуты
-    msg_id = sent_message.message_id
-    pending_invitations[msg_id] = True
-    
-    async def auto_cancel_duel(chat_id, message_id, target_mention):
-        await asyncio.sleep(120)
-        if pending_invitations.get(message_id):
-            try:
-                await message.bot.edit_message_reply_markup(chat_id=chat_id, message_id=message_id, reply_markup=None)
-                await message.bot.send_message(
-                    chat_id, 
-                    f"⏰ Время вызова истекло. {target_mention} так и не решился принять дуэль.",
-                    parse_mode="HTML"
-                )
-            except Exception:
-                pass
-            finally:
-                pending_invitations.pop(message_id, None)
-
-    asyncio.create_task(auto_cancel_duel(message.chat.id, msg_id, target_mention))
+    # Авто-отмена, если вызов не принят вовремя (переживает перезапуск бота)
+    await timer_service.schedule(
+        invitation_key(message.chat.id, sent_message.message_id),
+        "duel_invite",
+        config.duel_invite_timeout,
+        chat_id=message.chat.id,
+        payload={"message_id": sent_message.message_id, "target_id": target_user_id}
+    )
 
 @router.callback_query(DuelAction.filter(F.action == "accept"))
 async def accept_duel(callback: types.CallbackQuery, callback_data: DuelAction):
@@ -89,18 +97,20 @@ async def accept_duel(callback: types.CallbackQuery, callback_data: DuelAction):
         await callback.answer("❌ Это не ваш вызов!", show_alert=True)
         return
 
+    # Убираем из ожидающих; если таймер уже сработал — вызов истек
+    if not await timer_service.cancel(invitation_key(callback.message.chat.id, callback.message.message_id)):
+        await callback.answer("⏰ Время вызова истекло.", show_alert=True)
+        return
+
     challenger_id = callback_data.challenger_id
     target_id = callback_data.target_id
     
     # Определяем, кто ходит первым
     first_turn = random.choice([challenger_id, target_id])
     
-    challenger_mention = await get_mention_by_id(challenger_id)
-    target_mention = await get_mention_by_id(target_id)
-    first_mention = await get_mention_by_id(first_turn)
-    
-    # Убираем из ожидающих
-    pending_invitations.pop(callback.message.message_id, None)
+    mentions = await get_mentions_by_ids([challenger_id, target_id])
+    challenger_mention, target_mention = mentions[challenger_id], mentions[target_id]
+    first_mention = mentions[first_turn]
     
     await callback.message.edit_text(
         f"🔔 Дуэль между {challenger_mention} и {target_mention} началась!\n\n"
@@ -115,9 +125,12 @@ async def decline_duel(callback: types.CallbackQuery, callback_data: DuelAction)
         await callback.answer("❌ Это не ваш вызов!", show_alert=True)
         return
 
-    target_mention = await get_mention_by_id(callback_data.target_id)
     # Убираем из ожидающих
-    pending_invitations.pop(callback.message.message_id, None)
+    if not await timer_service.cancel(invitation_key(callback.message.chat.id, callback.message.message_id)):
+        await callback.answer("⏰ Время вызова истекло.", show_alert=True)
+        return
+
+    target_mention = await get_mention_by_id(callback_data.target_id)
     
     # Убираем кнопки у старого сообщения
     try:
@@ -138,8 +151,8 @@ async def handle_duel_turn(callback: types.CallbackQuery, callback_data: DuelAct
     current_player_id = callback.from_user.id
     opponent_id = target_id if current_player_id == challenger_id else challenger_id
     
-    current_mention = await get_mention_by_id(current_player_id)
-    opponent_mention = await get_mention_by_id(opponent_id)
+    mentions = await get_mentions_by_ids([current_player_id, opponent_id])
+    current_mention, opponent_mention = mentions[current_player_id], mentions[opponent_id]
     
     if callback_data.action == "air":
         await callback.message.edit_text(
@@ -1,18 +1,19 @@
 from aiogram import Router, types, F
 from bot.utils.db_manager import get_user_balance, transfer_coins, update_user_balance
 from bot.utils.filters import ModuleEnabledFilter
+from bot.utils.commands import CommandFilter, AnyCommandFilter
 import logging
 
 router = Router()
-router.message.filter(F.chat.type.in_({"group", "supergroup"}), ModuleEnabledFilter("economy"))
+router.message.filter(AnyCommandFilter(), F.chat.type.in_({"group", "supergroup"}), ModuleEnabledFilter("economy"))
 
-@router.message(F.text.lower().in_({"баланс", "кошелек", "счет"}))
+@router.message(CommandFilter(exact={"баланс", "кошелек", "счет"}))
 async def handle_balance(message: types.Message):
     """Показывает баланс пользователя."""
     balance = await get_user_balance(message.from_user.id)
     await message.reply(f"💰 Ваш текущий баланс: <code>{balance}</code> койнов.", parse_mode="HTML")
 
-@router.message(F.text.lower().startswith("передать"))
+@router.message(CommandFilter("передать"))
 async def handle_transfer(message: types.Message):
     """Передача койнов другому пользователю."""
     # 1. Проверяем наличие реплея
@@ -50,7 +51,7 @@ async def handle_transfer(message: types.Message):
     else:
         await message.reply("❌ У вас недостаточно койнов для перевода.")
 
-@router.message(F.text.lower().startswith("выдать"), F.from_user.id == 510134446) # ID создателя для теста
+@router.message(CommandFilter("выдать"), F.from_user.id == 510134446) # ID создателя для теста
 async def handle_give_coins(message: types.Message):
     """Админская команда для выдачи койнов (только для создателя)."""
     if not message.reply_to_message:
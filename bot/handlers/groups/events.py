@@ -1,8 +1,8 @@
 from aiogram import Router, types, F
 from bot.utils.db_manager import (
-    is_user_banned, is_user_muted, update_user_cache, 
-    get_user_mention_with_nickname, update_user_activity, save_inviter
+    is_user_banned, is_user_muted, update_user_cache, save_inviter
 )
+from bot.utils.update_context import UpdateContext
 from bot.keyboards.moderation_keyboards import get_auto_ban_kb
 import logging
 
@@ -12,7 +12,7 @@ router = Router()
 router.message.filter(F.chat.type.in_({"group", "supergroup"}))
 
 @router.message(F.new_chat_members)
-async def on_user_join(message: types.Message):
+async def on_user_join(message: types.Message, ctx: UpdateContext):
     """
     Срабатывает, когда пользователь вступает в чат или его приглашают.
     """
@@ -41,7 +41,7 @@ async def on_user_join(message: types.Message):
             try:
                 # Перебаниваем пользователя
                 await message.chat.ban(user_id=user.id)
-                user_mention = await get_user_mention_with_nickname(user)
+                user_mention = await ctx.mention(user)
                 await message.answer(
                     f"⚠️ Внимание! {user_mention} (ID: <code>{user.id}</code>) "
                     f"был забанен ранее и возвращен в бан-лист автоматически.",
@@ -56,7 +56,7 @@ async def on_user_join(message: types.Message):
                 # Накладываем мут повторно
                 permissions = types.ChatPermissions(can_send_messages=False)
                 await message.chat.restrict(user_id=user.id, permissions=permissions)
-                user_mention = await get_user_mention_with_nickname(user)
+                user_mention = await ctx.mention(user)
                 await message.answer(
                     f"🤐 {user_mention} вернулся, но его мут ещё не истек. Права ограничены автоматически.",
                     parse_mode="HTML"
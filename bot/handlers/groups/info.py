@@ -1,11 +1,12 @@
 import random
 from aiogram import Router, types, F
 from bot.utils.filters import ModuleEnabledFilter
+from bot.utils.commands import CommandFilter, AnyCommandFilter
 
 router = Router()
-router.message.filter(F.chat.type.in_({"group", "supergroup"}), ModuleEnabledFilter("info"))
+router.message.filter(AnyCommandFilter(), F.chat.type.in_({"group", "supergroup"}), ModuleEnabledFilter("info"))
 
-@router.message(F.text.regexp(r"(?i)^!?инфа\b"))
+@router.message(CommandFilter(words=("инфа", "!инфа")))
 async def handle_info(message: types.Message):
     """Выдает рандомный шанс информации."""
     # Убираем команду из текста
@@ -1,9 +1,12 @@
-from aiogram import Router, types, F
+from aiogram import Router, types
 from bot.utils.db_manager import get_inviter, get_mention_by_id, update_user_cache
+from bot.utils.commands import CommandFilter, AnyCommandFilter
 
 router = Router()
+# Обычные сообщения (не команды) сразу пропускают роутер
+router.message.filter(AnyCommandFilter())
 
-@router.message(F.text.lower().in_(["кто тебя пригласил", "кто тебя добавил", "кто пригласил", "кто добавил"]))
+@router.message(CommandFilter(exact=["кто тебя пригласил", "кто тебя добавил", "кто пригласил", "кто добавил"]))
 async def handle_who_invited_command(message: types.Message):
     """
     Обработчик команды 'кто тебя пригласил' / 'кто тебя добавил'.
@@ -1,18 +1,23 @@
-import asyncio
 from datetime import datetime
-from aiogram import Router, types, F
+from aiogram import Bot, Router, types, F
 from aiogram.filters.callback_data import CallbackData
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from bot.utils.db_manager import (
     get_mention_by_id,
+    get_mentions_by_ids,
     create_marriage,
     get_marriage,
     remove_marriage,
     apply_once_level_bonus
 )
 from bot.handlers.groups.moderation import get_target_id
+from bot.utils.commands import CommandFilter, AnyCommandFilter
+from bot.utils.timers import timer_service
+from bot.config_reader import config
 
 router = Router()
+# Обычные сообщения (не команды) сразу пропускают роутер
+router.message.filter(AnyCommandFilter())
 
 # Callback data для браков
 class MarriageAction(CallbackData, prefix="marriage"):
@@ -27,6 +32,29 @@ def get_marriage_keyboard(proposer_id, target_id):
     builder.adjust(2)
     return builder.as_markup()
 
+def proposal_key(chat_id: int, message_id: int) -> str:
+    """Ключ таймера истечения предложения (предложение — сообщение с кнопками)."""
+    return f"marriage:{chat_id}:{message_id}"
+
+async def expire_proposals(bot: Bot, timers: list):
+    """Снимает предложения, на которые не ответили вовремя."""
+    user_ids = {timer["payload"]["proposer_id"] for timer in timers} | {timer["payload"]["target_id"] for timer in timers}
+    mentions = await get_mentions_by_ids(list(user_ids))
+    for timer in timers:
+        payload = timer["payload"]
+        try:
+            await bot.edit_message_text(
+                f"⏰ {mentions[payload['target_id']]} так и не ответил(а) на предложение "
+                f"{mentions[payload['proposer_id']]}. Предложение истекло.",
+                chat_id=timer["chat_id"],
+                message_id=payload["message_id"],
+                parse_mode="HTML"
+            )
+        except Exception:
+            pass
+
+timer_service.register("marriage_proposal", expire_proposals)
+
 def get_marriage_status(days):
     if days < 1: return "Молодожёны 💍"
     if days < 7: return "Медовый месяц 🍯"
@@ -36,7 +64,7 @@ def get_marriage_status(days):
     if days < 365: return "Золотой стандарт 🌟"
     return "Вечная любовь ∞"
 
-@router.message(F.text.lower().startswith("брак"))
+@router.message(CommandFilter("брак"))
 async def marriage_invite(message: types.Message):
     target_user_id, _ = await get_target_id(message, "брак")
     
@@ -62,22 +90,35 @@ async def marriage_invite(message: types.Message):
         await message.reply("❌ Этот пользователь уже состоит в браке.")
         return
 
-    proposer_mention = await get_mention_by_id(message.from_user.id)
-    target_mention = await get_mention_by_id(target_user_id)
+    mentions = await get_mentions_by_ids([message.from_user.id, target_user_id])
+    proposer_mention, target_mention = mentions[message.from_user.id], mentions[target_user_id]
     
-    await message.answer(
+    sent_message = await message.answer(
         f"💖 {proposer_mention} делает предложение руки и сердца {target_mention}!\n\n"
-        f"{target_mention}, вы согласны вступить в брак?",
+        f"{target_mention}, вы согласны вступить в брак?\n"
+        f"<i>⏳ Предложение действует {config.marriage_proposal_timeout // 60} мин.</i>",
         reply_markup=get_marriage_keyboard(message.from_user.id, target_user_id),
         parse_mode="HTML"
     )
 
+    await timer_service.schedule(
+        proposal_key(message.chat.id, sent_message.message_id),
+        "marriage_proposal",
+        config.marriage_proposal_timeout,
+        chat_id=message.chat.id,
+        payload={"message_id": sent_message.message_id, "proposer_id": message.from_user.id, "target_id": target_user_id}
+    )
+
 @router.callback_query(MarriageAction.filter(F.action == "accept"))
 async def accept_marriage(callback: types.CallbackQuery, callback_data: MarriageAction):
     if callback.from_user.id != callback_data.target_id:
         await callback.answer("❌ Это предложение не вам!", show_alert=True)
         return
 
+    if not await timer_service.cancel(proposal_key(callback.message.chat.id, callback.message.message_id)):
+        await callback.answer("⏰ Предложение истекло.", show_alert=True)
+        return
+
     proposer_id = callback_data.proposer_id
     target_id = callback_data.target_id
     
@@ -91,8 +132,8 @@ async def accept_marriage(callback: types.CallbackQuery, callback_data: Marriage
     await apply_once_level_bonus(proposer_id, "marriage", 200)
     await apply_once_level_bonus(target_id, "marriage", 200)
     
-    proposer_mention = await get_mention_by_id(proposer_id)
-    target_mention = await get_mention_by_id(target_id)
+    mentions = await get_mentions_by_ids([proposer_id, target_id])
+    proposer_mention, target_mention = mentions[proposer_id], mentions[target_id]
     
     await callback.message.edit_text(
         f"🎉 Поздравляем! {proposer_mention} и {target_mention} теперь официально в браке! 🥳💍\n\n"
@@ -106,13 +147,17 @@ async def decline_marriage(callback: types.CallbackQuery, callback_data: Marriag
         await callback.answer("❌ Это предложение не вам!", show_alert=True)
         return
 
+    if not await timer_service.cancel(proposal_key(callback.message.chat.id, callback.message.message_id)):
+        await callback.answer("⏰ Предложение истекло.", show_alert=True)
+        return
+
     target_mention = await get_mention_by_id(callback_data.target_id)
     await callback.message.edit_text(
         f"💔 {target_mention} отклонил(а) предложение руки и сердца... Сердце разбито.",
         parse_mode="HTML"
     )
 
-@router.message(F.text.lower() == "мой брак")
+@router.message(CommandFilter(exact="мой брак"))
 async def my_marriage(message: types.Message):
     marriage = await get_marriage(message.from_user.id)
     
@@ -138,7 +183,7 @@ async def my_marriage(message: types.Message):
         parse_mode="HTML"
     )
 
-@router.message(F.text.lower() == "развод")
+@router.message(CommandFilter(exact="развод"))
 async def divorce(message: types.Message):
     marriage = await get_marriage(message.from_user.id)
     
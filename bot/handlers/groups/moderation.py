@@ -7,10 +7,12 @@ from bot.modules.awards import give_award, remove_award_index
 from bot.modules.moderation import delete_messages
 from bot.utils.time_parser import parse_duration
 from bot.utils.filters import AdminFilter, RankFilter
+from bot.utils.commands import CommandFilter, AnyCommandFilter
 from bot.utils.db_manager import (
     get_user_id_by_username, get_mention_by_id, 
-    update_user_cache, can_user_modify_other, get_user_rank_context
+    update_user_cache
 )
+from bot.utils.update_context import UpdateContext
 from bot.config_reader import config
 from bot.keyboards.moderation_keyboards import ModAction
 import re
@@ -19,7 +21,7 @@ import logging
 router = Router()
 
 # Фильтр для проверки, что команда отправлена в группе или супергруппе
-router.message.filter(F.chat.type.in_({"group", "supergroup"}))
+router.message.filter(AnyCommandFilter(), F.chat.type.in_({"group", "supergroup"}))
 
 async def get_target_id(message: types.Message, command_name: str):
     """
@@ -89,8 +91,8 @@ async def get_target_id(message: types.Message, command_name: str):
 
     return None, command_args
 
-@router.message(F.text.lower().startswith("бан"), RankFilter(action_id="ban"))
-async def handle_ban_command(message: types.Message):
+@router.message(CommandFilter("бан"), RankFilter(action_id="ban"))
+async def handle_ban_command(message: types.Message, ctx: UpdateContext):
     # Проверка прав самого бота
     bot_member = await message.chat.get_member(message.bot.id)
     if not bot_member.status in ["administrator", "creator"]:
@@ -114,7 +116,7 @@ async def handle_ban_command(message: types.Message):
         command_args = command_args.replace(duration_str, '', 1).strip()
 
     # Ограничения по рангам
-    admin_rank, _, is_admin_super = await get_user_rank_context(message.from_user.id, message.chat)
+    admin_rank, _, is_admin_super = await ctx.rank()
     
     # Модератор (3) может банить максимум на 3 дня
     if admin_rank == 3:
@@ -123,7 +125,7 @@ async def handle_ban_command(message: types.Message):
             return
     
     # Проверка иерархии
-    if not await can_user_modify_other(message.from_user.id, target_user_id, message.chat):
+    if not await ctx.can_modify(target_user_id):
         target_mention = await get_mention_by_id(target_user_id)
         await message.reply(f"❌ Вы не можете применить это действие к пользователю {target_mention} (иерархия).", parse_mode="HTML")
         return
@@ -133,7 +135,7 @@ async def handle_ban_command(message: types.Message):
 
     await ban_user(message, target_user_id, duration, reason)
 
-@router.message(F.text.lower().startswith("разбан"), RankFilter(action_id="ban"))
+@router.message(CommandFilter("разбан"), RankFilter(action_id="ban"))
 async def handle_unban_command(message: types.Message):
     bot_member = await message.chat.get_member(message.bot.id)
     if not bot_member.status in ["administrator", "creator"]:
@@ -148,8 +150,8 @@ async def handle_unban_command(message: types.Message):
 
     await unban_user(message, target_user_id)
 
-@router.message(F.text.lower().startswith("мут"), RankFilter(action_id="mute"))
-async def handle_mute_command(message: types.Message):
+@router.message(CommandFilter("мут"), RankFilter(action_id="mute"))
+async def handle_mute_command(message: types.Message, ctx: UpdateContext):
     """
     Обработчик команды 'мут'.
     """
@@ -166,15 +168,15 @@ async def handle_mute_command(message: types.Message):
         return
 
     # Проверка иерархии
-    if not await can_user_modify_other(message.from_user.id, target_user_id, message.chat):
+    if not await ctx.can_modify(target_user_id):
         target_mention = await get_mention_by_id(target_user_id)
         await message.reply(f"❌ Вы не можете применить это действие к пользователю {target_mention} (иерархия).", parse_mode="HTML")
         return
         
     await mute_user(message, target_user_id, command_args)
 
-@router.message(F.text.lower().startswith("кик"), RankFilter(action_id="ban"))
-async def handle_kick_command(message: types.Message):
+@router.message(CommandFilter("кик"), RankFilter(action_id="ban"))
+async def handle_kick_command(message: types.Message, ctx: UpdateContext):
     """
     Обработчик команды 'кик'.
     """
@@ -191,7 +193,7 @@ async def handle_kick_command(message: types.Message):
         return
 
     # Проверка иерархии
-    if not await can_user_modify_other(message.from_user.id, target_user_id, message.chat):
+    if not await ctx.can_modify(target_user_id):
         target_mention = await get_mention_by_id(target_user_id)
         await message.reply(f"❌ Вы не можете применить это действие к пользователю {target_mention} (иерархия).", parse_mode="HTML")
         return
@@ -207,7 +209,7 @@ async def handle_kick_command(message: types.Message):
         logging.error(f"Ошибка при кике: {e}")
         await message.reply("❌ Не удалось кикнуть пользователя. Возможно, у меня недостаточно прав или пользователь является администратором Telegram.")
 
-@router.message(F.text.lower().startswith("размут"), RankFilter(action_id="mute"))
+@router.message(CommandFilter("размут"), RankFilter(action_id="mute"))
 async def handle_unmute_command(message: types.Message):
     """
     Обработчик команды 'размут'.
@@ -226,8 +228,8 @@ async def handle_unmute_command(message: types.Message):
         
     await unmute_user(message, target_user_id)
 
-@router.message(F.text.lower().startswith("варн"), RankFilter(action_id="warn"))
-async def handle_warn_command(message: types.Message):
+@router.message(CommandFilter("варн"), RankFilter(action_id="warn"))
+async def handle_warn_command(message: types.Message, ctx: UpdateContext):
     """
     Обработчик команды 'варн' и 'варны'.
     """
@@ -250,15 +252,15 @@ async def handle_warn_command(message: types.Message):
         return
 
     # Проверка иерархии
-    if not await can_user_modify_other(message.from_user.id, target_user_id, message.chat):
+    if not await ctx.can_modify(target_user_id):
         target_mention = await get_mention_by_id(target_user_id)
         await message.reply(f"❌ Вы не можете применить это действие к пользователю {target_mention} (иерархия).", parse_mode="HTML")
         return
         
-    await warn_user(message, target_user_id, command_args)
+    await warn_user(message, target_user_id, command_args, ctx)
 
-@router.message(F.text.lower().startswith("разварн"), RankFilter(action_id="warn"))
-async def handle_unwarn_command(message: types.Message):
+@router.message(CommandFilter("разварн"), RankFilter(action_id="warn"))
+async def handle_unwarn_command(message: types.Message, ctx: UpdateContext):
     """
     Обработчик команды 'разварн'.
     """
@@ -269,15 +271,15 @@ async def handle_unwarn_command(message: types.Message):
         return
         
     # Проверка иерархии
-    if not await can_user_modify_other(message.from_user.id, target_user_id, message.chat):
+    if not await ctx.can_modify(target_user_id):
         target_mention = await get_mention_by_id(target_user_id)
         await message.reply(f"❌ Вы не можете изменять предупреждения пользователя {target_mention} (иерархия).", parse_mode="HTML")
         return
 
     await unwarn_user(message, target_user_id)
 
-@router.message(F.text.lower().startswith("-варн"), RankFilter(action_id="warn"))
-async def handle_remove_warn_index_command(message: types.Message):
+@router.message(CommandFilter("-варн"), RankFilter(action_id="warn"))
+async def handle_remove_warn_index_command(message: types.Message, ctx: UpdateContext):
     """
     Обработчик команды '-варн @тег номер'.
     """
@@ -308,15 +310,15 @@ async def handle_remove_warn_index_command(message: types.Message):
         return
             
     # Проверка иерархии
-    if not await can_user_modify_other(message.from_user.id, target_user_id, message.chat):
+    if not await ctx.can_modify(target_user_id):
         target_mention = await get_mention_by_id(target_user_id)
         await message.reply(f"❌ Вы не можете изменять предупреждения пользователя {target_mention} (иерархия).", parse_mode="HTML")
         return
 
     await remove_warn_index(message, target_user_id, index)
 
-@router.message(F.text.lower().startswith("-награда"), RankFilter(min_rank=5))
-async def handle_remove_award_command(message: types.Message):
+@router.message(CommandFilter("-награда"), RankFilter(min_rank=5))
+async def handle_remove_award_command(message: types.Message, ctx: UpdateContext):
     """
     Обработчик команды '-награда @тег номер'.
     """
@@ -341,15 +343,15 @@ async def handle_remove_award_command(message: types.Message):
         return
             
     # Проверка иерархии
-    if not await can_user_modify_other(message.from_user.id, target_user_id, message.chat):
+    if not await ctx.can_modify(target_user_id):
         target_mention = await get_mention_by_id(target_user_id)
         await message.reply(f"❌ Вы не можете удалять награды этого пользователя (иерархия).", parse_mode="HTML")
         return
 
     await remove_award_index(message, target_user_id, index)
 
-@router.message(F.text.lower().startswith("выдать награду"), RankFilter(min_rank=3))
-async def handle_give_award_command(message: types.Message):
+@router.message(CommandFilter("выдать награду"), RankFilter(min_rank=3))
+async def handle_give_award_command(message: types.Message, ctx: UpdateContext):
     """
     Обработчик команды 'Выдать награду @тег текст'.
     """
@@ -367,7 +369,7 @@ async def handle_give_award_command(message: types.Message):
         return
         
     # Проверка иерархии
-    admin_rank, _, is_admin_super = await get_user_rank_context(message.from_user.id, message.chat)
+    admin_rank, _, is_admin_super = await ctx.rank()
     
     # Логика: 5 ранг (Создатель/Супер) может давать награды всем, кроме самого себя.
     # Но если это Глобальный Создатель (из конфига), он может и себе.
@@ -379,15 +381,15 @@ async def handle_give_award_command(message: types.Message):
 
     # Если не 5 ранг и не глобальный создатель, проверяем обычную иерархию
     if admin_rank < 5 and not is_global_creator:
-        if not await can_user_modify_other(message.from_user.id, target_user_id, message.chat):
+        if not await ctx.can_modify(target_user_id):
             target_mention = await get_mention_by_id(target_user_id)
             await message.reply(f"❌ Вы не можете выдавать награды этому пользователю (иерархия).", parse_mode="HTML")
             return
 
-    await give_award(message, target_user_id, command_args)
+    await give_award(message, target_user_id, command_args, ctx)
 
-@router.message(F.text.lower().startswith("очиститьварны"), RankFilter(min_rank=5))
-async def handle_clear_warns_command(message: types.Message):
+@router.message(CommandFilter("очиститьварны"), RankFilter(min_rank=5))
+async def handle_clear_warns_command(message: types.Message, ctx: UpdateContext):
     """
     Обработчик команды 'очиститьварны'.
     """
@@ -398,14 +400,14 @@ async def handle_clear_warns_command(message: types.Message):
         return
         
     # Проверка иерархии
-    if not await can_user_modify_other(message.from_user.id, target_user_id, message.chat):
+    if not await ctx.can_modify(target_user_id):
         target_mention = await get_mention_by_id(target_user_id)
         await message.reply(f"❌ Вы не можете очистить варны пользователя {target_mention} (иерархия).", parse_mode="HTML")
         return
 
     await clear_user_warns(message, target_user_id)
 
-@router.message(F.text.lower().startswith("удалить"), RankFilter(min_rank=3))
+@router.message(CommandFilter("удалить"), RankFilter(min_rank=3))
 async def handle_delete_command(message: types.Message):
     # Проверка прав на удаление
     bot_member = await message.chat.get_member(message.bot.id)
@@ -423,9 +425,9 @@ async def handle_delete_command(message: types.Message):
             await message.reply("❌ Укажите число сообщений для удаления.")
             return
     
-    if count > 10:
-        count = 10
-        await message.reply("⚠️ Максимум 10 сообщений.")
+    if count > config.purge_max_messages:
+        count = config.purge_max_messages
+        await message.reply(f"⚠️ Максимум {count} сообщений.")
 
     await delete_messages(message, count)
 
@@ -1,10 +1,13 @@
-from aiogram import Router, types, F
+from aiogram import Router, types
 from bot.utils.db_manager import get_disabled_modules, toggle_module
 from bot.utils.filters import RankFilter
+from bot.utils.commands import CommandFilter, AnyCommandFilter
 import re
 import logging
 
 router = Router()
+# Обычные сообщения (не команды) сразу пропускают роутер
+router.message.filter(AnyCommandFilter())
 
 # Доступные модули для управления
 AVAILABLE_MODULES = {
@@ -28,9 +31,7 @@ AVAILABLE_MODULES = {
 }
 
 @router.message(
-    F.text.lower().startswith(".кд лист")
-    | F.text.lower().startswith("/кд лист")
-    | F.text.lower().startswith("!кд лист"),
+    CommandFilter(".кд лист", "/кд лист", "!кд лист"),
     RankFilter(min_rank=3),
 )
 async def handle_module_list(message: types.Message):
@@ -49,9 +50,7 @@ async def handle_module_list(message: types.Message):
         await message.answer("❌ Произошла ошибка при выводе списка модулей.")
 
 @router.message(
-    F.text.lower().startswith(".кд")
-    | F.text.lower().startswith("/кд")
-    | F.text.lower().startswith("!кд"),
+    CommandFilter(".кд", "/кд", "!кд"),
     RankFilter(min_rank=3),
 )
 async def handle_module_toggle(message: types.Message):
@@ -1,14 +1,15 @@
 from aiogram import Router, types, F
 from bot.utils.db_manager import set_nickname, remove_nickname, get_mention_by_id
 from bot.handlers.groups.moderation import get_target_id
+from bot.utils.commands import CommandFilter, AnyCommandFilter
 import logging
 
 router = Router()
 
 # Фильтр для проверки, что событие произошло в группе или супергруппе
-router.message.filter(F.chat.type.in_({"group", "supergroup"}))
+router.message.filter(AnyCommandFilter(), F.chat.type.in_({"group", "supergroup"}))
 
-@router.message(F.text.lower().startswith("+ник"))
+@router.message(CommandFilter("+ник"))
 async def handle_set_nickname_command(message: types.Message):
     """
     Команда '+Ник (никнейм)'
@@ -33,7 +34,7 @@ async def handle_set_nickname_command(message: types.Message):
     await set_nickname(message.from_user.id, nickname)
     await message.reply(f"✅ Теперь во всех группах я буду называть вас: <b>{nickname}</b>", parse_mode="HTML")
 
-@router.message(F.text.lower().startswith("-ник"))
+@router.message(CommandFilter("-ник"))
 async def handle_remove_nickname_command(message: types.Message):
     """
     Команда '-Ник'
@@ -44,7 +45,7 @@ async def handle_remove_nickname_command(message: types.Message):
     else:
         await message.reply("❌ у вас и так нет кастомного никнейма.")
 
-@router.message(F.text.lower().startswith(("назначить ник", "назначить никнейм", "назначить имя")))
+@router.message(CommandFilter("назначить ник", "назначить никнейм", "назначить имя"))
 async def handle_set_nickname_other(message: types.Message):
     """
     Обработчик команд 'Назначить ник/никнейм/имя @тег ник'.
@@ -1,10 +1,13 @@
-from aiogram import Router, types, F
+from aiogram import Router, types
 from bot.utils.db_manager import get_permission_settings, set_permission_rank, RANKS
 from bot.utils.filters import RankFilter
+from bot.utils.commands import CommandFilter, AnyCommandFilter
 import re
 import logging
 
 router = Router()
+# Обычные сообщения (не команды) сразу пропускают роутер
+router.message.filter(AnyCommandFilter())
 
 # Действия, права на которые можно настраивать
 # По умолчанию берем значения, которые обычно используются в фильтрах
@@ -18,9 +21,7 @@ MODERATION_ACTIONS = {
 }
 
 @router.message(
-    F.text.lower().startswith(".права лист")
-    | F.text.lower().startswith("/права лист")
-    | F.text.lower().startswith("!права лист"),
+    CommandFilter(".права лист", "/права лист", "!права лист"),
     RankFilter(min_rank=5),
 )
 async def handle_permissions_list(message: types.Message):
@@ -41,9 +42,7 @@ async def handle_permissions_list(message: types.Message):
         await message.answer("❌ Произошла ошибка при выводе списка прав.")
 
 @router.message(
-    F.text.lower().startswith(".права")
-    | F.text.lower().startswith("/права")
-    | F.text.lower().startswith("!права"),
+    CommandFilter(".права", "/права", "!права"),
     RankFilter(min_rank=5),
 )
 async def handle_permission_change(message: types.Message):
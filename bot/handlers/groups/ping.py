@@ -1,11 +1,12 @@
 import time
 from aiogram import Router, types, F
 from bot.utils.filters import ModuleEnabledFilter
+from bot.utils.commands import CommandFilter, AnyCommandFilter
 
 router = Router()
-router.message.filter(F.chat.type.in_({"group", "supergroup"}), ModuleEnabledFilter("ping"))
+router.message.filter(AnyCommandFilter(), F.chat.type.in_({"group", "supergroup"}), ModuleEnabledFilter("ping"))
 
-@router.message(F.text.regexp(r"(?i)^!?пинг\b"))
+@router.message(CommandFilter(words=("пинг", "!пинг")))
 async def handle_ping(message: types.Message):
     """Проверяет пинг бота."""
     start_time = time.time()
@@ -1,21 +1,22 @@
 from aiogram import Router, types, F
-from bot.modules.profile import get_user_profile, generate_level_card_image
+from bot.modules.profile import get_user_profile, get_level_card_photo, remember_photo
 from bot.handlers.groups.moderation import get_target_id
 from bot.keyboards.profile_keyboards import ProfileAction, get_profile_kb, get_level_kb
 from bot.utils.db_manager import (
     set_description, remove_description, get_description, 
-    get_awards, get_mention_by_id, set_city, remove_city, get_city,
+    get_awards, get_mention_by_id, get_mentions_by_ids, set_city, remove_city, get_city,
     set_quote, remove_quote, get_quote, get_user_level
 )
+from bot.utils.commands import CommandFilter, AnyCommandFilter
 import re
 import logging
 
 router = Router()
 
 # Фильтр для проверки, что событие произошло в группе или супергруппе
-router.message.filter(F.chat.type.in_({"group", "supergroup"}))
+router.message.filter(AnyCommandFilter(), F.chat.type.in_({"group", "supergroup"}))
 
-@router.message(F.text.lower().startswith("+описание"))
+@router.message(CommandFilter("+описание"))
 async def handle_set_description(message: types.Message):
     """
     Устанавливает описание профиля.
@@ -33,7 +34,7 @@ async def handle_set_description(message: types.Message):
     await set_description(message.from_user.id, new_desc)
     await message.reply("✅ Описание профиля обновлено!")
 
-@router.message(F.text.lower().startswith("+город"))
+@router.message(CommandFilter("+город"))
 async def handle_set_city(message: types.Message):
     """
     Устанавливает город в профиле.
@@ -51,7 +52,7 @@ async def handle_set_city(message: types.Message):
     await set_city(message.from_user.id, city_name)
     await message.reply(f"✅ В профиль добавлен город: <b>{city_name}</b>", parse_mode="HTML")
 
-@router.message(F.text.lower().startswith("+цитата"))
+@router.message(CommandFilter("+цитата"))
 async def handle_set_quote(message: types.Message):
     """
     Устанавливает цитату в профиле.
@@ -69,7 +70,7 @@ async def handle_set_quote(message: types.Message):
     await set_quote(message.from_user.id, new_quote)
     await message.reply("✅ Цитата профиля обновлена!")
 
-@router.message(F.text.lower().startswith("-город"))
+@router.message(CommandFilter("-город"))
 async def handle_remove_city(message: types.Message):
     """
     Удаляет город из профиля.
@@ -79,7 +80,7 @@ async def handle_remove_city(message: types.Message):
     else:
         await message.reply("❌ В вашем профиле не был указан город.")
 
-@router.message(F.text.lower().startswith("-цитата"))
+@router.message(CommandFilter("-цитата"))
 async def handle_remove_quote(message: types.Message):
     """
     Удаляет цитату из профиля.
@@ -89,7 +90,7 @@ async def handle_remove_quote(message: types.Message):
     else:
         await message.reply("❌ У вас не было установлено цитаты.")
 
-@router.message(F.text.lower().startswith("-описание"))
+@router.message(CommandFilter("-описание"))
 async def handle_remove_description(message: types.Message):
     """
     Удаляет описание профиля.
@@ -124,8 +125,9 @@ async def handle_profile_callbacks(query: types.CallbackQuery, callback_data: Pr
             return
             
         response = f"🏆 <b>Награды пользователя {target_mention}:</b>\n\n"
+        mentions = await get_mentions_by_ids(award["from_id"] for award in awards)
         for i, award in enumerate(awards, 1):
-            from_mention = await get_mention_by_id(award["from_id"])
+            from_mention = mentions[award["from_id"]]
             response += f"награда [{i}] | {award['text']} (от {from_mention})\n"
         
         response += f"\nЧтобы убрать награду, используйте:\n<code>-награда (тег) (номер)</code>"
@@ -156,7 +158,7 @@ async def handle_profile_callbacks(query: types.CallbackQuery, callback_data: Pr
         except:
             username = "Пользователь"
             
-        card_buf = await generate_level_card_image(target_user_id, username)
+        card_key, photo = await get_level_card_photo(target_user_id, username, level_data)
         
         text = (
             f"⭐ <b>Уровень пользователя {target_mention}</b>\n\n"
@@ -167,20 +169,20 @@ async def handle_profile_callbacks(query: types.CallbackQuery, callback_data: Pr
             f"💡 <a href='https://telegra.ph/Pomoshch-po-komandam-01-11#Уровень-пользователя'>Как получить опыт?</a>"
         )
         
-        if card_buf:
-            photo = types.BufferedInputFile(card_buf.getvalue(), filename=f"level_{target_user_id}.png")
+        if photo:
             if query.message.photo:
-                await query.message.edit_media(
+                sent = await query.message.edit_media(
                     media=types.InputMediaPhoto(media=photo, caption=text, parse_mode="HTML"),
                     reply_markup=get_level_kb(target_user_id)
                 )
             else:
-                await query.message.answer_photo(
+                sent = await query.message.answer_photo(
                     photo=photo,
                     caption=text,
                     parse_mode="HTML",
                     reply_markup=get_level_kb(target_user_id)
                 )
+            remember_photo(card_key, sent)
         else:
             # Фолбэк на текст, если картинка не сгенерилась
             if query.message.photo:
@@ -191,16 +193,16 @@ async def handle_profile_callbacks(query: types.CallbackQuery, callback_data: Pr
 
     elif callback_data.action == "back":
         # Возвращаемся к обычному тексту профиля с графиком активности
-        from bot.modules.profile import build_profile_text, generate_activity_chart
-        profile_text, has_quote = await build_profile_text(query.message, target_user_id)
-        chart_buf = await generate_activity_chart(target_user_id)
+        from bot.modules.profile import build_profile_text, get_activity_chart_photo
+        profile_text, has_quote, series = await build_profile_text(query.message, target_user_id)
+        chart_key, photo = await get_activity_chart_photo(target_user_id, series=series)
         
-        if query.message.photo and chart_buf:
-            photo = types.BufferedInputFile(chart_buf.getvalue(), filename=f"chart_{target_user_id}.png")
-            await query.message.edit_media(
+        if query.message.photo and photo:
+            sent = await query.message.edit_media(
                 media=types.InputMediaPhoto(media=photo, caption=profile_text, parse_mode="HTML"),
                 reply_markup=get_profile_kb(target_user_id, has_quote=has_quote)
             )
+            remember_photo(chart_key, sent)
         elif query.message.photo:
             await query.message.edit_caption(
                 caption=profile_text,
@@ -215,7 +217,7 @@ async def handle_profile_callbacks(query: types.CallbackQuery, callback_data: Pr
             )
         await query.answer()
 
-@router.message(F.text.lower().regexp(r'^(кто ты|ты кто|профиль|кто такой|кто я)'))
+@router.message(CommandFilter("кто ты", "ты кто", "профиль", "кто такой", "кто я"))
 async def handle_profile_command(message: types.Message):
     """
     Обработчик команд профиля (кто ты, ты кто, профиль, кто такой, кто я).
@@ -246,7 +248,7 @@ async def handle_profile_command(message: types.Message):
         
     await get_user_profile(message, target_user_id)
 
-@router.message(F.text.lower().in_({"награды", "мои награды"}))
+@router.message(CommandFilter(exact={"награды", "мои награды"}))
 async def handle_my_awards_command(message: types.Message):
     """
     Показывает награды отправителя сообщения.
@@ -260,8 +262,9 @@ async def handle_my_awards_command(message: types.Message):
         return
         
     response = f"🏆 <b>Ваши награды ({target_mention}):</b>\n\n"
+    mentions = await get_mentions_by_ids(award["from_id"] for award in awards)
     for i, award in enumerate(awards, 1):
-        from_mention = await get_mention_by_id(award["from_id"])
+        from_mention = mentions[award["from_id"]]
         response += f"награда [{i}] | {award['text']} (от {from_mention})\n"
     
     response += f"\nЧтобы убрать награду, используйте:\n<code>-награда (номер)</code>"
@@ -1,21 +1,23 @@
 from aiogram import Router, types, F
 from bot.modules.profile import get_user_profile
 from bot.utils.db_manager import (
-    set_rank, get_rank, get_mention_by_id, RANKS, 
-    get_all_ranked_users, get_user_rank_context, can_user_modify_other,
-    set_group_rank_names, get_group_rank_name
+    set_rank, get_rank, get_mention_by_id, get_mentions_by_ids, RANKS, 
+    get_all_ranked_users,
+    set_group_rank_names, get_group_rank_name, get_chat_admins
 )
 from bot.handlers.groups.moderation import get_target_id
 from bot.utils.filters import AdminFilter, RankFilter
+from bot.utils.commands import CommandFilter, AnyCommandFilter
+from bot.utils.update_context import UpdateContext
 from bot.config_reader import config
 import re
 
 router = Router()
 
 # Фильтр для проверки, что событие произошло в группе или супергруппе
-router.message.filter(F.chat.type.in_({"group", "supergroup"}))
+router.message.filter(AnyCommandFilter(), F.chat.type.in_({"group", "supergroup"}))
 
-@router.message(F.text.lower().in_({"помощь", "/help"}))
+@router.message(CommandFilter(exact={"помощь", "/help"}))
 async def handle_help_command(message: types.Message):
     """
     Выводит информационное сообщение со ссылками на обучающие статьи.
@@ -39,8 +41,8 @@ def parse_rank_level(args_str):
         return int(match.group(1))
     return None
 
-@router.message(F.text.lower().startswith("назначить"), RankFilter(min_rank=5))
-async def handle_set_rank_command(message: types.Message):
+@router.message(CommandFilter("назначить"), RankFilter(min_rank=5))
+async def handle_set_rank_command(message: types.Message, ctx: UpdateContext):
     target_user_id, command_args = await get_target_id(message, "назначить")
     
     if not target_user_id:
@@ -48,7 +50,7 @@ async def handle_set_rank_command(message: types.Message):
         return
 
     # Проверка иерархии
-    if not await can_user_modify_other(message.from_user.id, target_user_id, message.chat):
+    if not await ctx.can_modify(target_user_id):
         await message.reply("❌ Вы не можете изменять ранг этого пользователя (иерархия).", parse_mode="HTML")
         return
 
@@ -62,7 +64,7 @@ async def handle_set_rank_command(message: types.Message):
         await message.reply(f"❌ Неверный уровень ранга. Доступно от 1 до {max(RANKS.keys())}.")
         return
     
-    current_rank_user, _, is_current_super = await get_user_rank_context(message.from_user.id, message.chat)
+    current_rank_user, _, is_current_super = await ctx.rank()
     # Нельзя назначить ранг выше своего (для не супер-админов)
     if not is_current_super and rank_level >= current_rank_user:
         await message.reply(f"❌ Вы не можете назначить ранг {rank_level}, так как ваш ранг {current_rank_user}.")
@@ -75,8 +77,8 @@ async def handle_set_rank_command(message: types.Message):
     else:
         await message.reply("❌ Произошла ошибка при сохранении ранга.")
 
-@router.message(F.text.lower().startswith("повысить"), RankFilter(min_rank=5))
-async def handle_promote_rank_command(message: types.Message):
+@router.message(CommandFilter("повысить"), RankFilter(min_rank=5))
+async def handle_promote_rank_command(message: types.Message, ctx: UpdateContext):
     target_user_id, command_args = await get_target_id(message, "повысить")
     
     if not target_user_id:
@@ -84,12 +86,12 @@ async def handle_promote_rank_command(message: types.Message):
         return
 
     # Проверка иерархии
-    if not await can_user_modify_other(message.from_user.id, target_user_id, message.chat):
+    if not await ctx.can_modify(target_user_id):
         await message.reply("❌ Вы не можете повышать этого пользователя (иерархия).", parse_mode="HTML")
         return
 
-    current_rank_user, _, is_current_super = await get_user_rank_context(message.from_user.id, message.chat)
-    current_level, _, _ = await get_user_rank_context(target_user_id, message.chat)
+    current_rank_user, _, is_current_super = await ctx.rank()
+    current_level, _, _ = await ctx.rank(target_user_id)
     new_level = parse_rank_level(command_args)
     
     if new_level is None:
@@ -114,8 +116,8 @@ async def handle_promote_rank_command(message: types.Message):
     else:
         await message.reply("❌ Произошла ошибка при сохранении ранга.")
 
-@router.message(F.text.lower().startswith("понизить"), RankFilter(min_rank=5))
-async def handle_demote_rank_command(message: types.Message):
+@router.message(CommandFilter("понизить"), RankFilter(min_rank=5))
+async def handle_demote_rank_command(message: types.Message, ctx: UpdateContext):
     target_user_id, command_args = await get_target_id(message, "понизить")
     
     if not target_user_id:
@@ -123,12 +125,12 @@ async def handle_demote_rank_command(message: types.Message):
         return
 
     # Проверка иерархии
-    if not await can_user_modify_other(message.from_user.id, target_user_id, message.chat):
+    if not await ctx.can_modify(target_user_id):
         await message.reply("❌ Вы не можете понижать этого пользователя (иерархия).", parse_mode="HTML")
         return
 
-    current_rank_user, _, is_current_super = await get_user_rank_context(message.from_user.id, message.chat)
-    current_level, _, _ = await get_user_rank_context(target_user_id, message.chat)
+    current_rank_user, _, is_current_super = await ctx.rank()
+    current_level, _, _ = await ctx.rank(target_user_id)
     new_level = parse_rank_level(command_args)
     
     if new_level is None:
@@ -149,7 +151,7 @@ async def handle_demote_rank_command(message: types.Message):
     else:
         await message.reply("❌ Произошла ошибка при сохранении ранга.")
 
-@router.message(lambda message: (message.text or message.caption or "").lower().startswith(("разжаловать", "снять")))
+@router.message(CommandFilter("разжаловать", "снять", with_caption=True))
 async def handle_strip_rank_command(message: types.Message):
     """Понижает ранг пользователя до 0."""
     command_name = "разжаловать" if (message.text or message.caption or "").lower().startswith("разжаловать") else "снять"
@@ -180,7 +182,7 @@ async def handle_strip_rank_command(message: types.Message):
     else:
         await message.reply("❌ Произошла ошибка при разжаловании пользователя.")
 
-@router.message(F.text.lower().startswith("ранг"), RankFilter(min_rank=5))
+@router.message(CommandFilter("ранг"), RankFilter(min_rank=5))
 async def handle_set_custom_rank_name_command(message: types.Message):
     """
     Устанавливает кастомные названия для ранга в группе.
@@ -217,7 +219,7 @@ async def handle_set_custom_rank_name_command(message: types.Message):
         parse_mode="HTML"
     )
 
-@router.message(F.text.lower().in_({"кто админ?", "кто админ", "список админов", "список администраторов"}))
+@router.message(CommandFilter(exact={"кто админ?", "кто админ", "список админов", "список администраторов"}))
 async def handle_who_is_admin_command(message: types.Message):
     """Показывает список всех рангов и пользователей на них."""
     ranked_users = await get_all_ranked_users(message.chat.id)
@@ -230,18 +232,15 @@ async def handle_who_is_admin_command(message: types.Message):
             
     # Пытаемся найти реального создателя группы через Telegram API
     real_creator_id = None
-    try:
-        # Получаем список администраторов, чтобы найти владельца (creator)
-        admins = await message.chat.get_administrators()
-        for admin in admins:
-            if admin.status == "creator":
-                real_creator_id = admin.user.id
-                # Если его нет в нашей группе 5 ранга (из БД), добавляем его виртуально для списка
-                if real_creator_id not in rank_groups[5]:
-                    rank_groups[5].append(real_creator_id)
-                break
-    except Exception as e:
-        print(f"Ошибка при получении создателя чата: {e}")
+    # Получаем список администраторов (кэшируется), чтобы найти владельца (creator)
+    admins = await get_chat_admins(message.chat)
+    for admin_id, status in admins.items():
+        if status == "creator":
+            real_creator_id = admin_id
+            # Если его нет в нашей группе 5 ранга (из БД), добавляем его виртуально для списка
+            if real_creator_id not in rank_groups[5]:
+                rank_groups[5].append(real_creator_id)
+            break
 
     # Специально проверяем 1 ранг. Если в БД никого нет с 1 рангом, 
     # но пользователь жалуется, что его не видно, возможно он просто не в базе.
@@ -250,6 +249,9 @@ async def handle_who_is_admin_command(message: types.Message):
     # Формируем список рангов для вывода
     rank_sections = []
     
+    # Упоминания всех пользователей из списка одним запросом
+    mentions = await get_mentions_by_ids(u_id for users in rank_groups.values() for u_id in users)
+    
     # Выводим от высшего к низшему (5 до 1)
     for level in range(5, 0, -1):
         users = rank_groups[level]
@@ -264,8 +266,7 @@ async def handle_who_is_admin_command(message: types.Message):
         # Убираем дубликаты и пустые значения
         unique_users = list(set(users))
         for u_id in unique_users:
-            mention = await get_mention_by_id(u_id)
-            section += f" — {mention}\n"
+            section += f" — {mentions[u_id]}\n"
         rank_sections.append(section)
     
     if not rank_sections:
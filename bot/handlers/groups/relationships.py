@@ -1,8 +1,9 @@
 import random
-from aiogram import Router, types, F
+from aiogram import Router, types
 from aiogram.filters.callback_data import CallbackData
 from bot.utils.db_manager import (
     get_mention_by_id,
+    get_mentions_by_ids,
     update_relationship,
     get_relationship,
     get_all_user_relationships,
@@ -10,9 +11,12 @@ from bot.utils.db_manager import (
     add_user_xp
 )
 from bot.handlers.groups.moderation import get_target_id
+from bot.utils.commands import CommandFilter, AnyCommandFilter
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 router = Router()
+# Обычные сообщения (не команды) сразу пропускают роутер
+router.message.filter(AnyCommandFilter())
 
 # Callback data для отношений
 class RelCallback(CallbackData, prefix="rel"):
@@ -303,21 +307,10 @@ def get_relationship_level(total):
     if total < 200: return "Родственные души 💎"
     return "Неразлучная связь ♾"
 
-@router.message(lambda message: (message.text or message.caption) and any((message.text or message.caption).lower().strip().startswith(action) for action in SOCIAL_ACTIONS))
-async def handle_social_action(message: types.Message):
-    full_text = (message.text or message.caption).lower().strip()
-    action_key = None
-    
-    # Сортируем ключи по длине, чтобы сначала проверялись более длинные (например "напоить водой")
-    sorted_actions = sorted(SOCIAL_ACTIONS.keys(), key=len, reverse=True)
-    
-    for action in sorted_actions:
-        if full_text.startswith(action):
-            action_key = action
-            break
-            
-    if not action_key:
-        return
+@router.message(CommandFilter(*SOCIAL_ACTIONS, with_caption=True, strip=True))
+async def handle_social_action(message: types.Message, command_prefix: str):
+    # CommandFilter отдает самое длинное совпадение (например "напоить водой", а не "напоить")
+    action_key = command_prefix
 
     # Извлекаем дополнение, если оно есть (например, в "ударить тапком" дополнение — "тапком")
     # Но для этого нам нужно знать, где заканчивается команда и начинается тег
@@ -333,8 +326,8 @@ async def handle_social_action(message: types.Message):
         await message.reply(f"🤔 Вы пытаетесь {action_key} самого себя? Это как?")
         return
 
-    user1_mention = await get_mention_by_id(message.from_user.id)
-    user2_mention = await get_mention_by_id(target_user_id)
+    mentions = await get_mentions_by_ids([message.from_user.id, target_user_id])
+    user1_mention, user2_mention = mentions[message.from_user.id], mentions[target_user_id]
     
     # Проверяем, есть ли уже отношения
     rel_data = await get_relationship(message.from_user.id, target_user_id)
@@ -369,7 +362,7 @@ async def handle_social_action(message: types.Message):
     except Exception:
         pass
 
-@router.message(F.text.lower() == "наши отношения")
+@router.message(CommandFilter(exact="наши отношения"))
 async def show_pair_relationships(message: types.Message):
     if not message.reply_to_message:
         await message.reply("❌ Ответьте на сообщение пользователя, чтобы посмотреть ваши отношения с ним.")
@@ -409,7 +402,7 @@ async def show_pair_relationships(message: types.Message):
         parse_mode="HTML"
     )
 
-@router.message(F.text.lower().in_({"мои отношения", "мои отн", "отн стата"}))
+@router.message(CommandFilter(exact={"мои отношения", "мои отн", "отн стата"}))
 async def show_my_relationships(message: types.Message):
     """
     Показывает список всех отношений пользователя.
@@ -424,8 +417,9 @@ async def show_my_relationships(message: types.Message):
     response += "➖➖➖➖➖➖➖➖➖➖\n"
     
     # Показываем топ-10 отношений
+    mentions = await get_mentions_by_ids(rel["partner_id"] for rel in relationships[:10])
     for i, rel in enumerate(relationships[:10], 1):
-        partner_mention = await get_mention_by_id(rel["partner_id"])
+        partner_mention = mentions[rel["partner_id"]]
         level = get_relationship_level(rel["data"]["total_interactions"])
         count = rel["data"]["total_interactions"]
         response += f"{i}. {partner_mention} — {level} ({count})\n"
@@ -438,7 +432,7 @@ async def show_my_relationships(message: types.Message):
     
     await message.answer(response, parse_mode="HTML")
 
-@router.message(F.text.lower().startswith("+отн"))
+@router.message(CommandFilter("+отн"))
 async def propose_relationship(message: types.Message):
     """
     Предложение начать отношения.
@@ -453,8 +447,8 @@ async def propose_relationship(message: types.Message):
         await message.reply("🤡 Отношения с самим собой — это база, но приглашение не требуется.")
         return
 
-    user1_mention = await get_mention_by_id(message.from_user.id)
-    user2_mention = await get_mention_by_id(target_user_id)
+    mentions = await get_mentions_by_ids([message.from_user.id, target_user_id])
+    user1_mention, user2_mention = mentions[message.from_user.id], mentions[target_user_id]
     
     kb = InlineKeyboardBuilder()
     kb.button(text="✅ Принять", callback_data=RelCallback(action="accept", user1_id=message.from_user.id, user2_id=target_user_id))
@@ -474,8 +468,8 @@ async def handle_rel_callback(callback: types.CallbackQuery, callback_data: RelC
         await callback.answer("❌ Это приглашение не для вас!", show_alert=True)
         return
         
-    user1_mention = await get_mention_by_id(callback_data.user1_id)
-    user2_mention = await get_mention_by_id(callback_data.user2_id)
+    mentions = await get_mentions_by_ids([callback_data.user1_id, callback_data.user2_id])
+    user1_mention, user2_mention = mentions[callback_data.user1_id], mentions[callback_data.user2_id]
     
     if callback_data.action == "accept":
         # Инициализируем отношения, если их нет (первое действие "начало")
@@ -490,7 +484,7 @@ async def handle_rel_callback(callback: types.CallbackQuery, callback_data: RelC
             parse_mode="HTML"
         )
 
-@router.message(F.text.lower().in_({"-отн", "-отношения"}))
+@router.message(CommandFilter(exact={"-отн", "-отношения"}))
 async def remove_relationship(message: types.Message):
     """
     Удаление отношений.
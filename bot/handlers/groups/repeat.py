@@ -1,10 +1,11 @@
 from aiogram import Router, types, F
 from bot.utils.filters import ModuleEnabledFilter
+from bot.utils.commands import CommandFilter, AnyCommandFilter
 
 router = Router()
-router.message.filter(F.chat.type.in_({"group", "supergroup"}), ModuleEnabledFilter("repeat"))
+router.message.filter(AnyCommandFilter(), F.chat.type.in_({"group", "supergroup"}), ModuleEnabledFilter("repeat"))
 
-@router.message(F.text.lower().startswith("повтори"))
+@router.message(CommandFilter("повтори"))
 async def handle_repeat(message: types.Message):
     """Повторяет текст пользователя."""
     command_len = len("повтори")
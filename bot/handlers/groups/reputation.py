@@ -4,6 +4,7 @@ from bot.utils.db_manager import (
     update_user_cache
 )
 from bot.utils.filters import ModuleEnabledFilter
+from bot.utils.commands import CommandFilter
 import logging
 
 router = Router()
@@ -41,8 +42,8 @@ async def handle_reputation_change(message: types.Message):
     delta = 1 if is_plus else -1
     
     # Обновляем кэш пользователей
-    await update_user_cache(target_user)
-    await update_user_cache(source_user)
+    await update_user_cache(target_user.id, target_user.username, target_user.full_name)
+    await update_user_cache(source_user.id, source_user.username, source_user.full_name)
 
     stats = await update_reputation(message.chat.id, target_user.id, delta)
     
@@ -56,7 +57,7 @@ async def handle_reputation_change(message: types.Message):
         parse_mode="HTML"
     )
 
-@router.message(F.text.lower().in_({"топ реп", "топ репутации", "реп топ"}))
+@router.message(CommandFilter(exact={"топ реп", "топ репутации", "реп топ"}))
 async def handle_reputation_top(message: types.Message):
     """Выводит топ репутации чата."""
     top_data = await get_top_reputation(message.chat.id)
@@ -1,13 +1,14 @@
 import random
 import asyncio
-from aiogram import Router, types, F
+from aiogram import Router, types
 from bot.utils.db_manager import get_mention_by_id
 from bot.utils.filters import ModuleEnabledFilter
+from bot.utils.commands import CommandFilter, AnyCommandFilter
 
 router = Router()
-router.message.filter(ModuleEnabledFilter(module_id="roulette"))
+router.message.filter(AnyCommandFilter(), ModuleEnabledFilter(module_id="roulette"))
 
-@router.message(F.text.lower() == "русская рулетка")
+@router.message(CommandFilter(exact="русская рулетка"))
 async def handle_roulette_command(message: types.Message):
     """Игра в русскую рулетку."""
     user_mention = await get_mention_by_id(message.from_user.id)
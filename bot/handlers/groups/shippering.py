@@ -1,12 +1,13 @@
 import random
 from aiogram import Router, types, F
-from bot.utils.db_manager import get_chat_user_ids, get_mention_by_id
+from bot.utils.db_manager import get_chat_user_ids, get_mentions_by_ids
 from bot.utils.filters import ModuleEnabledFilter
+from bot.utils.commands import CommandFilter, AnyCommandFilter
 
 router = Router()
-router.message.filter(F.chat.type.in_({"group", "supergroup"}), ModuleEnabledFilter("shippering"))
+router.message.filter(AnyCommandFilter(), F.chat.type.in_({"group", "supergroup"}), ModuleEnabledFilter("shippering"))
 
-@router.message(F.text.regexp(r"(?i)^!?шипперинг\b"))
+@router.message(CommandFilter(words=("шипперинг", "!шипперинг")))
 async def handle_shippering(message: types.Message):
     """Шипперит двух случайных участников чата."""
     user_ids = await get_chat_user_ids(message.chat.id)
@@ -16,8 +17,8 @@ async def handle_shippering(message: types.Message):
         return
     
     pair = random.sample(user_ids, 2)
-    user1_mention = await get_mention_by_id(pair[0])
-    user2_mention = await get_mention_by_id(pair[1])
+    mentions = await get_mentions_by_ids(pair)
+    user1_mention, user2_mention = mentions[pair[0]], mentions[pair[1]]
     
     love_percent = random.randint(0, 100)
     
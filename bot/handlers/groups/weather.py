@@ -2,11 +2,12 @@ import aiohttp
 from aiogram import Router, types, F
 import logging
 from bot.utils.filters import ModuleEnabledFilter
+from bot.utils.commands import CommandFilter, AnyCommandFilter
 
 router = Router()
 
 # Фильтр для проверки, что команда отправлена в группе или супергруппе и модуль включен
-router.message.filter(F.chat.type.in_({"group", "supergroup"}), ModuleEnabledFilter("weather"))
+router.message.filter(AnyCommandFilter(), F.chat.type.in_({"group", "supergroup"}), ModuleEnabledFilter("weather"))
 
 async def get_weather(city: str):
     """Получает погоду через wttr.in с принудительным русским форматом."""
@@ -24,7 +25,7 @@ async def get_weather(city: str):
             logging.error(f"Ошибка при получении погоды: {e}")
             return None
 
-@router.message(F.text.lower().startswith("погода"))
+@router.message(CommandFilter("погода"))
 async def handle_weather_command(message: types.Message):
     """Обработчик команды погоды."""
     args = message.text.split(maxsplit=1)
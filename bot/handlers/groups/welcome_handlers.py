@@ -4,11 +4,14 @@ from aiogram.types import ChatMemberUpdated
 from aiogram.enums import ChatMemberStatus
 from bot.utils.db_manager import set_welcome_message, get_welcome_message
 from bot.utils.filters import RankFilter
+from bot.utils.commands import CommandFilter, AnyCommandFilter
 
 router = Router()
+# Обычные сообщения (не команды) сразу пропускают роутер
+router.message.filter(AnyCommandFilter())
 
 # Фильтр для настройки приветствия (+Приветствие)
-@router.message(F.text.lower().startswith("+приветствие"), RankFilter(min_rank=3))
+@router.message(CommandFilter("+приветствие"), RankFilter(min_rank=3))
 async def handle_set_welcome(message: types.Message):
     """
     Устанавливает приветствие для новых участников.
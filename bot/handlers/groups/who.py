@@ -2,11 +2,12 @@ import random
 from aiogram import Router, types, F
 from bot.utils.db_manager import get_chat_user_ids, get_mention_by_id
 from bot.utils.filters import ModuleEnabledFilter
+from bot.utils.commands import CommandFilter, AnyCommandFilter
 
 router = Router()
-router.message.filter(F.chat.type.in_({"group", "supergroup"}), ModuleEnabledFilter("who"))
+router.message.filter(AnyCommandFilter(), F.chat.type.in_({"group", "supergroup"}), ModuleEnabledFilter("who"))
 
-@router.message(F.text.regexp(r"(?i)^!?кто\b"))
+@router.message(CommandFilter(words=("кто", "!кто")))
 async def handle_who(message: types.Message):
     """Выбирает случайного пользователя."""
     user_ids = await get_chat_user_ids(message.chat.id)
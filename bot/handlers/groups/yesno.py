@@ -1,11 +1,12 @@
 import random
 from aiogram import Router, types, F
 from bot.utils.filters import ModuleEnabledFilter
+from bot.utils.commands import CommandFilter, AnyCommandFilter
 
 router = Router()
-router.message.filter(F.chat.type.in_({"group", "supergroup"}), ModuleEnabledFilter("yesno"))
+router.message.filter(AnyCommandFilter(), F.chat.type.in_({"group", "supergroup"}), ModuleEnabledFilter("yesno"))
 
-@router.message(F.text.regexp(r"(?i)^!?данет\b"))
+@router.message(CommandFilter(words=("данет", "!данет")))
 async def handle_yesno(message: types.Message):
     """Выбирает да или нет."""
     answer = random.choice(["Да", "Нет"])
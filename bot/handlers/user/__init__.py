@@ -1,6 +1,9 @@
 from aiogram import Router
+from bot.utils.scheduler import set_update_class, CLASS_DEFAULT
 
 from .main_handlers import router as user_main_router
 
+set_update_class(user_main_router, CLASS_DEFAULT)
+
 router = Router()
 router.include_router(user_main_router)
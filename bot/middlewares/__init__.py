@@ -1,2 +1,5 @@
 from .activity import ActivityMiddleware
 from .antispam import AntispamMiddleware
+from .rank_cache import RankCacheMiddleware
+from .context import ContextMiddleware
+from .commands import CommandMiddleware
@@ -1,7 +1,8 @@
 from typing import Any, Awaitable, Callable, Dict
 from aiogram import BaseMiddleware
 from aiogram.types import Message
-from bot.utils.db_manager import update_user_cache, update_user_activity
+from bot.utils.db_manager import update_user_cache
+from bot.utils.activity_aggregator import activity_aggregator
 
 class ActivityMiddleware(BaseMiddleware):
     async def __call__(
@@ -14,8 +15,10 @@ class ActivityMiddleware(BaseMiddleware):
         # Если мы зарегистрируем его как message.middleware, он будет срабатывать ТОЛЬКО если найден хендлер.
         
         if isinstance(event, Message) and event.from_user:
-            # Обновляем кэш и активность только когда пользователь реально взаимодействует с ботом
+            # Обновляем кэш и активность только когда пользователь реально взаимодействует с ботом.
+            # Ждем только запись впервые увиденного пользователя (на users ссылаются economy
+            # и user_levels), иначе это сравнение отпечатка или накопление изменений в памяти
             await update_user_cache(event.from_user.id, event.from_user.username, event.from_user.full_name)
-            await update_user_activity(event.from_user.id)
+            activity_aggregator.record(event.from_user.id)
             
         return await handler(event, data)
@@ -2,7 +2,8 @@ from typing import Any, Awaitable, Callable, Dict
 import logging
 from aiogram import BaseMiddleware
 from aiogram.types import Message
-from bot.utils.db_manager import is_user_blacklisted, get_disabled_modules
+from bot.utils.db_manager import get_disabled_modules
+from bot.utils.blacklist_sync import antispam_blacklist
 
 class AntispamMiddleware(BaseMiddleware):
     async def __call__(
@@ -20,12 +21,13 @@ class AntispamMiddleware(BaseMiddleware):
             return await handler(event, data)
 
         # Проверяем, включен ли модуль антиспама в этом чате
-        disabled_modules = await get_disabled_modules(event.chat.id)
+        ctx = data.get("ctx")
+        disabled_modules = await (ctx.disabled_modules() if ctx else get_disabled_modules(event.chat.id))
         if "antispam" in disabled_modules:
             return await handler(event, data)
 
         # Проверка на наличие в черном списке
-        if await is_user_blacklisted(event.from_user.id):
+        if antispam_blacklist.contains(event.from_user.id):
             try:
                 # Пытаемся забанить и удалить сообщение
                 await event.chat.ban(user_id=event.from_user.id)
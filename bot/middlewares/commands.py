@@ -0,0 +1,20 @@
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import Message
+from bot.utils.commands import match_commands
+
+class CommandMiddleware(BaseMiddleware):
+    """
+    Один раз на сообщение сопоставляет текст с индексом команд и кладет результат
+    в data["text_commands"]. CommandFilter и AnyCommandFilter дальше только
+    смотрят в готовый словарь, не разбирая текст заново.
+    """
+    async def __call__(
+        self,
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message,
+        data: Dict[str, Any]
+    ) -> Any:
+        if isinstance(event, Message):
+            data["text_commands"] = match_commands(event)
+        return await handler(event, data)
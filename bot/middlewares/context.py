@@ -0,0 +1,20 @@
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from bot.utils.update_context import UpdateContext
+
+class ContextMiddleware(BaseMiddleware):
+    """
+    Создает UpdateContext для каждого апдейта и кладет его в data["ctx"].
+    Регистрируется на dp.update, поэтому контекст доступен всем остальным
+    middleware, фильтрам и хендлерам.
+    """
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        data["ctx"] = UpdateContext(data.get("event_chat"), user.id if user else None)
+        return await handler(event, data)
@@ -0,0 +1,26 @@
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import ChatMemberUpdated
+from bot.utils.db_manager import invalidate_chat_admins
+
+_ADMIN_STATUSES = {"creator", "administrator"}
+
+class RankCacheMiddleware(BaseMiddleware):
+    """
+    Сбрасывает кэш администраторов чата, когда кого-то назначают или снимают.
+    Регистрируется как outer middleware для chat_member и my_chat_member,
+    чтобы срабатывать независимо от фильтров роутеров.
+    """
+    async def __call__(
+        self,
+        handler: Callable[[ChatMemberUpdated, Dict[str, Any]], Awaitable[Any]],
+        event: ChatMemberUpdated,
+        data: Dict[str, Any]
+    ) -> Any:
+        if isinstance(event, ChatMemberUpdated) and (
+            event.old_chat_member.status in _ADMIN_STATUSES
+            or event.new_chat_member.status in _ADMIN_STATUSES
+        ):
+            invalidate_chat_admins(event.chat.id)
+
+        return await handler(event, data)
@@ -1,7 +1,8 @@
 from aiogram import types
-from bot.utils.db_manager import add_award, remove_award_by_index, get_mention_by_id, get_user_mention_with_nickname
+from bot.utils.db_manager import add_award, remove_award_by_index, get_mention_by_id
+from bot.utils.update_context import UpdateContext
 
-async def give_award(message: types.Message, target_user_id: int, text: str):
+async def give_award(message: types.Message, target_user_id: int, text: str, ctx: UpdateContext):
     """
     Выдает награду пользователю.
     """
@@ -16,7 +17,7 @@ async def give_award(message: types.Message, target_user_id: int, text: str):
     await add_award(message.chat.id, target_user_id, message.from_user.id, text)
     
     target_mention = await get_mention_by_id(target_user_id)
-    admin_mention = await get_user_mention_with_nickname(message.from_user)
+    admin_mention = await ctx.mention(message.from_user)
     
     await message.answer(
         f"🏆 {admin_mention} выдал награду {target_mention}\n"
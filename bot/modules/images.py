@@ -0,0 +1,265 @@
+"""
+Отрисовка картинок профиля. Только Pillow и простые данные на входе,
+без обращений к БД и боту — функции выполняются в процессах render_pool.
+
+Шрифты загружаются один раз на процесс (реестр по размеру), а статичные
+части карточек (фон, сетка, заголовки) рисуются один раз в шаблон —
+на каждый запрос копируется шаблон и дорисовываются только данные.
+Повторяющиеся надписи (даты, числа) растеризуются один раз.
+"""
+import os
+import re
+from datetime import datetime
+from functools import lru_cache
+from io import BytesIO
+from typing import List, Optional, Tuple
+from PIL import Image, ImageDraw, ImageFont
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Шрифты с поддержкой кириллицы (в порядке приоритета)
+_FONT_PATHS = [
+    # 1. Шрифт в проекте
+    os.path.join(_PROJECT_ROOT, "bot", "assets", "fonts", "arial.ttf"),
+    # 2. Системные Windows
+    "C:\\Windows\\Fonts\\arial.ttf",
+    "C:\\Windows\\Fonts\\segoeui.ttf",
+    "C:\\Windows\\Fonts\\tahoma.ttf",
+    # 3. Системные Linux
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
+    "/usr/share/fonts/truetype/freefont/FreeSans.ttf",
+    "/usr/share/fonts/truetype/noto/NotoSans-Regular.ttf",
+    # 4. Просто по имени (если в PATH)
+    "arial.ttf",
+    "DejaVuSans.ttf"
+]
+
+# Размеры, которые используются в карточках (загружаются при старте воркера)
+FONT_SIZES = (12, 14, 22, 24, 30, 42, 70, 80)
+
+# Общие цвета
+ACCENT_COLOR = (255, 120, 0)  # Оранжевый
+TEXT_MAIN = (40, 40, 40)
+
+# График активности
+CHART_WIDTH, CHART_HEIGHT = 800, 450
+CHART_MARGIN_LEFT, CHART_MARGIN_RIGHT, CHART_MARGIN_TOP, CHART_MARGIN_BOTTOM = 60, 40, 80, 70
+CHART_GRID_STEPS = 5
+CHART_GRID_COLOR = (245, 245, 245)
+CHART_AXIS_COLOR = (180, 180, 180)
+
+# Карточка уровня
+CARD_WIDTH, CARD_HEIGHT = 800, 400
+CARD_TEXT_SECONDARY = (140, 140, 140)
+CARD_BAR_BG = (245, 245, 245)
+CARD_AVATAR_SIZE = 160
+CARD_AVATAR_X, CARD_AVATAR_Y = 50, 50
+CARD_BAR_X, CARD_BAR_Y = 50, 270
+CARD_BAR_W, CARD_BAR_H = 700, 55
+
+
+@lru_cache(maxsize=1)
+def _font_path() -> Optional[str]:
+    for path in _FONT_PATHS:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+@lru_cache(maxsize=None)
+def get_font(size=14):
+    """
+    Шрифт с поддержкой кириллицы нужного размера.
+    Путь ищется один раз, каждый размер загружается один раз на процесс.
+    """
+    path = _font_path()
+    if path:
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError:
+            pass
+    # Если совсем всё плохо - дефолт
+    return ImageFont.load_default()
+
+def clean_text(text: str) -> str:
+    """
+    Оставляет только то, что точно отобразится (латиница, кириллица, цифры).
+    """
+    if not text:
+        return "User"
+    # Оставляем: a-z, A-Z, а-я, А-Я, ё, Ё, 0-9 и базовые знаки
+    cleaned = re.sub(r'[^a-zA-Zа-яА-ЯёЁ0-9\s.,!@#$%^&*()\-+=?<>:;\[\]{}|\'\"\\/`~]', '', text)
+    result = cleaned.strip()
+    return result if result else "User"
+
+@lru_cache(maxsize=4096)
+def _text_sprite(text: str, size: int, frac_x: float, frac_y: float) -> Tuple[Image.Image, int, int]:
+    """
+    Растеризованная надпись (маска "L") и ее отступ от точки вывода.
+    Подписи осей, даты и числа повторяются между картинками, поэтому
+    растеризуются один раз на процесс, а не на каждый запрос.
+    """
+    font = get_font(size)
+    left, top, right, bottom = font.getbbox(text)
+    pad_x = 2 - min(0, left)
+    pad_y = 2 - min(0, top)
+    mask = Image.new("L", (right + pad_x + 2, bottom + pad_y + 2), 0)
+    ImageDraw.Draw(mask).text((pad_x + frac_x, pad_y + frac_y), text, fill=255, font=font)
+    return mask, pad_x, pad_y
+
+
+def _draw_text(draw: ImageDraw.ImageDraw, xy: Tuple[float, float], text: str, size: int, fill):
+    """То же, что draw.text(xy, text, font=get_font(size), fill=fill), но с кэшем растеризации."""
+    x, y = xy
+    mask, pad_x, pad_y = _text_sprite(text, size, x - int(x), y - int(y))
+    draw.bitmap((int(x) - pad_x, int(y) - pad_y), mask, fill=fill)
+
+
+@lru_cache(maxsize=4096)
+def _text_size(text: str, size: int) -> Tuple[int, int]:
+    bbox = get_font(size).getbbox(text)
+    return bbox[2] - bbox[0], bbox[3] - bbox[1]
+
+
+def _encode_png(image: Image.Image) -> bytes:
+    buf = BytesIO()
+    image.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+@lru_cache(maxsize=None)
+def _chart_template() -> Image.Image:
+    """Фон, заголовок и линии сетки графика активности."""
+    img = Image.new("RGB", (CHART_WIDTH, CHART_HEIGHT), "white")
+    draw = ImageDraw.Draw(img)
+
+    # Заголовок
+    draw.text((40, 25), "АКТИВНОСТЬ ЗА 30 ДНЕЙ", fill=TEXT_MAIN, font=get_font(30))
+    draw.line([(40, 65), (140, 65)], fill=ACCENT_COLOR, width=5)
+
+    # Сетка
+    plot_height = CHART_HEIGHT - CHART_MARGIN_TOP - CHART_MARGIN_BOTTOM
+    for i in range(CHART_GRID_STEPS + 1):
+        y = CHART_MARGIN_TOP + plot_height - int(plot_height * i / CHART_GRID_STEPS)
+        draw.line([(CHART_MARGIN_LEFT, y), (CHART_WIDTH - CHART_MARGIN_RIGHT, y)], fill=CHART_GRID_COLOR, width=1)
+    return img
+
+
+@lru_cache(maxsize=None)
+def _level_card_template() -> Image.Image:
+    """Фон, декор, рамка аватара, подпись уровня и пустая полоса прогресса."""
+    image = Image.new("RGB", (CARD_WIDTH, CARD_HEIGHT), (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+
+    # Декор
+    draw.ellipse([CARD_WIDTH-150, -50, CARD_WIDTH+50, 150], fill=(255, 120, 0, 30))
+
+    # Аватар
+    av_x, av_y, size = CARD_AVATAR_X, CARD_AVATAR_Y, CARD_AVATAR_SIZE
+    draw.ellipse([av_x-2, av_y-2, av_x+size+2, av_y+size+2], outline=(240, 240, 240), width=2)
+    # Дефолтный аватар
+    draw.ellipse([av_x, av_y, av_x+size, av_y+size], fill=ACCENT_COLOR)
+
+    info_x = av_x + size + 40
+    draw.text((info_x, av_y + 65), "УРОВЕНЬ", font=get_font(24), fill=CARD_TEXT_SECONDARY)
+
+    # Фон прогресс-бара
+    draw.rounded_rectangle(
+        [CARD_BAR_X, CARD_BAR_Y, CARD_BAR_X+CARD_BAR_W, CARD_BAR_Y+CARD_BAR_H], radius=28, fill=CARD_BAR_BG
+    )
+    return image
+
+
+def warm_up():
+    """Загружает шрифты и шаблоны заранее (initializer процессов render_pool)."""
+    for size in FONT_SIZES:
+        get_font(size)
+    _chart_template()
+    _level_card_template()
+
+
+def render_activity_chart(series: List[Tuple[datetime, int]]) -> bytes:
+    """График активности по дням: [(день, количество сообщений), ...]."""
+    max_count = max(count for _, count in series) or 0
+
+    width, height = CHART_WIDTH, CHART_HEIGHT
+    margin_left, margin_right = CHART_MARGIN_LEFT, CHART_MARGIN_RIGHT
+    margin_top, margin_bottom = CHART_MARGIN_TOP, CHART_MARGIN_BOTTOM
+    plot_width = width - margin_left - margin_right
+    plot_height = height - margin_top - margin_bottom
+
+    img = _chart_template().copy()
+    draw = ImageDraw.Draw(img)
+
+    # Подписи сетки
+    for i in range(CHART_GRID_STEPS + 1):
+        y = margin_top + plot_height - int(plot_height * i / CHART_GRID_STEPS)
+        val = int(max_count * i / CHART_GRID_STEPS) if max_count > 0 else 0
+        _draw_text(draw, (15, y - 8), str(val), 12, CHART_AXIS_COLOR)
+
+    n = len(series)
+    bar_spacing = plot_width / max(n, 1)
+    bar_width = max(4, int(bar_spacing * 0.75))
+
+    for idx, (day, count) in enumerate(series):
+        x_center = margin_left + int(bar_spacing * idx + bar_spacing / 2)
+        h = int((count / max_count) * plot_height) if max_count > 0 else 0
+
+        x0 = x_center - bar_width // 2
+        x1 = x_center + bar_width // 2
+        y1 = margin_top + plot_height
+        y0 = y1 - h
+
+        if h > 2:
+            # Чистый оранжевый столбик со скруглением сверху
+            draw.rounded_rectangle([x0, y0, x1, y1], radius=6, fill=ACCENT_COLOR)
+        else:
+            # Минимальная отметка для нулевой/малой активности
+            draw.rounded_rectangle([x0, y1-3, x1, y1], radius=2, fill=(235, 235, 235))
+
+        # Подписи дат (каждые 5 дней)
+        if idx % 5 == 0:
+            label = day.strftime("%d.%m")
+            lw, _ = _text_size(label, 14)
+            _draw_text(draw, (x_center - lw / 2, height - margin_bottom + 15), label, 14, CHART_AXIS_COLOR)
+
+    return _encode_png(img)
+
+
+def render_level_card(username: str, level: int, xp: int, needed: int) -> bytes:
+    """Карточка уровня с именем пользователя и прогрессом опыта."""
+    # Очистка имени от эмодзи для предотвращения квадратов
+    display_username = clean_text(username)
+    if not display_username:
+        display_username = "User"
+
+    image = _level_card_template().copy()
+    draw = ImageDraw.Draw(image)
+
+    # Буква на аватаре
+    avatar_size = CARD_AVATAR_SIZE
+    av_x, av_y = CARD_AVATAR_X, CARD_AVATAR_Y
+    letter = display_username[0].upper() if display_username else "?"
+    tw, th = _text_size(letter, 70)
+    _draw_text(draw, (av_x+(avatar_size-tw)/2, av_y+(avatar_size-th)/2 - 8), letter, 70, (255, 255, 255))
+
+    # Инфо
+    info_x = av_x + avatar_size + 40
+    _draw_text(draw, (info_x, av_y + 10), display_username, 42, TEXT_MAIN)
+    _draw_text(draw, (info_x, av_y + 85), str(level), 80, ACCENT_COLOR)
+
+    # Прогресс-бар
+    bar_x, bar_y = CARD_BAR_X, CARD_BAR_Y
+    bar_w, bar_h = CARD_BAR_W, CARD_BAR_H
+    progress = min(1.0, xp / needed) if needed > 0 else 0
+    if progress > 0:
+        fill_w = int(bar_w * progress)
+        fill_w = max(fill_w, 56)
+        draw.rounded_rectangle([bar_x, bar_y, bar_x+fill_w, bar_y+bar_h], radius=28, fill=ACCENT_COLOR)
+
+    xp_text = f"{xp} / {needed} XP"
+    tw, _ = _text_size(xp_text, 22)
+    _draw_text(draw, (bar_x + (bar_w - tw)/2, bar_y + bar_h + 10), xp_text, 22, CARD_TEXT_SECONDARY)
+
+    return _encode_png(image)
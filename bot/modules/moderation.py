@@ -1,15 +1,92 @@
-from aiogram import types
+from aiogram import Bot, types
 from aiogram.exceptions import TelegramBadRequest
+from bot.config_reader import config
+from typing import List, Set
+import asyncio
 import logging
 import time
 
+# deleteMessages принимает не больше 100 ID за вызов
+_DELETE_BATCH_SIZE = 100
+
+# Отложенные удаления уведомлений: держим ссылки на задачи, при остановке дожидаемся их
+_pending_deletes: Set[asyncio.Task] = set()
+
+# Удаление по одному (когда пачку отклонили) — общий небольшой лимит на весь бот,
+# чтобы отклоненные пачки не превращались в сотни одновременных запросов
+_single_delete_semaphore = asyncio.Semaphore(config.purge_single_concurrency)
+
+
+async def _delete_later(message: types.Message, delay: float):
+    await asyncio.sleep(delay)
+    try:
+        await message.delete()
+    except Exception:
+        pass
+
+
+def _schedule_delete(message: types.Message, delay: float):
+    task = asyncio.create_task(_delete_later(message, delay))
+    _pending_deletes.add(task)
+    task.add_done_callback(_pending_deletes.discard)
+
+
+async def drain_pending_deletes():
+    """Дожидается отложенных удалений (вызывается при остановке, пока сессия бота открыта)."""
+    if _pending_deletes:
+        await asyncio.gather(*_pending_deletes, return_exceptions=True)
+
+
+async def _delete_single(bot: Bot, chat_id: int, message_id: int) -> bool:
+    try:
+        async with _single_delete_semaphore:
+            await bot.delete_message(chat_id, message_id)
+        return True
+    except TelegramBadRequest:
+        # Сообщения нет, оно слишком старое или служебное
+        return False
+    except Exception as e:
+        logging.error(f"Ошибка при удалении сообщения {message_id}: {e}")
+        return False
+
+
+async def _delete_chunk(bot: Bot, chat_id: int, message_ids: List[int], semaphore: asyncio.Semaphore) -> int:
+    """
+    Удаляет пачку одним deleteMessages. Несуществующие ID Telegram пропускает сам.
+    Если пачка целиком отклонена — удаляем по одному, чтобы удалить хотя бы то, что можно.
+    """
+    async with semaphore:
+        try:
+            await bot.delete_messages(chat_id, message_ids)
+            return len(message_ids)
+        except TelegramBadRequest as e:
+            logging.warning(f"deleteMessages отклонен ({len(message_ids)} ID), удаляем по одному: {e}")
+        except Exception as e:
+            logging.error(f"Ошибка при удалении пачки сообщений: {e}")
+            return 0
+
+        results = await asyncio.gather(*(_delete_single(bot, chat_id, message_id) for message_id in message_ids))
+        return sum(results)
+
+
+async def purge_messages(bot: Bot, chat_id: int, message_ids: List[int]) -> int:
+    """
+    Удаляет сообщения пачками по 100, несколько пачек параллельно.
+    Возвращает количество удаленных (для принятых пачек — количество ID в них:
+    Telegram не сообщает, какие из ID не существовали).
+    """
+    semaphore = asyncio.Semaphore(config.purge_concurrency)
+    chunks = [message_ids[i:i + _DELETE_BATCH_SIZE] for i in range(0, len(message_ids), _DELETE_BATCH_SIZE)]
+    results = await asyncio.gather(*(_delete_chunk(bot, chat_id, chunk, semaphore) for chunk in chunks))
+    return sum(results)
+
+
 async def delete_messages(message: types.Message, count: int = 1):
     """
     Функция для удаления сообщений в чате.
     """
     chat_id = message.chat.id
     current_time = time.time()
-    deleted_count = 0
     
     # Максимальный возраст сообщения для удаления (48 часов)
     MAX_AGE = 48 * 3600
@@ -21,42 +98,15 @@ async def delete_messages(message: types.Message, count: int = 1):
             await message.reply("❌ Сообщения старше 48 часов нельзя удалить.")
             return
 
-        for i in range(count):
-            try:
-                await message.bot.delete_message(chat_id, start_id + i)
-                deleted_count += 1
-            except TelegramBadRequest as e:
-                if "message can't be deleted" in e.message.lower():
-                    # Вероятно, сообщение слишком старое или уже удалено
-                    break
-                logging.warning(f"Не удалось удалить сообщение {start_id + i}: {e}")
-            except Exception as e:
-                logging.error(f"Ошибка при удалении: {e}")
+        message_ids = [start_id + i for i in range(count)]
     else:
-        # Удаляем сообщение с командой
-        try:
-            await message.bot.delete_message(chat_id, message.message_id)
-            deleted_count += 1
-        except Exception:
-            pass
-
-        # Пытаемся удалить предыдущие сообщения
-        for i in range(1, count):
-            try:
-                # В этом режиме мы не знаем точно, существуют ли сообщения, 
-                # поэтому просто пробуем удалять по убыванию ID
-                await message.bot.delete_message(chat_id, message.message_id - i)
-                deleted_count += 1
-            except TelegramBadRequest:
-                continue
-            except Exception as e:
-                logging.error(f"Ошибка при удалении: {e}")
+        # Сообщение с командой и предыдущие. Мы не знаем точно, существуют ли
+        # сообщения с этими ID — несуществующие deleteMessages пропустит
+        message_ids = [message.message_id - i for i in range(count)]
+
+    deleted_count = await purge_messages(message.bot, chat_id, message_ids)
     
     # Отправляем уведомление, которое само удалится через несколько секунд
     confirm_msg = await message.answer(f"🗑️ Удалено {deleted_count} сообщений.")
-    import asyncio
-    await asyncio.sleep(3)
-    try:
-        await confirm_msg.delete()
-    except Exception:
-        pass
+    # В фоне: хендлер не держит очередь чата на время ожидания
+    _schedule_delete(confirm_msg, 3)
@@ -1,63 +1,17 @@
 from aiogram import types
 from bot.utils.db_manager import (
-    get_mention_by_id, get_user_rank_context,
-    get_user_profile_data, get_group_rank_name,
-    get_user_activity_series, get_user_activity_summary,
-    get_user_clan, get_user_clubs, get_user_reputation,
-    get_user_balance, get_user_level
+    get_user_rank_context, get_profile_bundle,
+    get_user_activity_series, format_mention,
+    resolve_rank_name, get_user_level
 )
 from bot.keyboards.profile_keyboards import get_profile_kb
+from bot.modules.images import render_activity_chart, render_level_card
+from bot.utils.render_pool import render_pool
+from bot.utils.cache import get_cache, _MISSING
+from bot.config_reader import config
 from datetime import datetime, timezone
-from io import BytesIO
-import os
-import re
-from typing import Optional
-from PIL import Image, ImageDraw, ImageFont
-
-def get_font(size=14):
-    """
-    Максимально надежный поиск шрифта с поддержкой кириллицы.
-    """
-    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    
-    # Список путей для проверки (в порядке приоритета)
-    font_paths = [
-        # 1. Твой шрифт в проекте
-        os.path.join(project_root, "bot", "assets", "fonts", "arial.ttf"),
-        # 2. Системные Windows
-        "C:\\Windows\\Fonts\\arial.ttf",
-        "C:\\Windows\\Fonts\\segoeui.ttf",
-        "C:\\Windows\\Fonts\\tahoma.ttf",
-        # 3. Системные Linux
-        "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
-        "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
-        "/usr/share/fonts/truetype/freefont/FreeSans.ttf",
-        "/usr/share/fonts/truetype/noto/NotoSans-Regular.ttf",
-        # 4. Просто по имени (если в PATH)
-        "arial.ttf",
-        "DejaVuSans.ttf"
-    ]
-    
-    for path in font_paths:
-        try:
-            if os.path.exists(path):
-                return ImageFont.truetype(path, size)
-        except:
-            continue
-            
-    # Если совсем всё плохо - дефолт
-    return ImageFont.load_default()
-
-def clean_text(text: str) -> str:
-    """
-    Оставляет только то, что точно отобразится (латиница, кириллица, цифры).
-    """
-    if not text:
-        return "User"
-    # Оставляем: a-z, A-Z, а-я, А-Я, ё, Ё, 0-9 и базовые знаки
-    cleaned = re.sub(r'[^a-zA-Zа-яА-ЯёЁ0-9\s.,!@#$%^&*()\-+=?<>:;\[\]{}|\'\"\\/`~]', '', text)
-    result = cleaned.strip()
-    return result if result else "User"
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 def get_relative_time(dt: datetime) -> str:
     """
@@ -83,164 +37,77 @@ def get_relative_time(dt: datetime) -> str:
         days = seconds // 86400
         return f"{days} дн. назад"
 
-async def generate_activity_chart(user_id: int, days: int = 30) -> Optional[BytesIO]:
-    series = await get_user_activity_series(user_id, days=days)
-    if not series:
-        return None
-    
-    max_count = max(count for _, count in series) or 0
-    
-    width, height = 800, 450
-    margin_left, margin_right, margin_top, margin_bottom = 60, 40, 80, 70
-    plot_width = width - margin_left - margin_right
-    plot_height = height - margin_top - margin_bottom
-    
-    # Светлая тема
-    img = Image.new("RGB", (width, height), "white")
-    draw = ImageDraw.Draw(img)
-    
-    grid_color = (245, 245, 245)
-    axis_color = (180, 180, 180)
-    bar_color = (255, 120, 0) # Оранжевый
-    text_color = (40, 40, 40)
-    
-    title_font = get_font(30)
-    label_font = get_font(14)
-    grid_font = get_font(12)
-    
-    # Заголовок
-    title = "АКТИВНОСТЬ ЗА 30 ДНЕЙ"
-    draw.text((40, 25), title, fill=text_color, font=title_font)
-    draw.line([(40, 65), (140, 65)], fill=bar_color, width=5)
-    
-    # Сетка
-    steps = 5
-    for i in range(steps + 1):
-        y = margin_top + plot_height - int(plot_height * i / steps)
-        draw.line([(margin_left, y), (width - margin_right, y)], fill=grid_color, width=1)
-        
-        val = int(max_count * i / steps) if max_count > 0 else 0
-        draw.text((15, y - 8), str(val), fill=axis_color, font=grid_font)
-    
-    n = len(series)
-    bar_spacing = plot_width / max(n, 1)
-    bar_width = max(4, int(bar_spacing * 0.75))
-    
-    for idx, (day, count) in enumerate(series):
-        x_center = margin_left + int(bar_spacing * idx + bar_spacing / 2)
-        h = int((count / max_count) * plot_height) if max_count > 0 else 0
-        
-        x0 = x_center - bar_width // 2
-        x1 = x_center + bar_width // 2
-        y1 = margin_top + plot_height
-        y0 = y1 - h
-        
-        if h > 2:
-            # Чистый оранжевый столбик со скруглением сверху
-            draw.rounded_rectangle([x0, y0, x1, y1], radius=6, fill=bar_color)
-        else:
-            # Минимальная отметка для нулевой/малой активности
-            draw.rounded_rectangle([x0, y1-3, x1, y1], radius=2, fill=(235, 235, 235))
-            
-        # Подписи дат (каждые 5 дней)
-        if idx % 5 == 0:
-            label = day.strftime("%d.%m")
-            bbox = draw.textbbox((0, 0), label, font=label_font)
-            lw = bbox[2] - bbox[0]
-            draw.text((x_center - lw / 2, height - margin_bottom + 15), label, fill=axis_color, font=label_font)
-    
-    buf = BytesIO()
-    img.save(buf, format="PNG")
-    buf.seek(0)
-    return buf
+# Готовые картинки профиля: (вид, user_id, хэш данных) -> PNG.
+# После первой отправки Telegram возвращает file_id, и дальше картинка
+# отправляется по нему — без отрисовки и повторной загрузки.
+_image_cache = get_cache("profile_images", ttl=config.image_cache_ttl, maxsize=config.image_cache_size)
+_file_id_cache = get_cache("profile_file_ids", ttl=config.image_cache_ttl, maxsize=config.file_id_cache_size)
 
+ImageKey = Tuple[str, int, int]
 
-async def generate_level_card_image(user_id: int, username: str) -> Optional[BytesIO]:
-    level_data = await get_user_level(user_id)
-    level = level_data["level"]
-    xp = level_data["xp"]
-    needed = level_data["needed_xp"]
-    
-    # Очистка имени от эмодзи для предотвращения квадратов
-    display_username = clean_text(username)
-    if not display_username:
-        display_username = "User"
 
-    width, height = 800, 400
-    bg_color = (255, 255, 255)
-    accent_color = (255, 120, 0)
-    text_main = (40, 40, 40)
-    text_secondary = (140, 140, 140)
-    bar_bg = (245, 245, 245)
-    
-    image = Image.new("RGB", (width, height), bg_color)
-    draw = ImageDraw.Draw(image)
-    
-    font_name = get_font(42)
-    font_lvl_label = get_font(24)
-    font_lvl_val = get_font(80)
-    font_xp = get_font(22)
-    font_avatar = get_font(70)
+async def _get_photo(key: ImageKey, render: Callable[..., bytes], *args) -> Optional[Union[str, types.BufferedInputFile]]:
+    """file_id, если картинка уже отправлялась, иначе файл из кэша или свежей отрисовки."""
+    file_id = _file_id_cache.get(key)
+    if file_id is not _MISSING:
+        return file_id
 
-    # Декор
-    draw.ellipse([width-150, -50, width+50, 150], fill=(255, 120, 0, 30))
-    
-    # Аватар
-    avatar_size = 160
-    av_x, av_y = 50, 50
-    draw.ellipse([av_x-2, av_y-2, av_x+avatar_size+2, av_y+avatar_size+2], outline=(240, 240, 240), width=2)
-    
-    # Дефолтный аватар
-    draw.ellipse([av_x, av_y, av_x+avatar_size, av_y+avatar_size], fill=accent_color)
-    letter = display_username[0].upper() if display_username else "?"
-    bbox = draw.textbbox((0, 0), letter, font=font_avatar)
-    tw, th = bbox[2]-bbox[0], bbox[3]-bbox[1]
-    draw.text((av_x+(avatar_size-tw)/2, av_y+(avatar_size-th)/2 - 8), letter, font=font_avatar, fill=(255, 255, 255))
+    data = _image_cache.get(key)
+    if data is _MISSING:
+        data = await render_pool.render(render, *args)
+        if not data:
+            return None
+        _image_cache.set(key, data)
+    return types.BufferedInputFile(data, filename=f"{key[0]}_{key[1]}.png")
 
-    # Инфо
-    info_x = av_x + avatar_size + 40
-    draw.text((info_x, av_y + 10), display_username, font=font_name, fill=text_main)
-    draw.text((info_x, av_y + 65), "УРОВЕНЬ", font=font_lvl_label, fill=text_secondary)
-    draw.text((info_x, av_y + 85), str(level), font=font_lvl_val, fill=accent_color)
-    
-    # Прогресс-бар
-    bar_x, bar_y = 50, 270
-    bar_w, bar_h = 700, 55
-    draw.rounded_rectangle([bar_x, bar_y, bar_x+bar_w, bar_y+bar_h], radius=28, fill=bar_bg)
-    
-    progress = min(1.0, xp / needed) if needed > 0 else 0
-    if progress > 0:
-        fill_w = int(bar_w * progress)
-        fill_w = max(fill_w, 56)
-        draw.rounded_rectangle([bar_x, bar_y, bar_x+fill_w, bar_y+bar_h], radius=28, fill=accent_color)
-    
-    xp_text = f"{xp} / {needed} XP"
-    bbox = draw.textbbox((0, 0), xp_text, font=font_xp)
-    tw = bbox[2]-bbox[0]
-    draw.text((bar_x + (bar_w - tw)/2, bar_y + bar_h + 10), xp_text, font=font_xp, fill=text_secondary)
 
-    buf = BytesIO()
-    image.save(buf, format="PNG")
-    buf.seek(0)
-    return buf
+def remember_photo(key: ImageKey, sent: Union[types.Message, bool, None]):
+    """Запоминает file_id из отправленного (или отредактированного) сообщения с картинкой."""
+    if isinstance(sent, types.Message) and sent.photo:
+        _file_id_cache.set(key, sent.photo[-1].file_id)
+        # Байты больше не нужны: дальше картинка отправляется по file_id
+        _image_cache.invalidate(key)
+
+
+async def get_activity_chart_photo(
+    user_id: int, days: int = 30, series: Optional[List[Tuple[datetime, int]]] = None
+) -> Tuple[ImageKey, Optional[Union[str, types.BufferedInputFile]]]:
+    """График активности для answer_photo/InputMediaPhoto и ключ для remember_photo."""
+    if series is None:
+        series = await get_user_activity_series(user_id, days=days)
+    key = ("chart", user_id, hash(tuple(series)))
+    if not series:
+        return key, None
+    return key, await _get_photo(key, render_activity_chart, series)
+
+
+async def get_level_card_photo(
+    user_id: int, username: str, level_data: Optional[Dict[str, Any]] = None
+) -> Tuple[ImageKey, Optional[Union[str, types.BufferedInputFile]]]:
+    """Карточка уровня для answer_photo/InputMediaPhoto и ключ для remember_photo."""
+    if level_data is None:
+        level_data = await get_user_level(user_id)
+    args = (username, level_data["level"], level_data["xp"], level_data["needed_xp"])
+    key = ("level", user_id, hash(args))
+    return key, await _get_photo(key, render_level_card, *args)
 
 
 async def get_user_profile(message: types.Message, target_user_id: int):
     """
     Формирует и отправляет профиль пользователя.
     """
-    profile_text, has_quote = await build_profile_text(message, target_user_id)
+    profile_text, has_quote, series = await build_profile_text(message, target_user_id)
     
-    chart = await generate_activity_chart(target_user_id)
+    chart_key, photo = await get_activity_chart_photo(target_user_id, series=series)
     
-    if chart:
-        photo = types.BufferedInputFile(chart.getvalue(), filename=f"chart_{target_user_id}.png")
-        await message.answer_photo(
+    if photo:
+        sent = await message.answer_photo(
             photo=photo,
             caption=profile_text,
             parse_mode="HTML",
             reply_markup=get_profile_kb(target_user_id, has_quote=has_quote)
         )
+        remember_photo(chart_key, sent)
     else:
         await message.answer(
             profile_text,
@@ -252,12 +119,24 @@ async def build_profile_text(message: types.Message, target_user_id: int):
     """
     Строит текст профиля и признак наличия цитаты без отправки сообщения.
     Используется как для первого показа, так и для возврата из меню уровней.
+    Возвращает также серию активности, чтобы график не запрашивал ее повторно.
     """
-    db_data = await get_user_profile_data(target_user_id, message.chat.id)
-    
-    try:
+    # Все данные из БД одним запросом, параллельно с запросом к Telegram
+    db_data, member = await asyncio.gather(
+        get_profile_bundle(target_user_id, message.chat.id),
+        message.chat.get_member(target_user_id),
+        return_exceptions=True
+    )
+    # Без участника чата профиль строится по данным БД, без данных БД — нет
+    if isinstance(db_data, Exception):
+        raise db_data
+
+    if isinstance(member, Exception):
+        user_mention = format_mention(
+            target_user_id, db_data.get("nickname"), db_data.get("username"), db_data.get("full_name")
+        )
+    else:
         display_name = db_data.get("nickname")
-        member = await message.chat.get_member(target_user_id)
         user = member.user
         
         if not display_name:
@@ -267,13 +146,11 @@ async def build_profile_text(message: types.Message, target_user_id: int):
         
         if member.status == "creator" and db_data["rank_level"] < 5:
             db_data["rank_level"] = 5
-    except Exception:
-        user_mention = await get_mention_by_id(target_user_id)
     
-    rank_name = await get_group_rank_name(message.chat.id, db_data["rank_level"], "nom")
-    stats = await get_user_activity_summary(target_user_id)
-    rep_data = await get_user_reputation(message.chat.id, target_user_id)
-    balance = await get_user_balance(target_user_id)
+    rank_name = resolve_rank_name(db_data["rank_names"], db_data["rank_level"])
+    stats = db_data["stats"]
+    rep_data = db_data["reputation"]
+    balance = db_data["balance"]
     
     first_app_dt = datetime.fromisoformat(db_data["first_appearance"])
     first_app_str = first_app_dt.strftime("%d.%m.%Y")
@@ -292,14 +169,17 @@ async def build_profile_text(message: types.Message, target_user_id: int):
     marriage = db_data.get("marriage")
     if marriage:
         partner_id = [p for p in marriage["partners"] if p != target_user_id][0]
-        partner_mention = await get_mention_by_id(partner_id)
+        partner = db_data.get("partner") or {}
+        partner_mention = format_mention(
+            partner_id, partner.get("nickname"), partner.get("username"), partner.get("full_name")
+        )
         profile_text += f"💍 <b>В браке с:</b> {partner_mention}\n"
     
-    clan = await get_user_clan(message.chat.id, target_user_id)
+    clan = db_data["clan"]
     if clan:
         profile_text += f"🛡 <b>Клан:</b> {clan['name']}\n"
     
-    clubs = await get_user_clubs(message.chat.id, target_user_id)
+    clubs = db_data["clubs"]
     if clubs:
         clubs_str = ", ".join([c["name"] for c in clubs])
         profile_text += f"🎨 <b>Кружки:</b> {clubs_str}\n"
@@ -311,4 +191,4 @@ async def build_profile_text(message: types.Message, target_user_id: int):
     )
     
     has_quote = bool(db_data.get("quote"))
-    return profile_text, has_quote
+    return profile_text, has_quote, db_data["series"]
@@ -1,9 +1,10 @@
 from aiogram import types
 from datetime import datetime, timedelta
-from bot.utils.db_manager import add_warn, get_warns, remove_last_warn, remove_warn_by_index, clear_warns, get_user_mention_with_nickname, get_mention_by_id
+from bot.utils.db_manager import add_warn, get_warns, remove_last_warn, remove_warn_by_index, clear_warns, get_mention_by_id
+from bot.utils.update_context import UpdateContext
 import re
 
-async def warn_user(message: types.Message, target_user_id: int, command_args: str):
+async def warn_user(message: types.Message, target_user_id: int, command_args: str, ctx: UpdateContext):
     """
     Выдает предупреждение пользователю.
     """
@@ -38,11 +39,11 @@ async def warn_user(message: types.Message, target_user_id: int, command_args: s
     warn_count = await add_warn(message.chat.id, target_user_id, reason, until_date)
     
     # Получаем упоминания админа и цели с учетом никнеймов
-    admin_mention = await get_user_mention_with_nickname(message.from_user)
+    admin_mention = await ctx.mention(message.from_user)
     
     # Пытаемся получить упоминание цели. 
     if message.reply_to_message and message.reply_to_message.from_user.id == target_user_id:
-        target_mention = await get_user_mention_with_nickname(message.reply_to_message.from_user)
+        target_mention = await ctx.mention(message.reply_to_message.from_user)
     else:
         target_mention = await get_mention_by_id(target_user_id, "пользователю")
 
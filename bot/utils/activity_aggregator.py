@@ -0,0 +1,98 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+from bot.config_reader import config
+from bot.utils.db_manager import supabase, _retry_supabase_call
+import httpx
+
+# Ошибки, при которых запрос точно не дошел до сервера: счетчики можно вернуть и отправить позже
+_NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class ActivityAggregator:
+    """
+    Копит счетчики сообщений в памяти (пользователь + день) и периодически
+    сбрасывает их в БД одним пакетным запросом.
+    Каждое сообщение учитывается, а число записей зависит от количества
+    активных пользователей за интервал, а не от количества сообщений.
+    """
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        # (user_id, "YYYY-MM-DD") -> количество сообщений
+        self._counts: Dict[Tuple[int, str], int] = {}
+        # user_id -> время последнего сообщения (ISO)
+        self._last_message: Dict[int, str] = {}
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, user_id: int):
+        """Учитывает одно сообщение пользователя. Не обращается к БД."""
+        now = datetime.now(timezone.utc)
+        key = (user_id, now.date().isoformat())
+        self._counts[key] = self._counts.get(key, 0) + 1
+        self._last_message[user_id] = now.isoformat()
+
+    @property
+    def pending(self) -> int:
+        return len(self._counts)
+
+    async def flush(self):
+        """Отправляет накопленные счетчики в БД."""
+        async with self._lock:
+            if not self._counts:
+                return
+
+            counts, self._counts = self._counts, {}
+            last_message, self._last_message = self._last_message, {}
+
+            rows = [
+                {
+                    "user_id": user_id,
+                    "date": date,
+                    "count": count,
+                    "last_message": last_message.get(user_id)
+                }
+                for (user_id, date), count in counts.items()
+            ]
+
+            try:
+                # flush_activity прибавляет счетчики: повтор после таймаута посчитал бы сообщения дважды
+                await _retry_supabase_call(supabase.rpc("flush_activity", {"p_rows": rows}), idempotent=False)
+            except _NOT_SENT_ERRORS as e:
+                logging.warning(f"Не удалось сохранить активность ({len(rows)} записей), повторим позже: {e}")
+                self._restore(counts, last_message)
+            except Exception as e:
+                # Запрос мог быть выполнен сервером — повторная отправка посчитала бы сообщения дважды
+                logging.error(f"Активность ({len(rows)} записей) не сохранена, пакет отброшен: {e}")
+
+    def _restore(self, counts: Dict[Tuple[int, str], int], last_message: Dict[int, str]):
+        """Возвращает несохраненные счетчики обратно, чтобы не потерять сообщения."""
+        for key, count in counts.items():
+            self._counts[key] = self._counts.get(key, 0) + count
+        for user_id, ts in last_message.items():
+            self._last_message.setdefault(user_id, ts)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            # Остановка не прерывает отправку на середине: stop() дождется ее через lock
+            await asyncio.shield(self.flush())
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Останавливает таймер и сбрасывает остатки в БД."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+activity_aggregator = ActivityAggregator(config.activity_flush_interval)
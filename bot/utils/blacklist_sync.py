@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import time
+from typing import Optional, Set
+from bot.config_reader import config
+from bot.utils.db_manager import supabase, iter_select
+from bot.utils.invalidation_bus import invalidation_bus
+
+
+class BlacklistSync:
+    """
+    Держит черный список антиспама в памяти и синхронизирует его в фоне.
+    Первый раз таблица загружается целиком постранично, дальше запрашиваются
+    только записи с added_at не раньше последней увиденной. Раз в
+    full_sync_interval список перечитывается полностью, чтобы учесть удаления.
+    Проверка на сообщении — обычный поиск в множестве, без обращений к БД.
+    """
+    def __init__(self, sync_interval: float, full_sync_interval: float):
+        self.sync_interval = sync_interval
+        self.full_sync_interval = full_sync_interval
+        self._ids: Set[int] = set()
+        self._last_added_at: Optional[str] = None
+        self._last_full_sync = 0.0
+        self.loaded = False
+        self._task: Optional[asyncio.Task] = None
+
+    def contains(self, user_id: int) -> bool:
+        """Есть ли пользователь в черном списке. Пока список не загружен, считаем что нет."""
+        return user_id in self._ids
+
+    def add(self, user_id: int):
+        """
+        Добавляет пользователя сразу после записи в БД, не дожидаясь синхронизации:
+        локально и (через шину инвалидаций) в остальных процессах.
+        """
+        self._ids.add(user_id)
+        invalidation_bus.publish("antispam_blacklist", user_id)
+
+    def _on_remote_add(self, user_id: Optional[int]):
+        if user_id is not None:
+            self._ids.add(user_id)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    async def _fetch(self, since: Optional[str]) -> Set[int]:
+        """Постранично читает записи (все или начиная с since), сдвигая отметку последнего added_at."""
+        if since:
+            rows = iter_select(
+                lambda: supabase.table("antispam_blacklist").select("user_id, added_at")
+                .gte("added_at", since).order("added_at").order("user_id")
+            )
+        else:
+            rows = iter_select(
+                lambda: supabase.table("antispam_blacklist").select("user_id, added_at"),
+                key="user_id"
+            )
+        
+        ids: Set[int] = set()
+        async for item in rows:
+            ids.add(item["user_id"])
+            if item.get("added_at") and (self._last_added_at is None or item["added_at"] > self._last_added_at):
+                self._last_added_at = item["added_at"]
+        return ids
+
+    async def sync(self):
+        """Одна синхронизация: полная при первом запуске и раз в full_sync_interval, иначе инкрементальная."""
+        try:
+            if not self.loaded or time.monotonic() - self._last_full_sync >= self.full_sync_interval:
+                self._last_added_at = None
+                self._ids = await self._fetch(None)
+                self._last_full_sync = time.monotonic()
+                if not self.loaded:
+                    logging.info(f"Черный список антиспама загружен: {len(self._ids)} записей")
+                self.loaded = True
+            else:
+                self._ids |= await self._fetch(self._last_added_at)
+        except Exception as e:
+            logging.error(f"Ошибка синхронизации черного списка: {e}")
+
+    async def _run(self):
+        while True:
+            await self.sync()
+            await asyncio.sleep(self.sync_interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+antispam_blacklist = BlacklistSync(config.blacklist_sync_interval, config.blacklist_full_sync_interval)
+invalidation_bus.subscribe("antispam_blacklist", antispam_blacklist._on_remote_add)
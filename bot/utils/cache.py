@@ -0,0 +1,204 @@
+import sys
+import time
+import logging
+import functools
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+_MISSING = object()
+
+
+def _deep_sizeof(obj: Any, seen: Optional[set] = None) -> int:
+    """Грубая оценка занимаемой памяти объекта вместе с вложенными контейнерами."""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_deep_sizeof(item, seen) for item in obj)
+    return size
+
+
+class CacheNamespace:
+    """
+    Кэш одного пространства имен: TTL для записей и ограничение размера по LRU.
+    Ведет счетчики попаданий, промахов и вытеснений.
+    """
+    def __init__(self, name: str, ttl: float, maxsize: int):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        # key -> (expires_at, value); порядок = порядок последнего использования
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        # Поколения ключей: каждая инвалидация увеличивает поколение ключа, clear — эпоху.
+        # Чтение из БД, начатое до инвалидации, не должно записать в кэш устаревшее значение
+        self._generations: Dict[Hashable, int] = {}
+        self._epoch = 0
+
+    def get(self, key: Hashable, default: Any = _MISSING) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def generation(self, key: Hashable) -> Tuple[int, int]:
+        """Снимок поколения ключа: берется до чтения из БД и передается в set."""
+        return self._epoch, self._generations.get(key, 0)
+
+    def _bump(self, key: Hashable):
+        if key not in self._generations and len(self._generations) >= self.maxsize:
+            # Ограничиваем память: сброс словаря со сменой эпохи делает устаревшими все снимки
+            self._generations.clear()
+            self._epoch += 1
+        self._generations[key] = self._generations.get(key, 0) + 1
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, generation: Optional[Tuple[int, int]] = None):
+        """
+        Записывает значение. С generation (снимок из generation() до чтения из БД) запись
+        пропускается, если ключ с тех пор инвалидировали.
+        """
+        if generation is not None and generation != self.generation(key):
+            return
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable, propagate: bool = True):
+        """
+        Удаляет запись. Вызывается сеттерами после изменения данных в БД.
+        propagate=False — только локально (применение инвалидации, пришедшей из другого процесса).
+        """
+        if self._data.pop(key, None) is not None:
+            self.invalidations += 1
+        if propagate:
+            self.notify_changed(key)
+        else:
+            self._bump(key)
+
+    def clear(self, propagate: bool = True):
+        self.invalidations += len(self._data)
+        self._data.clear()
+        self._generations.clear()
+        self._epoch += 1
+        if propagate:
+            self.notify_changed(None)
+
+    def notify_changed(self, key: Optional[Hashable]):
+        """Сообщает подписчикам об изменении записи (None — всех), не трогая локальную копию."""
+        if key is not None:
+            self._bump(key)
+        for listener in _invalidation_listeners:
+            listener(self.name, key)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "memory_bytes": _deep_sizeof(self._data),
+        }
+
+
+_namespaces: Dict[str, CacheNamespace] = {}
+_invalidation_listeners: List[Callable[[str, Optional[Hashable]], None]] = []
+
+
+def get_cache(name: str, ttl: float = 300, maxsize: int = 10000) -> CacheNamespace:
+    """Возвращает (создавая при первом обращении) пространство имен кэша."""
+    cache = _namespaces.get(name)
+    if cache is None:
+        cache = CacheNamespace(name, ttl, maxsize)
+        _namespaces[name] = cache
+    return cache
+
+
+def find_cache(name: str) -> Optional[CacheNamespace]:
+    """Пространство имен, если оно уже создано в этом процессе."""
+    return _namespaces.get(name)
+
+
+def add_invalidation_listener(listener: Callable[[str, Optional[Hashable]], None]):
+    """Подписка на инвалидации (namespace, key). key=None означает полную очистку."""
+    _invalidation_listeners.append(listener)
+
+
+def cached(
+    namespace: str,
+    ttl: float = 300,
+    maxsize: int = 10000,
+    key: Optional[Callable[..., Hashable]] = None,
+    condition: Callable[[Any], bool] = lambda value: value is not None,
+):
+    """
+    Декоратор для async-функций. По умолчанию ключ — позиционные аргументы.
+    Результат кэшируется, только если condition(result) истинно
+    (чтобы не запоминать пустые ответы после ошибок БД).
+    """
+    cache = get_cache(namespace, ttl, maxsize)
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            cache_key = key(*args, **kwargs) if key else (args + tuple(sorted(kwargs.items())) if kwargs else args)
+            value = cache.get(cache_key)
+            if value is not _MISSING:
+                return value
+            generation = cache.generation(cache_key)
+            value = await func(*args, **kwargs)
+            if condition(value):
+                cache.set(cache_key, value, generation=generation)
+            return value
+
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+
+def get_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Статистика по всем пространствам имен кэша."""
+    return {name: cache.stats() for name, cache in _namespaces.items()}
+
+
+def log_cache_stats():
+    for name, stats in get_cache_stats().items():
+        logging.info(
+            f"Кэш {name}: {stats['size']}/{stats['maxsize']} записей, "
+            f"попаданий {stats['hit_rate']:.0%} ({stats['hits']}/{stats['hits'] + stats['misses']}), "
+            f"вытеснено {stats['evictions']}, истекло {stats['expirations']}, "
+            f"~{stats['memory_bytes'] / 1024:.1f} КБ"
+        )
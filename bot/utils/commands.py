@@ -0,0 +1,147 @@
+from typing import Any, Dict, Iterable, List, Optional, Set, Union
+from aiogram import types
+from aiogram.filters import BaseFilter
+
+
+class _TrieNode:
+    __slots__ = ("children", "prefix_ids", "word_ids")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        # Фильтры, для которых путь до узла — префикс команды
+        self.prefix_ids: List[int] = []
+        # Фильтры, для которых это целое слово (дальше должна идти граница слова)
+        self.word_ids: List[int] = []
+
+
+class CommandIndex:
+    """
+    Индекс текстовых команд всех хендлеров: префиксное дерево префиксов и слов
+    плюс словарь точных совпадений. Текст сообщения приводится к нижнему регистру
+    один раз и проходится по дереву один раз — в результате сразу известно,
+    какие CommandFilter сработают и каким префиксом.
+    """
+    def __init__(self):
+        self._root = _TrieNode()
+        self._exact: Dict[str, List[int]] = {}
+        self._next_id = 0
+        # Фильтры, сравнивающие текст без пробелов по краям
+        self.strip_ids: Set[int] = set()
+
+    def register(
+        self,
+        prefixes: Iterable[str],
+        exact: Iterable[str],
+        words: Iterable[str],
+        strip: bool = False
+    ) -> int:
+        filter_id = self._next_id
+        self._next_id += 1
+        if strip:
+            self.strip_ids.add(filter_id)
+        for prefix in prefixes:
+            self._node(prefix.lower()).prefix_ids.append(filter_id)
+        for word in words:
+            self._node(word.lower()).word_ids.append(filter_id)
+        for text in exact:
+            self._exact.setdefault(text.lower(), []).append(filter_id)
+        return filter_id
+
+    def _node(self, text: str) -> _TrieNode:
+        node = self._root
+        for char in text:
+            node = node.children.setdefault(char, _TrieNode())
+        return node
+
+    def match(self, text: str) -> Dict[int, str]:
+        """
+        Возвращает {id фильтра: самый длинный совпавший префикс} для уже нормализованного текста.
+        Пустой результат — сообщение не является командой ни одного хендлера.
+        """
+        matched: Dict[int, str] = {}
+        node = self._root
+        for pos, char in enumerate(text):
+            node = node.children.get(char)
+            if node is None:
+                break
+            if node.prefix_ids:
+                for filter_id in node.prefix_ids:
+                    matched[filter_id] = text[:pos + 1]
+            if node.word_ids:
+                next_pos = pos + 1
+                if next_pos == len(text) or not (text[next_pos].isalnum() or text[next_pos] == "_"):
+                    for filter_id in node.word_ids:
+                        matched[filter_id] = text[:next_pos]
+
+        for filter_id in self._exact.get(text, ()):
+            matched[filter_id] = text
+        return matched
+
+
+command_index = CommandIndex()
+
+
+def normalize_command_text(message: types.Message) -> str:
+    """Текст (или подпись) сообщения в том виде, в котором его сравнивают команды."""
+    return (message.text or message.caption or "").lower()
+
+
+def match_commands(message: types.Message) -> Dict[int, str]:
+    text = normalize_command_text(message)
+    matched = command_index.match(text)
+    stripped = text.strip()
+    if stripped != text and command_index.strip_ids:
+        for filter_id, prefix in command_index.match(stripped).items():
+            if filter_id in command_index.strip_ids:
+                matched.setdefault(filter_id, prefix)
+    return matched
+
+
+class CommandFilter(BaseFilter):
+    """
+    Текстовая команда: префиксы (startswith), точные совпадения (==)
+    и слова (начало текста + граница слова, как ^слово\\b).
+    Сравнение без учета регистра. По умолчанию проверяется только текст
+    сообщения, with_caption=True разрешает и подпись к медиа, strip=True
+    отбрасывает пробелы по краям текста перед сравнением.
+    Совпавшая команда передается в хендлер как command_prefix.
+    """
+    def __init__(
+        self,
+        *prefixes: str,
+        exact: Iterable[str] = (),
+        words: Iterable[str] = (),
+        with_caption: bool = False,
+        strip: bool = False
+    ):
+        self.prefixes = tuple(prefixes)
+        self.exact = tuple([exact] if isinstance(exact, str) else exact)
+        self.words = tuple(words)
+        self.with_caption = with_caption
+        self.strip = strip
+        self.filter_id = command_index.register(self.prefixes, self.exact, self.words, strip)
+
+    async def __call__(
+        self,
+        message: types.Message,
+        text_commands: Optional[Dict[int, str]] = None
+    ) -> Union[bool, Dict[str, Any]]:
+        if not self.with_caption and message.text is None:
+            return False
+        if text_commands is None:
+            text_commands = match_commands(message)
+        prefix = text_commands.get(self.filter_id)
+        if prefix is None:
+            return False
+        return {"command_prefix": prefix}
+
+
+class AnyCommandFilter(BaseFilter):
+    """
+    Фильтр уровня роутера: пропускает только сообщения, совпавшие хоть с одной командой.
+    Обычные сообщения чата отсекаются одной проверкой, до фильтров модулей и хендлеров.
+    """
+    async def __call__(self, message: types.Message, text_commands: Optional[Dict[int, str]] = None) -> bool:
+        if text_commands is None:
+            text_commands = match_commands(message)
+        return bool(text_commands)
@@ -2,35 +2,36 @@ import asyncio
 import time
 import logging
 from datetime import datetime, timezone, timedelta
-from typing import Optional, List, Dict, Any, Tuple
+from typing import Optional, List, Dict, Any, Tuple, Iterable, Callable, AsyncIterator
 from aiogram import types
-from supabase import create_client, Client
 from bot.config_reader import config
+from bot.utils.supabase_pool import supabase, pool_monitor
+from bot.utils.cache import get_cache, cached, _MISSING
 import httpx
 
-# Инициализация клиента Supabase
-supabase: Client = create_client(
-    config.supabase_url,
-    config.supabase_key.get_secret_value()
-)
-
-async def _retry_supabase_call(query_builder, retries: int = 3, base_delay: float = 0.5):
+async def _retry_supabase_call(query_builder, retries: int = 3, base_delay: float = 0.5, idempotent: bool = True):
     """
     Вспомогательная функция для повторных попыток запроса к Supabase при сетевых ошибках.
     Логические ошибки (неправильный запрос, 4xx и т.п.) не ретраятся, чтобы не подвешивать бота.
+    Для неидемпотентных запросов (инкременты через rpc) повтор делается только при ошибке
+    соединения, когда запрос гарантированно не дошел до сервера.
     """
     last_exception = None
     delay = base_delay
     for attempt in range(1, retries + 1):
         start = time.monotonic()
         try:
-            result = await asyncio.to_thread(query_builder.execute)
+            async with pool_monitor:
+                result = await query_builder.execute()
             elapsed_ms = (time.monotonic() - start) * 1000
             if elapsed_ms > 800:
                 logging.warning(f"Медленный запрос к Supabase ({elapsed_ms:.0f} мс): {query_builder}")
             return result
         except httpx.HTTPError as e:
             last_exception = e
+            if not idempotent and not isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout)):
+                logging.error(f"Сетевая ошибка Supabase при неидемпотентном запросе, без повтора: {e}")
+                raise
             if attempt < retries:
                 logging.warning(
                     f"Сетевая ошибка Supabase (попытка {attempt}/{retries}): {e}. "
@@ -46,13 +47,62 @@ async def _retry_supabase_call(query_builder, retries: int = 3, base_delay: floa
 
     raise last_exception
 
-# Кэш для активности
-_activity_cache = {}
-# Кэш для настроек модулей (chat_id -> {"modules": list, "timestamp": float})
-_modules_cache = {}
-# Кэш для настроек прав (chat_id -> {"settings": dict, "timestamp": float})
-_permissions_cache = {}
-_CACHE_TTL = 300
+async def iter_select(
+    build_query: Callable[[], Any],
+    page_size: Optional[int] = None,
+    key: Optional[str] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Построчно отдает результат select, запрашивая его страницами, чтобы ответ
+    не обрезался лимитом max-rows PostgREST и в памяти была одна страница.
+    build_query должен каждый раз возвращать новый запрос (билдеры postgrest изменяемые).
+    Без key страницы берутся через range(offset, ...), запрос должен быть упорядочен.
+    С key — keyset-пагинация (order по key и key > последнего значения): дальние
+    страницы не замедляются, key должен быть уникальным в выборке.
+    """
+    page_size = page_size or config.supabase_page_size
+    offset = 0
+    last_key = None
+    while True:
+        query = build_query()
+        if key:
+            if last_key is not None:
+                query = query.gt(key, last_key)
+            query = query.order(key).limit(page_size)
+        else:
+            query = query.range(offset, offset + page_size - 1)
+        
+        res = await _retry_supabase_call(query)
+        rows = res.data or []
+        for row in rows:
+            yield row
+        
+        if len(rows) < page_size:
+            return
+        offset += len(rows)
+        if key:
+            last_key = rows[-1][key]
+
+# С шиной инвалидаций через Postgres изменения доходят до всех процессов сразу,
+# и TTL нужен только как страховка от правок в обход бота
+_CACHE_TTL = config.cache_bus_ttl if config.cache_bus == "postgres" else config.cache_ttl
+
+# Кэш для настроек модулей (chat_id -> list)
+_modules_cache = get_cache("modules", ttl=_CACHE_TTL, maxsize=10000)
+# Кэш для настроек прав (chat_id -> dict)
+_permissions_cache = get_cache("permissions", ttl=_CACHE_TTL, maxsize=10000)
+# Кэш имен для упоминаний (user_id -> (nickname, username, full_name))
+_mention_cache = get_cache("mentions", ttl=_CACHE_TTL, maxsize=5000)
+# Кэши для определения рангов
+_group_ranks_cache = get_cache("group_ranks", ttl=_CACHE_TTL, maxsize=10000)  # chat_id -> {rank: {case: name}}
+_member_rank_cache = get_cache("member_ranks", ttl=_CACHE_TTL, maxsize=50000)  # (chat_id, user_id) -> rank
+_chat_admins_cache = get_cache("chat_admins", ttl=_CACHE_TTL, maxsize=10000)  # chat_id -> {user_id: status}
+# Отпечатки последних записанных в users имен (user_id -> hash((username, full_name)))
+_user_fingerprints = get_cache(
+    "user_fingerprints", ttl=config.user_cache_fingerprint_ttl, maxsize=config.user_cache_fingerprint_size
+)
+# Изменившиеся пользователи, ожидающие пакетной записи (user_id -> строка users)
+_pending_user_rows: Dict[int, Dict[str, Any]] = {}
 
 # --- Users ---
 
@@ -121,18 +171,149 @@ async def get_user_profile_data(user_id: int, chat_id: int) -> Dict[str, Any]:
         
     return data
 
+async def get_profile_bundle(user_id: int, chat_id: int, days: int = 30) -> Dict[str, Any]:
+    """
+    Все данные профиля за один запрос (функция get_profile в БД):
+    поля get_user_profile_data, а также названия рангов чата, репутация, баланс,
+    клан, кружки, данные партнера по браку, серия активности и сводка по ней.
+    """
+    data = {
+        "nickname": None,
+        "username": None,
+        "full_name": None,
+        "description": None,
+        "city": None,
+        "quote": None,
+        "first_appearance": datetime.now(timezone.utc).isoformat(),
+        "last_message": datetime.now(timezone.utc).isoformat(),
+        "rank_level": 1,
+        "rank_names": {},
+        "marriage": None,
+        "partner": None,
+        "has_awards": False,
+        "reputation": {"points": 0, "plus_count": 0, "minus_count": 0},
+        "balance": 0,
+        "clan": None,
+        "clubs": [],
+        "series": _fill_activity_series({}, days),
+        "stats": {"day": 0, "week": 0, "month": 0, "total": 0}
+    }
+    
+    try:
+        res = await _retry_supabase_call(
+            supabase.rpc("get_profile", {"p_chat_id": chat_id, "p_user_id": user_id, "p_days": days})
+        )
+        profile = res.data or {}
+    except Exception as e:
+        logging.error(f"Ошибка при получении профиля {user_id} в чате {chat_id}: {e}")
+        profile = {}
+    
+    u_data = profile.get("user")
+    if u_data:
+        data.update({
+            "nickname": u_data.get("nickname"),
+            "username": u_data.get("username"),
+            "full_name": u_data.get("full_name"),
+            "description": u_data.get("description"),
+            "city": u_data.get("city"),
+            "quote": u_data.get("quote"),
+            "first_appearance": u_data.get("first_appearance"),
+            "last_message": u_data.get("last_message")
+        })
+    
+    if profile.get("rank_level") is not None:
+        data["rank_level"] = profile["rank_level"]
+    if config.creator_id and user_id == config.creator_id:
+        data["rank_level"] = 5
+    data["rank_names"] = {int(level): name for level, name in (profile.get("rank_names") or {}).items()}
+    
+    m = profile.get("marriage")
+    if m:
+        data["marriage"] = {
+            "partners": [m["user1_id"], m["user2_id"]],
+            "created_at": m["created_at"]
+        }
+        data["partner"] = m.get("partner") or {}
+    
+    data["has_awards"] = bool(profile.get("has_awards"))
+    if profile.get("reputation"):
+        data["reputation"] = profile["reputation"]
+    data["balance"] = int(profile.get("balance") or 0)
+    data["clan"] = profile.get("clan")
+    data["clubs"] = profile.get("clubs") or []
+    
+    raw = {datetime.fromisoformat(item["date"]).date(): item.get("count", 0) for item in profile.get("activity") or []}
+    data["series"] = _fill_activity_series(raw, days)
+    data["stats"] = _summarize_activity(data["series"], int(profile.get("activity_total") or 0))
+    
+    return data
+
 async def update_user_cache(user_id: int, username: Optional[str], full_name: Optional[str] = None):
+    """
+    Запоминает username и имя пользователя в users.
+    Если они не менялись с прошлой записи — ничего не делает. Изменения копятся
+    и записываются пакетом (flush_user_cache), а впервые увиденный пользователь
+    записывается сразу: на users ссылаются economy и user_levels.
+    """
     data = {"user_id": user_id}
     if username:
         data["username"] = username.replace("@", "").lower()
     if full_name:
         data["full_name"] = full_name
-    
-    try:
-        await _retry_supabase_call(supabase.table("users").upsert(data))
-    except Exception:
-        # Для кэша это не критично, можно просто залогировать
-        pass
+
+    fingerprint = hash((data.get("username"), data.get("full_name")))
+    previous = _user_fingerprints.get(user_id)
+    if previous == fingerprint:
+        return
+
+    # Обновляем имя в кэше упоминаний сразу, не дожидаясь записи в БД
+    names = _mention_cache.get(user_id)
+    if names is not _MISSING and (
+        ("username" in data and names[1] != data["username"])
+        or ("full_name" in data and names[2] != data["full_name"])
+    ):
+        _mention_cache.set(user_id, (names[0], data.get("username", names[1]), data.get("full_name", names[2])))
+        _mention_cache.notify_changed(user_id)
+
+    if previous is _MISSING:
+        # Отпечаток запоминаем только после записи: одновременный апдейт того же
+        # пользователя тоже дождется строки в users (повторный upsert безвреден)
+        try:
+            await _retry_supabase_call(supabase.table("users").upsert(data))
+        except Exception:
+            # Для кэша это не критично: отложим до следующей пакетной записи
+            _pending_user_rows[user_id] = data
+        _user_fingerprints.set(user_id, fingerprint)
+        return
+
+    _user_fingerprints.set(user_id, fingerprint)
+    _pending_user_rows[user_id] = data
+
+async def flush_user_cache():
+    """Записывает накопленные изменения имен пользователей пакетными upsert."""
+    if not _pending_user_rows:
+        return
+
+    rows = list(_pending_user_rows.values())
+    _pending_user_rows.clear()
+
+    # В одном upsert у всех строк должен быть одинаковый набор колонок,
+    # иначе отсутствующие поля затрутся NULL
+    groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+
+    for group in groups.values():
+        try:
+            await _retry_supabase_call(supabase.table("users").upsert(group))
+        except asyncio.CancelledError:
+            for row in group:
+                _pending_user_rows.setdefault(row["user_id"], row)
+            raise
+        except Exception as e:
+            logging.warning(f"Не удалось записать имена пользователей ({len(group)}), повторим позже: {e}")
+            for row in group:
+                _pending_user_rows.setdefault(row["user_id"], row)
 
 async def get_username_by_id(user_id: int) -> Optional[str]:
     try:
@@ -146,10 +327,13 @@ async def get_username_by_id(user_id: int) -> Optional[str]:
 async def get_chat_user_ids(chat_id: int) -> List[int]:
     """Возвращает список ID всех пользователей, которые писали в этом чате."""
     try:
-        res = await _retry_supabase_call(
-            supabase.table("chat_members").select("user_id").eq("chat_id", chat_id)
-        )
-        return [item["user_id"] for item in res.data] if res.data else []
+        return [
+            item["user_id"]
+            async for item in iter_select(
+                lambda: supabase.table("chat_members").select("user_id").eq("chat_id", chat_id),
+                key="user_id"
+            )
+        ]
     except Exception as e:
         logging.error(f"Ошибка при получении участников чата: {e}")
         return []
@@ -175,6 +359,13 @@ async def get_user_id_by_username(username: str) -> Optional[int]:
 
 # --- Mutes & Bans ---
 
+def _active_filter() -> str:
+    """
+    Фильтр PostgREST для действующих записей: бессрочные или с until в будущем.
+    Истекшие строки удаляет ExpirySweeper, чтения ничего не удаляют.
+    """
+    return f"until.is.null,until.gt.{datetime.now(timezone.utc).isoformat()}"
+
 async def add_mute(chat_id: int, user_id: int, until_date: Optional[datetime] = None):
     until = until_date.isoformat() if until_date else None
     try:
@@ -194,22 +385,12 @@ async def remove_mute(chat_id: int, user_id: int):
 
 async def is_user_muted(chat_id: int, user_id: int) -> bool:
     try:
-        res = await _retry_supabase_call(supabase.table("mutes").select("*").eq("chat_id", chat_id).eq("user_id", user_id))
-        if not res.data:
-            return False
-        
-        until = res.data[0].get("until")
-        if not until: # Permanent
-            return True
-        
-        until_date = datetime.fromisoformat(until)
-        if until_date > datetime.now(timezone.utc):
-            return True
-        
-        await remove_mute(chat_id, user_id)
+        res = await _retry_supabase_call(
+            supabase.table("mutes").select("until").eq("chat_id", chat_id).eq("user_id", user_id).or_(_active_filter())
+        )
+        return bool(res.data)
     except Exception:
-        pass
-    return False
+        return False
 
 async def add_ban(chat_id: int, user_id: int, until_date: Optional[datetime] = None):
     until = until_date.isoformat() if until_date else None
@@ -230,22 +411,24 @@ async def remove_ban(chat_id: int, user_id: int):
 
 async def is_user_banned(chat_id: int, user_id: int) -> bool:
     try:
-        res = await _retry_supabase_call(supabase.table("bans").select("*").eq("chat_id", chat_id).eq("user_id", user_id))
-        if not res.data:
-            return False
-        
-        until = res.data[0].get("until")
-        if not until: # Permanent
-            return True
-        
-        until_date = datetime.fromisoformat(until)
-        if until_date > datetime.now(timezone.utc):
-            return True
-        
-        await remove_ban(chat_id, user_id)
+        res = await _retry_supabase_call(
+            supabase.table("bans").select("until").eq("chat_id", chat_id).eq("user_id", user_id).or_(_active_filter())
+        )
+        return bool(res.data)
     except Exception:
-        pass
-    return False
+        return False
+
+async def sweep_expired_punishments(batch_size: int) -> Optional[int]:
+    """Удаляет до batch_size истекших строк из mutes, bans и warns (каждой). None при ошибке БД."""
+    try:
+        res = await _retry_supabase_call(
+            supabase.rpc("sweep_expired_punishments", {"p_limit": batch_size}),
+            idempotent=False
+        )
+        return res.data or 0
+    except Exception as e:
+        logging.error(f"Ошибка при удалении истекших наказаний: {e}")
+        return None
 
 # --- Warns ---
 
@@ -259,43 +442,33 @@ async def add_warn(chat_id: int, user_id: int, reason: str = "Не указан
             "until": until
         }))
         
-        res = await _retry_supabase_call(supabase.table("warns").select("id", count="exact").eq("chat_id", chat_id).eq("user_id", user_id))
+        res = await _retry_supabase_call(
+            supabase.table("warns").select("id", count="exact").eq("chat_id", chat_id).eq("user_id", user_id)
+            .or_(_active_filter())
+        )
         return len(res.data) if res.data else 0
     except Exception as e:
         logging.error(f"Ошибка при добавлении варна: {e}")
         return 0
 
 async def get_warns(chat_id: int, user_id: int) -> List[Dict]:
+    """Действующие варны пользователя в порядке выдачи."""
     try:
-        res = await _retry_supabase_call(supabase.table("warns").select("*").eq("chat_id", chat_id).eq("user_id", user_id))
-        if not res.data:
-            return []
-        
-        active_warns = []
-        current_time = datetime.now(timezone.utc)
-        expired_ids = []
-        
-        for warn in res.data:
-            if not warn["until"]:
-                active_warns.append(warn)
-            else:
-                until_date = datetime.fromisoformat(warn["until"])
-                if until_date > current_time:
-                    active_warns.append(warn)
-                else:
-                    expired_ids.append(warn["id"])
-        
-        if expired_ids:
-            await _retry_supabase_call(supabase.table("warns").delete().in_("id", expired_ids))
-            
-        return active_warns
+        res = await _retry_supabase_call(
+            supabase.table("warns").select("*").eq("chat_id", chat_id).eq("user_id", user_id)
+            .or_(_active_filter()).order("id")
+        )
+        return res.data or []
     except Exception as e:
         logging.error(f"Ошибка при получении варнов: {e}")
         return []
 
 async def remove_last_warn(chat_id: int, user_id: int) -> bool:
     try:
-        res = await _retry_supabase_call(supabase.table("warns").select("id").eq("chat_id", chat_id).eq("user_id", user_id).order("id", desc=True).limit(1))
+        res = await _retry_supabase_call(
+            supabase.table("warns").select("id").eq("chat_id", chat_id).eq("user_id", user_id)
+            .or_(_active_filter()).order("id", desc=True).limit(1)
+        )
         if res.data:
             await _retry_supabase_call(supabase.table("warns").delete().eq("id", res.data[0]["id"]))
             return True
@@ -325,12 +498,14 @@ async def clear_warns(chat_id: int, user_id: int) -> bool:
 async def set_nickname(user_id: int, nickname: str):
     try:
         await _retry_supabase_call(supabase.table("users").upsert({"user_id": user_id, "nickname": nickname}))
+        _mention_cache.invalidate(user_id)
     except Exception as e:
         logging.error(f"Ошибка при установке никнейма: {e}")
 
 async def remove_nickname(user_id: int) -> bool:
     try:
         await _retry_supabase_call(supabase.table("users").update({"nickname": None}).eq("user_id", user_id))
+        _mention_cache.invalidate(user_id)
         return True
     except Exception:
         return False
@@ -469,28 +644,44 @@ DEFAULT_RANK_CASES = {
     5: {"nom": "Создатель", "gen": "Создателя", "ins": "Создателем"}
 }
 
-async def get_group_rank_name(chat_id: int, rank_level: int, case: str = "nom") -> str:
-    """Получает название ранга для конкретной группы с учетом падежа."""
+async def get_group_rank_names(chat_id: int) -> Dict[int, Dict[str, str]]:
+    """Все кастомные названия рангов группы: {ранг: {"nom": ..., "gen": ..., "ins": ...}}. Кэшируется."""
+    rank_names = _group_ranks_cache.get(chat_id)
+    if rank_names is not _MISSING:
+        return rank_names
+    
+    generation = _group_ranks_cache.generation(chat_id)
     try:
         res = await _retry_supabase_call(
-            supabase.table("group_ranks")
-            .select(f"name_{case}")
-            .eq("chat_id", chat_id)
-            .eq("rank_number", rank_level)
+            supabase.table("group_ranks").select("rank_number, name_nom, name_gen, name_ins").eq("chat_id", chat_id)
         )
-        
-        if res.data:
-            rank_name = res.data[0].get(f"name_{case}")
-            logging.info(f"DEBUG: Получено кастомное название ранга для чата {chat_id}, уровень {rank_level}: {rank_name}")
-            return rank_name
-        else:
-            logging.info(f"DEBUG: Кастомное название ранга для чата {chat_id}, уровень {rank_level} не найдено, используем дефолт.")
     except Exception as e:
-        logging.warning(f"Ошибка при получении названия ранга из БД (чат {chat_id}, уровень {rank_level}): {e}")
+        logging.warning(f"Ошибка при получении названий рангов из БД (чат {chat_id}): {e}")
+        return {}
+    
+    rank_names = {
+        item["rank_number"]: {case: item.get(f"name_{case}") for case in ("nom", "gen", "ins")}
+        for item in res.data or []
+    }
+    _group_ranks_cache.set(chat_id, rank_names, generation=generation)
+    return rank_names
+
+async def get_group_rank_name(chat_id: int, rank_level: int, case: str = "nom") -> str:
+    """Получает название ранга для конкретной группы с учетом падежа."""
+    rank_names = await get_group_rank_names(chat_id)
+    rank_name = rank_names.get(rank_level, {}).get(case)
+    if rank_name:
+        return rank_name
     
     # Возвращаем дефолтное значение
     return DEFAULT_RANK_CASES.get(rank_level, {}).get(case, RANKS.get(rank_level, "Неизвестно"))
 
+def resolve_rank_name(rank_names: Dict[int, str], rank_level: int) -> str:
+    """Название ранга (именительный падеж) из уже загруженных кастомных названий чата или дефолт."""
+    if rank_names.get(rank_level):
+        return rank_names[rank_level]
+    return DEFAULT_RANK_CASES.get(rank_level, {}).get("nom", RANKS.get(rank_level, "Неизвестно"))
+
 async def set_group_rank_names(chat_id: int, rank_level: int, nom: str, gen: str, ins: str):
     """Устанавливает кастомные названия для ранга в группе."""
     try:
@@ -503,6 +694,7 @@ async def set_group_rank_names(chat_id: int, rank_level: int, nom: str, gen: str
                 "name_ins": ins
             })
         )
+        _group_ranks_cache.invalidate(chat_id)
     except Exception as e:
         logging.error(f"Ошибка при сохранении названий рангов: {e}")
 
@@ -511,19 +703,21 @@ async def get_rank(user_id: int, chat_id: int) -> Tuple[int, str]:
         name = await get_group_rank_name(chat_id, 5, "nom")
         return 5, name
     
-    try:
-        res = await _retry_supabase_call(
-            supabase.table("chat_members").select("rank").eq("chat_id", chat_id).eq("user_id", user_id)
-        )
-        if res.data:
-            rank_level = res.data[0].get("rank", 0)
-            name = await get_group_rank_name(chat_id, rank_level, "nom")
-            return rank_level, name
-    except Exception as e:
-        logging.error(f"Ошибка при получении ранга пользователя {user_id}: {e}")
+    rank_level = _member_rank_cache.get((chat_id, user_id))
+    if rank_level is _MISSING:
+        generation = _member_rank_cache.generation((chat_id, user_id))
+        try:
+            res = await _retry_supabase_call(
+                supabase.table("chat_members").select("rank").eq("chat_id", chat_id).eq("user_id", user_id)
+            )
+            rank_level = res.data[0].get("rank", 0) if res.data else 0
+            _member_rank_cache.set((chat_id, user_id), rank_level, generation=generation)
+        except Exception as e:
+            logging.error(f"Ошибка при получении ранга пользователя {user_id}: {e}")
+            rank_level = 0
     
-    name = await get_group_rank_name(chat_id, 0, "nom")
-    return 0, name
+    name = await get_group_rank_name(chat_id, rank_level, "nom")
+    return rank_level, name
 
 async def set_rank(user_id: int, chat_id: int, rank_level: int) -> bool:
     if rank_level not in RANKS or rank_level < 1:
@@ -536,26 +730,48 @@ async def set_rank(user_id: int, chat_id: int, rank_level: int) -> bool:
                 "rank": rank_level
             })
         )
+        _member_rank_cache.invalidate((chat_id, user_id))
         return True
     except Exception as e:
         logging.error(f"Ошибка при сохранении ранга пользователя {user_id}: {e}")
         return False
 
+async def get_chat_admins(chat: types.Chat) -> Dict[int, str]:
+    """
+    Администраторы чата в Telegram: {user_id: "creator" | "administrator"}.
+    Один запрос get_chat_administrators на чат вместо get_member на каждую проверку.
+    Кэш сбрасывается при обновлениях chat_member (см. RankCacheMiddleware).
+    """
+    admins = _chat_admins_cache.get(chat.id)
+    if admins is not _MISSING:
+        return admins
+    
+    generation = _chat_admins_cache.generation(chat.id)
+    try:
+        members = await chat.get_administrators()
+    except Exception as e:
+        logging.warning(f"Не удалось получить администраторов чата {chat.id}: {e}")
+        return {}
+    
+    admins = {member.user.id: member.status for member in members}
+    _chat_admins_cache.set(chat.id, admins, generation=generation)
+    return admins
+
+def invalidate_chat_admins(chat_id: int):
+    _chat_admins_cache.invalidate(chat_id)
+
 async def get_user_rank_context(user_id: int, chat: types.Chat) -> Tuple[int, str, bool]:
     if config.creator_id and user_id == config.creator_id:
         name = await get_group_rank_name(chat.id, 5, "nom")
         return 5, name, True
         
-    try:
-        member = await chat.get_member(user_id)
-        if member.status == "creator":
-            name = await get_group_rank_name(chat.id, 5, "nom")
-            return 5, name, True
-        
-        # Если администратор Telegram, даем минимум 4 ранг
-        is_tg_admin = member.status == "administrator"
-    except Exception:
-        is_tg_admin = False
+    status = (await get_chat_admins(chat)).get(user_id)
+    if status == "creator":
+        name = await get_group_rank_name(chat.id, 5, "nom")
+        return 5, name, True
+    
+    # Если администратор Telegram, даем минимум 4 ранг
+    is_tg_admin = status == "administrator"
     
     level, name = await get_rank(user_id, chat.id)
     
@@ -565,19 +781,28 @@ async def get_user_rank_context(user_id: int, chat: types.Chat) -> Tuple[int, st
         
     return level, name, False
 
+def rank_allows_modify(admin_rank: int, is_admin_super: bool, target_rank: int, is_target_super: bool) -> bool:
+    """Правило иерархии: создатель может всех, кроме другого создателя, остальные — только ниже себя."""
+    if is_admin_super:
+        return not is_target_super
+    return admin_rank > target_rank
+
 async def can_user_modify_other(admin_user_id: int, target_user_id: int, chat: types.Chat) -> bool:
     if admin_user_id == target_user_id:
         return True
     admin_rank, _, is_admin_super = await get_user_rank_context(admin_user_id, chat)
     target_rank, _, is_target_super = await get_user_rank_context(target_user_id, chat)
-    if is_admin_super:
-        return not is_target_super
-    return admin_rank > target_rank
+    return rank_allows_modify(admin_rank, is_admin_super, target_rank, is_target_super)
 
 async def get_all_ranked_users(chat_id: int) -> Dict[int, int]:
     try:
-        res = await _retry_supabase_call(supabase.table("chat_members").select("user_id", "rank").eq("chat_id", chat_id))
-        return {item["user_id"]: item["rank"] for item in res.data} if res.data else {}
+        return {
+            item["user_id"]: item["rank"]
+            async for item in iter_select(
+                lambda: supabase.table("chat_members").select("user_id", "rank").eq("chat_id", chat_id),
+                key="user_id"
+            )
+        }
     except Exception as e:
         logging.error(f"Ошибка при получении всех ранжированных пользователей: {e}")
         return {}
@@ -638,32 +863,17 @@ async def remove_marriage(user_id: int) -> bool:
 # --- Relationships ---
 
 async def update_relationship(user1_id: int, user2_id: int, action_type: str) -> Dict:
-    u1, u2 = sorted([int(user1_id), int(user2_id)])
-    
+    """Атомарно учитывает взаимодействие пары (одним запросом к БД)."""
     try:
-        # Сначала получаем текущие данные
-        res = await _retry_supabase_call(supabase.table("relationships").select("*").eq("user1_id", u1).eq("user2_id", u2))
-        
-        if res.data:
-            rel = res.data[0]
-            actions = rel.get("actions", {})
-            actions[action_type] = actions.get(action_type, 0) + 1
-            total = rel.get("total_interactions", 0) + 1
-        else:
-            actions = {action_type: 1}
-            total = 1
-        
-        # Обновляем или вставляем
-        data = {
-            "user1_id": u1,
-            "user2_id": u2,
-            "actions": actions,
-            "total_interactions": total,
-            "last_interaction": datetime.now(timezone.utc).isoformat()
-        }
-        
-        res = await _retry_supabase_call(supabase.table("relationships").upsert(data))
-        return res.data[0] if res.data else {}
+        res = await _retry_supabase_call(
+            supabase.rpc("increment_relationship", {
+                "p_user1_id": int(user1_id),
+                "p_user2_id": int(user2_id),
+                "p_action": action_type
+            }),
+            idempotent=False
+        )
+        return res.data or {}
     except Exception as e:
         logging.error(f"Ошибка при обновлении отношений: {e}")
         return {}
@@ -705,65 +915,69 @@ async def get_all_user_relationships(user_id: int) -> List[Dict]:
 
 # --- Mentions ---
 
-async def get_user_mention_with_nickname(user: types.User) -> str:
-    custom_nick = await get_nickname(user.id)
-    if custom_nick:
-        return f'<a href="tg://user?id={user.id}">{custom_nick}</a>'
+def format_user_mention(user: types.User, nickname: Optional[str]) -> str:
+    if nickname:
+        return f'<a href="tg://user?id={user.id}">{nickname}</a>'
     return user.mention_html()
 
-async def get_mention_by_id(user_id: int, default_name: str = "пользователь") -> str:
-    custom_nick = await get_nickname(user_id)
-    if custom_nick:
-        return f'<a href="tg://user?id={user_id}">{custom_nick}</a>'
-    
-    username = await get_username_by_id(user_id)
+async def get_user_mention_with_nickname(user: types.User) -> str:
+    return format_user_mention(user, await get_nickname(user.id))
+
+_MENTION_BATCH_SIZE = 100
+
+def format_mention(user_id: int, nickname: Optional[str] = None, username: Optional[str] = None,
+                   full_name: Optional[str] = None, default_name: str = "пользователь") -> str:
+    """Ссылка на пользователя: никнейм > @username > полное имя > default_name."""
+    if nickname:
+        return f'<a href="tg://user?id={user_id}">{nickname}</a>'
     if username:
         return f'<a href="tg://user?id={user_id}">@{username}</a>'
-        
-    full_name = await get_full_name_by_id(user_id)
     if full_name:
         return f'<a href="tg://user?id={user_id}">{full_name}</a>'
-        
     return f'<a href="tg://user?id={user_id}">{default_name}</a>'
 
-# --- Stats ---
-
-async def update_user_activity(user_id: int):
-    now_ts = time.time()
-    if user_id in _activity_cache and (now_ts - _activity_cache[user_id]) < _CACHE_TTL:
-        return
-
-    now_iso = datetime.now(timezone.utc).isoformat()
-    try:
-        await _retry_supabase_call(supabase.table("users").upsert({
-            "user_id": user_id,
-            "last_message": now_iso
-        }))
-        
-        today = datetime.now(timezone.utc).date().isoformat()
-        res = await _retry_supabase_call(
-            supabase.table("activity_stats")
-            .select("count")
-            .eq("user_id", user_id)
-            .eq("date", today)
-        )
-        if res.data:
-            current = res.data[0].get("count", 0) or 0
-            await _retry_supabase_call(
-                supabase.table("activity_stats")
-                .update({"count": current + 1})
-                .eq("user_id", user_id)
-                .eq("date", today)
-            )
+async def get_mentions_by_ids(user_ids: Iterable[int], default_name: str = "пользователь") -> Dict[int, str]:
+    """
+    Упоминания для нескольких пользователей: недостающие в кэше имена
+    загружаются одним запросом users ... in (...), а не по три запроса на каждого.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    names: Dict[int, Tuple[Optional[str], Optional[str], Optional[str]]] = {}
+    missing = []
+    for user_id in user_ids:
+        cached_names = _mention_cache.get(user_id)
+        if cached_names is _MISSING:
+            missing.append(user_id)
         else:
-            await _retry_supabase_call(
-                supabase.table("activity_stats")
-                .insert({"user_id": user_id, "date": today, "count": 1})
+            names[user_id] = cached_names
+    
+    for i in range(0, len(missing), _MENTION_BATCH_SIZE):
+        chunk = missing[i:i + _MENTION_BATCH_SIZE]
+        generations = {user_id: _mention_cache.generation(user_id) for user_id in chunk}
+        try:
+            res = await _retry_supabase_call(
+                supabase.table("users").select("user_id, nickname, username, full_name").in_("user_id", chunk)
             )
+        except Exception as e:
+            logging.error(f"Ошибка при получении имен пользователей: {e}")
+            continue
         
-        _activity_cache[user_id] = now_ts
-    except Exception as e:
-        logging.warning(f"Ошибка при обновлении активности (RLS/DB): {e}")
+        rows = {row["user_id"]: row for row in res.data or []}
+        for user_id in chunk:
+            row = rows.get(user_id, {})
+            names[user_id] = (row.get("nickname"), row.get("username"), row.get("full_name"))
+            _mention_cache.set(user_id, names[user_id], generation=generations[user_id])
+    
+    return {
+        user_id: format_mention(user_id, *names.get(user_id, (None, None, None)), default_name=default_name)
+        for user_id in user_ids
+    }
+
+async def get_mention_by_id(user_id: int, default_name: str = "пользователь") -> str:
+    mentions = await get_mentions_by_ids([user_id], default_name)
+    return mentions[user_id]
+
+# --- Stats ---
 
 async def get_user_stats(user_id: int) -> Dict:
     try:
@@ -777,23 +991,11 @@ async def get_user_stats(user_id: int) -> Dict:
         "last_message": datetime.now(timezone.utc).isoformat()
     }
 
-async def get_user_activity_series(user_id: int, days: int = 30) -> List[Tuple[datetime, int]]:
+def _fill_activity_series(raw: Dict[Any, int], days: int) -> List[Tuple[datetime, int]]:
+    """Раскладывает {дата: count} в непрерывную серию за последние days дней (пропуски = 0)."""
     today = datetime.now(timezone.utc).date()
     start_date = today - timedelta(days=days - 1)
     
-    try:
-        res = await _retry_supabase_call(
-            supabase.table("activity_stats")
-            .select("date,count")
-            .eq("user_id", user_id)
-            .gte("date", start_date.isoformat())
-            .order("date")
-        )
-        
-        raw = {datetime.fromisoformat(item["date"]).date(): item.get("count", 0) for item in (res.data or [])}
-    except Exception:
-        raw = {}
-    
     series: List[Tuple[datetime, int]] = []
     current = start_date
     while current <= today:
@@ -802,12 +1004,9 @@ async def get_user_activity_series(user_id: int, days: int = 30) -> List[Tuple[d
     
     return series
 
-async def get_user_activity_summary(user_id: int) -> Dict[str, int]:
-    """Возвращает статистику сообщений за день, неделю, месяц и все время."""
-    # Получаем серию за 30 дней для расчета д|н|м
-    series_30 = await get_user_activity_series(user_id, days=30)
-    
-    summary = {"day": 0, "week": 0, "month": 0, "total": 0}
+def _summarize_activity(series_30: List[Tuple[datetime, int]], total: int) -> Dict[str, int]:
+    """Сводка д|н|м|весь по серии за 30 дней и общему числу сообщений."""
+    summary = {"day": 0, "week": 0, "month": 0, "total": total}
     
     if series_30:
         # День (сегодня)
@@ -816,20 +1015,51 @@ async def get_user_activity_summary(user_id: int) -> Dict[str, int]:
         summary["week"] = sum(count for _, count in series_30[-7:])
         # Месяц (все 30 дней)
         summary["month"] = sum(count for _, count in series_30)
-        
-    # Для "все время" суммируем все записи из таблицы
+    
+    return summary
+
+async def get_user_activity_series(user_id: int, days: int = 30) -> List[Tuple[datetime, int]]:
+    today = datetime.now(timezone.utc).date()
+    start_date = today - timedelta(days=days - 1)
+    
     try:
         res = await _retry_supabase_call(
             supabase.table("activity_stats")
-            .select("count")
+            .select("date,count")
             .eq("user_id", user_id)
+            .gte("date", start_date.isoformat())
+            .order("date")
+        )
+        
+        raw = {datetime.fromisoformat(item["date"]).date(): item.get("count", 0) for item in (res.data or [])}
+    except Exception:
+        raw = {}
+    
+    return _fill_activity_series(raw, days)
+
+async def get_user_activity_summary(user_id: int) -> Dict[str, int]:
+    """
+    Возвращает статистику сообщений за день, неделю, месяц и все время.
+    Д|Н|М считаются по серии за 30 дней (не больше 30 строк), "все время" —
+    одна строка activity_totals, а не сумма всей истории.
+    """
+    series_30, total = await asyncio.gather(
+        get_user_activity_series(user_id, days=30),
+        get_user_activity_total(user_id)
+    )
+    return _summarize_activity(series_30, total)
+
+async def get_user_activity_total(user_id: int) -> int:
+    """Количество сообщений пользователя за все время."""
+    try:
+        res = await _retry_supabase_call(
+            supabase.table("activity_totals").select("total").eq("user_id", user_id)
         )
         if res.data:
-            summary["total"] = sum(item.get("count", 0) or 0 for item in res.data)
+            return res.data[0].get("total", 0) or 0
     except Exception:
         pass
-            
-    return summary
+    return 0
 
 # --- Group Settings ---
 
@@ -859,12 +1089,12 @@ async def get_welcome_message(chat_id: int) -> Optional[str]:
 
 async def get_disabled_modules(chat_id: int) -> List[str]:
     """Возвращает список идентификаторов выключенных модулей для чата."""
-    now = time.monotonic()
-    if chat_id in _modules_cache:
-        cache_entry = _modules_cache[chat_id]
-        if now - cache_entry["timestamp"] < _CACHE_TTL:
-            return cache_entry["modules"]
+    disabled = _modules_cache.get(chat_id)
+    if disabled is not _MISSING:
+        return disabled
             
+    # Инвалидация во время чтения (из этого или другого процесса) отменяет запись в кэш
+    generation = _modules_cache.generation(chat_id)
     try:
         res = await _retry_supabase_call(
             supabase.table("group_settings").select("disabled_modules").eq("chat_id", chat_id)
@@ -873,7 +1103,7 @@ async def get_disabled_modules(chat_id: int) -> List[str]:
         if res.data and res.data[0].get("disabled_modules"):
             disabled = res.data[0]["disabled_modules"]
             
-        _modules_cache[chat_id] = {"modules": disabled, "timestamp": now}
+        _modules_cache.set(chat_id, disabled, generation=generation)
         return disabled
     except Exception as e:
         logging.error(f"Ошибка при получении списка модулей: {e}")
@@ -900,19 +1130,18 @@ async def toggle_module(chat_id: int, module_id: str, enable: bool):
                 "disabled_modules": new_disabled
             })
         )
-        # Обновляем кэш после успешной записи
-        _modules_cache[chat_id] = {"modules": new_disabled, "timestamp": time.monotonic()}
+        # Сбрасываем кэш после успешной записи
+        _modules_cache.invalidate(chat_id)
     except Exception as e:
         logging.error(f"Ошибка при сохранении настроек модулей: {e}")
 
 async def get_permission_settings(chat_id: int) -> Dict[str, int]:
     """Возвращает настройки минимальных рангов для действий в группе."""
-    now = time.monotonic()
-    if chat_id in _permissions_cache:
-        cache_entry = _permissions_cache[chat_id]
-        if now - cache_entry["timestamp"] < _CACHE_TTL:
-            return cache_entry["settings"]
+    settings = _permissions_cache.get(chat_id)
+    if settings is not _MISSING:
+        return settings
             
+    generation = _permissions_cache.generation(chat_id)
     try:
         res = await _retry_supabase_call(
             supabase.table("group_settings").select("permission_settings").eq("chat_id", chat_id)
@@ -921,7 +1150,7 @@ async def get_permission_settings(chat_id: int) -> Dict[str, int]:
         if res.data and res.data[0].get("permission_settings"):
             settings = res.data[0]["permission_settings"]
             
-        _permissions_cache[chat_id] = {"settings": settings, "timestamp": now}
+        _permissions_cache.set(chat_id, settings, generation=generation)
         return settings
     except Exception as e:
         logging.error(f"Ошибка при получении настроек прав: {e}")
@@ -929,7 +1158,8 @@ async def get_permission_settings(chat_id: int) -> Dict[str, int]:
 
 async def set_permission_rank(chat_id: int, action_id: str, min_rank: int):
     """Устанавливает минимальный ранг для конкретного действия."""
-    current_settings = await get_permission_settings(chat_id)
+    # Копия, чтобы не менять закэшированный словарь до успешной записи
+    current_settings = dict(await get_permission_settings(chat_id))
     current_settings[action_id] = min_rank
     
     try:
@@ -939,6 +1169,7 @@ async def set_permission_rank(chat_id: int, action_id: str, min_rank: int):
                 "permission_settings": current_settings
             })
         )
+        _permissions_cache.invalidate(chat_id)
     except Exception as e:
         logging.error(f"Ошибка при сохранении настроек прав: {e}")
 
@@ -1042,10 +1273,12 @@ async def get_clan_members(clan_id: int) -> List[int]:
 async def get_all_clans(chat_id: int) -> List[Dict]:
     """Возвращает список всех кланов в чате."""
     try:
-        res = await _retry_supabase_call(
-            supabase.table("clans").select("*").eq("chat_id", chat_id).order("created_at")
-        )
-        return res.data if res.data else []
+        return [
+            clan
+            async for clan in iter_select(
+                lambda: supabase.table("clans").select("*").eq("chat_id", chat_id).order("created_at").order("id")
+            )
+        ]
     except Exception as e:
         logging.error(f"Ошибка при получении списка кланов: {e}")
         return []
@@ -1147,38 +1380,21 @@ async def get_all_clubs(chat_id: int) -> List[Dict]:
 # --- Репутация ---
 
 async def update_reputation(chat_id: int, user_id: int, delta: int) -> Dict[str, int]:
-    """Изменяет репутацию пользователя и возвращает словарь со статистикой."""
+    """Атомарно изменяет репутацию пользователя и возвращает словарь со статистикой."""
     try:
-        # Сначала получаем текущее значение
         res = await _retry_supabase_call(
-            supabase.table("reputation").select("*").eq("chat_id", chat_id).eq("user_id", user_id)
+            supabase.rpc("increment_reputation", {
+                "p_chat_id": chat_id,
+                "p_user_id": user_id,
+                "p_delta": delta
+            }),
+            idempotent=False
         )
-        
-        data = res.data[0] if res.data else {"points": 0, "plus_count": 0, "minus_count": 0}
-        
-        current_points = data.get("points", 0)
-        current_plus = data.get("plus_count", 0)
-        current_minus = data.get("minus_count", 0)
-        
-        new_points = current_points + delta
-        new_plus = current_plus + (1 if delta > 0 else 0)
-        new_minus = current_minus + (1 if delta < 0 else 0)
-        
-        stats = {
-            "chat_id": chat_id,
-            "user_id": user_id,
-            "points": new_points,
-            "plus_count": new_plus,
-            "minus_count": new_minus
-        }
-        
-        await _retry_supabase_call(
-            supabase.table("reputation").upsert(stats)
-        )
-        return stats
+        if res.data:
+            return res.data
     except Exception as e:
         logging.error(f"Ошибка при обновлении репутации: {e}")
-        return {"points": 0, "plus_count": 0, "minus_count": 0}
+    return {"points": 0, "plus_count": 0, "minus_count": 0}
 
 async def get_user_reputation(chat_id: int, user_id: int) -> Dict[str, int]:
     """Возвращает статистику репутации пользователя."""
@@ -1273,30 +1489,6 @@ async def add_antispam_report(reporter_id: int, target_id: int, chat_id: int) ->
         logging.error(f"Ошибка при добавлении жалобы антиспам: {e}")
         return {"status": "error"}
 
-# Глобальный кэш для черного списка антиспама
-_blacklist_cache = set()
-_blacklist_last_update = 0
-
-async def is_user_blacklisted(user_id: int) -> bool:
-    """Проверяет, находится ли пользователь в черном списке антиспама."""
-    global _blacklist_last_update
-    
-    # Обновляем кэш раз в 5 минут
-    if time.time() - _blacklist_last_update > 300:
-        try:
-            res = await _retry_supabase_call(
-                supabase.table("antispam_blacklist").select("user_id")
-            )
-            if res.data:
-                _blacklist_cache.clear()
-                for item in res.data:
-                    _blacklist_cache.add(item["user_id"])
-                _blacklist_last_update = time.time()
-        except Exception as e:
-            logging.error(f"Ошибка при проверке черного списка: {e}")
-            
-    return user_id in _blacklist_cache
-
 async def get_user_balance(user_id: int) -> int:
     """Возвращает текущий баланс койнов пользователя."""
     try:
@@ -1312,47 +1504,41 @@ async def get_user_balance(user_id: int) -> int:
 
 async def update_user_balance(user_id: int, amount: int) -> int:
     """
-    Изменяет баланс пользователя на указанную сумму.
-    Использует upsert для создания записи, если её нет.
+    Атомарно изменяет баланс пользователя на указанную сумму.
+    Создает запись, если её нет. Возвращает новый баланс.
     """
     try:
-        # Сначала получаем текущий баланс
-        current = await get_user_balance(user_id)
-        new_balance = current + amount
-        
-        # Обновляем (или вставляем)
-        await _retry_supabase_call(
-            supabase.table("economy").upsert({
-                "user_id": user_id,
-                "coins": new_balance
-            })
+        res = await _retry_supabase_call(
+            supabase.rpc("increment_user_balance", {"p_user_id": user_id, "p_amount": amount}),
+            idempotent=False
         )
-        return new_balance
+        return int(res.data or 0)
     except Exception as e:
         logging.error(f"Ошибка при обновлении баланса {user_id}: {e}")
         return 0
 
 async def transfer_coins(from_id: int, to_id: int, amount: int) -> bool:
-    """Переводит койны от одного пользователя другому."""
+    """
+    Переводит койны от одного пользователя другому одной транзакцией.
+    Возвращает False, если у отправителя недостаточно средств.
+    """
     if amount <= 0:
         return False
         
     try:
-        current_from = await get_user_balance(from_id)
-        if current_from < amount:
-            return False
-            
-        # Уменьшаем у отправителя
-        await update_user_balance(from_id, -amount)
-        # Увеличиваем у получателя
-        await update_user_balance(to_id, amount)
-        return True
+        res = await _retry_supabase_call(
+            supabase.rpc("transfer_coins", {"p_from_id": from_id, "p_to_id": to_id, "p_amount": amount}),
+            idempotent=False
+        )
+        return bool(res.data)
     except Exception as e:
         logging.error(f"Ошибка при переводе койнов: {e}")
         return False
 
 # --- Levels ---
 
+# Формулы продублированы в SQL-функции add_user_xp (schema.sql), менять нужно в обоих местах
+
 def _xp_for_level(level: int) -> int:
     """Сколько опыта нужно для перехода с уровня level на level+1."""
     return 50 + level * 25
@@ -1361,6 +1547,17 @@ def _coins_for_level(level: int) -> int:
     """Сколько койнов выдается за получение указанного уровня."""
     return 100 * level
 
+def _level_data(level: int, xp: int) -> Dict[str, int]:
+    """Собирает словарь уровня: level, xp, needed_xp, remaining_xp, next_reward_coins."""
+    needed_xp = _xp_for_level(level)
+    return {
+        "level": level,
+        "xp": xp,
+        "needed_xp": needed_xp,
+        "remaining_xp": max(0, needed_xp - xp),
+        "next_reward_coins": _coins_for_level(level + 1)
+    }
+
 async def get_user_level(user_id: int) -> Dict[str, int]:
     """
     Возвращает данные по уровню пользователя:
@@ -1379,22 +1576,13 @@ async def get_user_level(user_id: int) -> Dict[str, int]:
     except Exception as e:
         logging.error(f"Ошибка при получении уровня пользователя {user_id}: {e}")
     
-    needed_xp = _xp_for_level(level)
-    remaining_xp = max(0, needed_xp - xp)
-    next_reward_coins = _coins_for_level(level + 1)
-    
-    return {
-        "level": level,
-        "xp": xp,
-        "needed_xp": needed_xp,
-        "remaining_xp": remaining_xp,
-        "next_reward_coins": next_reward_coins
-    }
+    return _level_data(level, xp)
 
 async def add_user_xp(user_id: int, amount: int) -> Dict[str, Any]:
     """
     Добавляет пользователю опыт.
     При достижении новых уровней автоматически начисляет койны.
+    Все изменения выполняются на стороне БД одной транзакцией (функция add_user_xp).
     Возвращает данные по текущему уровню и список апнутых уровней.
     """
     if amount <= 0:
@@ -1403,49 +1591,22 @@ async def add_user_xp(user_id: int, amount: int) -> Dict[str, Any]:
         data["total_reward_coins"] = 0
         return data
     
-    level = 0
-    xp = 0
     try:
         res = await _retry_supabase_call(
-            supabase.table("user_levels").select("level,xp").eq("user_id", user_id).limit(1)
-        )
-        if res.data:
-            row = res.data[0]
-            level = int(row.get("level", 0) or 0)
-            xp = int(row.get("xp", 0) or 0)
-    except Exception:
-        pass
-    
-    xp += amount
-    leveled_up: List[Dict[str, int]] = []
-    total_reward = 0
-    
-    while xp >= _xp_for_level(level):
-        need = _xp_for_level(level)
-        if xp < need:
-            break
-        xp -= need
-        level += 1
-        reward = _coins_for_level(level)
-        total_reward += reward
-        await update_user_balance(user_id, reward)
-        leveled_up.append({"level": level, "reward": reward})
-    
-    try:
-        await _retry_supabase_call(
-            supabase.table("user_levels").upsert({
-                "user_id": user_id,
-                "level": level,
-                "xp": xp,
-                "updated_at": datetime.now(timezone.utc).isoformat()
-            })
+            supabase.rpc("add_user_xp", {"p_user_id": user_id, "p_amount": amount}),
+            idempotent=False
         )
+        row = res.data or {}
+        data = _level_data(int(row.get("level", 0) or 0), int(row.get("xp", 0) or 0))
+        data["leveled_up"] = row.get("leveled_up") or []
+        data["total_reward_coins"] = int(row.get("total_reward_coins", 0) or 0)
+        return data
     except Exception as e:
-        logging.error(f"Ошибка при сохранении уровня пользователя {user_id}: {e}")
+        logging.error(f"Ошибка при начислении опыта пользователю {user_id}: {e}")
     
     data = await get_user_level(user_id)
-    data["leveled_up"] = leveled_up
-    data["total_reward_coins"] = total_reward
+    data["leveled_up"] = []
+    data["total_reward_coins"] = 0
     return data
 
 async def apply_once_level_bonus(user_id: int, bonus_type: str, amount: int) -> Dict[str, Any]:
@@ -1504,21 +1665,18 @@ async def get_chat_balance(chat_id: int) -> int:
         return 0
 
 async def update_chat_balance(chat_id: int, amount: int) -> int:
-    """Обновляет баланс чата."""
+    """Атомарно обновляет баланс чата (не ниже нуля)."""
     try:
-        current = await get_chat_balance(chat_id)
-        new_balance = max(0, current + amount)
-        await _retry_supabase_call(
-            supabase.table("chat_economy").upsert({
-                "chat_id": chat_id,
-                "coins": new_balance
-            })
+        res = await _retry_supabase_call(
+            supabase.rpc("increment_chat_balance", {"p_chat_id": chat_id, "p_amount": amount}),
+            idempotent=False
         )
-        return new_balance
+        return int(res.data or 0)
     except Exception as e:
         logging.error(f"Ошибка при обновлении баланса чата {chat_id}: {e}")
         return 0
 
+@cached("catalog_categories", ttl=600, maxsize=1, condition=bool)
 async def get_catalog_categories() -> List[dict]:
     """Возвращает список категорий каталога."""
     try:
@@ -1582,12 +1740,62 @@ async def delete_catalog_link(chat_id: int) -> bool:
 
 async def get_approved_chats(category_id: int = None) -> List[dict]:
     """Возвращает список одобренных чатов."""
-    try:
+    def build_query():
         query = supabase.table("catalog_chats").select("*").eq("is_approved", True)
         if category_id:
             query = query.eq("category_id", category_id)
-        res = await _retry_supabase_call(query)
-        return res.data or []
+        return query
+    
+    try:
+        return [chat async for chat in iter_select(build_query, key="chat_id")]
     except Exception as e:
         logging.error(f"Ошибка при получении одобренных чатов: {e}")
         return []
+
+# --- Timers ---
+
+async def save_timer(key: str, kind: str, chat_id: Optional[int], fire_at: datetime, payload: Dict) -> bool:
+    """Сохраняет (или переносит) отложенное событие."""
+    try:
+        await _retry_supabase_call(supabase.table("timers").upsert({
+            "key": key,
+            "kind": kind,
+            "chat_id": chat_id,
+            "fire_at": fire_at.isoformat(),
+            "payload": payload
+        }))
+        return True
+    except Exception as e:
+        logging.error(f"Ошибка при сохранении таймера {key}: {e}")
+        return False
+
+async def delete_timer(key: str) -> Optional[bool]:
+    """Удаляет таймер. True — он был и удален, False — его уже нет, None — ошибка БД."""
+    try:
+        # Без повторов после отправки: повторный DELETE вернул бы [] и отмена выглядела бы
+        # опоздавшей. При неясном исходе возвращаем None — вызывающий судит по своему состоянию
+        res = await _retry_supabase_call(supabase.table("timers").delete().eq("key", key), idempotent=False)
+        return bool(res.data)
+    except Exception as e:
+        logging.error(f"Ошибка при удалении таймера {key}: {e}")
+        return None
+
+async def load_timers(until: datetime) -> Optional[List[Dict]]:
+    """Таймеры со сроком до until (None при ошибке БД)."""
+    def build_query():
+        return supabase.table("timers").select("*").lte("fire_at", until.isoformat())
+
+    try:
+        return [row async for row in iter_select(build_query, key="key")]
+    except Exception as e:
+        logging.error(f"Ошибка при загрузке таймеров: {e}")
+        return None
+
+async def claim_timers(keys: List[str]) -> Optional[List[Dict]]:
+    """Атомарно забирает сработавшие таймеры (None при ошибке БД)."""
+    try:
+        res = await _retry_supabase_call(supabase.rpc("claim_timers", {"p_keys": keys}), idempotent=False)
+        return res.data or []
+    except Exception as e:
+        logging.error(f"Ошибка при получении сработавших таймеров: {e}")
+        return None
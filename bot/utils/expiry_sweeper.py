@@ -0,0 +1,54 @@
+import asyncio
+import logging
+from typing import Optional
+from bot.config_reader import config
+from bot.utils.db_manager import sweep_expired_punishments
+
+# Сколько пакетов удалять за один проход (остальное — в следующий)
+_MAX_BATCHES = 20
+
+
+class ExpirySweeper:
+    """
+    Периодически удаляет истекшие муты, баны и варны пакетами по batch_size строк.
+    Чтения (is_user_muted, is_user_banned, get_warns) отбрасывают истекшие
+    записи фильтром по until и ничего не удаляют, поэтому задержка очистки
+    ни на что не влияет, кроме размера таблиц.
+    """
+    def __init__(self, interval: float, batch_size: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+        self.deleted = 0
+
+    async def sweep(self):
+        """Один проход: удаляет пакеты, пока они заполняются целиком."""
+        for _ in range(_MAX_BATCHES):
+            deleted = await sweep_expired_punishments(self.batch_size)
+            if not deleted:
+                return
+            self.deleted += deleted
+            if deleted < self.batch_size:
+                return
+
+    async def _run(self):
+        while True:
+            await self.sweep()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        logging.info(f"Удалено истекших мутов, банов и варнов: {self.deleted}")
+
+
+expiry_sweeper = ExpirySweeper(config.expiry_sweep_interval, config.expiry_sweep_batch)
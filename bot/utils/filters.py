@@ -1,13 +1,12 @@
-import logging
 import asyncio
 from aiogram import types
 from aiogram.filters import BaseFilter
-from typing import Union
+from typing import Optional, Union
 from bot.config_reader import config
+from bot.utils.update_context import UpdateContext
 
 from bot.utils.db_manager import (
-    get_user_rank_context, RANKS,
-    get_disabled_modules, get_permission_settings
+    get_chat_admins, RANKS, get_disabled_modules
 )
 
 class AdminFilter(BaseFilter):
@@ -30,12 +29,8 @@ class AdminFilter(BaseFilter):
         if not chat.type in ["group", "supergroup"]:
             return False
 
-        try:
-            member = await event.bot.get_chat_member(chat.id, user_id)
-            return member.status in ["administrator", "creator"]
-        except Exception as e:
-            logging.error(f"Ошибка в RankFilter: {e}")
-            return False
+        admins = await get_chat_admins(chat)
+        return admins.get(user_id) in ["administrator", "creator"]
 
 class ModuleEnabledFilter(BaseFilter):
     """
@@ -44,7 +39,11 @@ class ModuleEnabledFilter(BaseFilter):
     def __init__(self, module_id: str):
         self.module_id = module_id
 
-    async def __call__(self, event: Union[types.Message, types.CallbackQuery, types.ChatMemberUpdated]) -> bool:
+    async def __call__(
+        self,
+        event: Union[types.Message, types.CallbackQuery, types.ChatMemberUpdated],
+        ctx: Optional[UpdateContext] = None
+    ) -> bool:
         if isinstance(event, types.Message):
             chat_id = event.chat.id
         elif isinstance(event, types.CallbackQuery):
@@ -54,7 +53,10 @@ class ModuleEnabledFilter(BaseFilter):
         else:
             return False
         
-        disabled_modules = await get_disabled_modules(chat_id)
+        if ctx and ctx.chat and ctx.chat.id == chat_id:
+            disabled_modules = await ctx.disabled_modules()
+        else:
+            disabled_modules = await get_disabled_modules(chat_id)
         return self.module_id not in disabled_modules
 
 class RankFilter(BaseFilter):
@@ -66,7 +68,11 @@ class RankFilter(BaseFilter):
         self.min_rank = min_rank
         self.action_id = action_id
 
-    async def __call__(self, event: Union[types.Message, types.CallbackQuery]) -> bool:
+    async def __call__(
+        self,
+        event: Union[types.Message, types.CallbackQuery],
+        ctx: Optional[UpdateContext] = None
+    ) -> bool:
         if isinstance(event, types.Message):
             user_id = event.from_user.id
             chat = event.chat
@@ -79,15 +85,19 @@ class RankFilter(BaseFilter):
         if not chat.type in ["group", "supergroup"]:
             return False
 
+        # Без контекста (или если он про другой чат) — загружаем напрямую
+        if not (ctx and ctx.chat and ctx.chat.id == chat.id and ctx.user_id == user_id):
+            ctx = UpdateContext(chat, user_id)
+
         # Получаем ранг пользователя
-        user_rank, _, _ = await get_user_rank_context(user_id, chat)
+        user_rank, _, _ = await ctx.rank()
         
         # Определяем требуемый ранг
         required_rank = self.min_rank
         
         # Если задан action_id, проверяем настройки группы в БД
         if self.action_id:
-            settings = await get_permission_settings(chat.id)
+            settings = await ctx.permission_settings()
             if self.action_id in settings:
                 required_rank = settings[self.action_id]
         
@@ -0,0 +1,203 @@
+import asyncio
+import json
+import logging
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Hashable, List, Optional
+from bot.config_reader import config
+from bot.utils.cache import add_invalidation_listener, find_cache
+
+# Для CACHE_BUS=postgres нужен asyncpg (pip install asyncpg)
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+CHANNEL = "bot_cache_invalidation"
+
+# Кэши с данными, которые меняются командами (настройки чата, ранги, ники и т.п.).
+# Инвалидации остальных (картинки профиля, отпечатки пользователей) не рассылаются
+BROADCAST_NAMESPACES = {
+    "modules", "permissions", "group_ranks", "member_ranks",
+    "mentions", "chat_admins", "catalog_categories",
+}
+
+Handler = Callable[[Optional[Hashable]], None]
+
+
+def _encode_key(key: Optional[Hashable]) -> Any:
+    return list(key) if isinstance(key, tuple) else key
+
+
+def _decode_key(key: Any) -> Optional[Hashable]:
+    return tuple(key) if isinstance(key, list) else key
+
+
+class InvalidationBus(ABC):
+    """
+    Шина инвалидаций между процессами бота.
+    Локальная инвалидация кэша из BROADCAST_NAMESPACES публикуется остальным
+    процессам, а пришедшая извне — применяется только локально (без повторной
+    публикации). Помимо кэшей можно подписаться на свои события (subscribe).
+    """
+    def __init__(self):
+        self.origin = uuid.uuid4().hex
+        self._handlers: Dict[str, Handler] = {}
+        self._attached = False
+        self.published = 0
+        self.received = 0
+
+    def subscribe(self, namespace: str, handler: Handler):
+        """Обработчик события namespace вместо сброса одноименного кэша."""
+        self._handlers[namespace] = handler
+
+    def _on_cache_invalidation(self, namespace: str, key: Optional[Hashable]):
+        if namespace in BROADCAST_NAMESPACES:
+            self.publish(namespace, key)
+
+    def publish(self, namespace: str, key: Optional[Hashable]):
+        self.published += 1
+        self._send(json.dumps({"o": self.origin, "n": namespace, "k": _encode_key(key)}))
+
+    @abstractmethod
+    def _send(self, payload: str):
+        """Отправляет событие остальным процессам."""
+
+    def deliver(self, payload: str):
+        """Применяет событие, пришедшее по шине."""
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logging.warning(f"Некорректное событие шины инвалидаций: {payload[:200]}")
+            return
+        if event.get("o") == self.origin:
+            return
+
+        self.received += 1
+        namespace, key = event["n"], _decode_key(event.get("k"))
+        handler = self._handlers.get(namespace)
+        if handler:
+            handler(key)
+            return
+
+        cache = find_cache(namespace)
+        if cache is None:
+            return
+        if key is None:
+            cache.clear(propagate=False)
+        else:
+            cache.invalidate(key, propagate=False)
+
+    def _drop_all(self):
+        """Сбрасывает рассылаемые кэши целиком, когда события могли быть пропущены."""
+        for namespace in BROADCAST_NAMESPACES:
+            cache = find_cache(namespace)
+            if cache is not None:
+                cache.clear(propagate=False)
+
+    def start(self):
+        if not self._attached:
+            add_invalidation_listener(self._on_cache_invalidation)
+            self._attached = True
+
+    async def stop(self):
+        logging.info(f"Шина инвалидаций: отправлено {self.published}, получено {self.received}")
+
+
+class LocalInvalidationBus(InvalidationBus):
+    """
+    Шина внутри одного процесса: события доставляются другим экземплярам
+    LocalInvalidationBus этого процесса. Для одного процесса (там кэш и так
+    один) и для проверки логики рассылки без Postgres.
+    """
+    _peers: List["LocalInvalidationBus"] = []
+
+    def __init__(self):
+        super().__init__()
+        LocalInvalidationBus._peers.append(self)
+
+    def _send(self, payload: str):
+        for peer in LocalInvalidationBus._peers:
+            if peer is not self:
+                peer.deliver(payload)
+
+
+class PostgresInvalidationBus(InvalidationBus):
+    """
+    Шина через LISTEN/NOTIFY Postgres (прямое подключение или pooler в режиме
+    session: в режиме transaction LISTEN не работает). При потере соединения
+    рассылаемые кэши сбрасываются — события за это время могли быть пропущены.
+    """
+    def __init__(self, dsn: str):
+        super().__init__()
+        self.dsn = dsn
+        self._outbox: "asyncio.Queue[str]" = asyncio.Queue(maxsize=10000)
+        self._task: Optional[asyncio.Task] = None
+
+    def _send(self, payload: str):
+        try:
+            self._outbox.put_nowait(payload)
+        except asyncio.QueueFull:
+            logging.warning("Очередь шины инвалидаций переполнена, событие отброшено")
+
+    async def _session(self):
+        connection = await asyncpg.connect(self.dsn)
+        try:
+            await connection.add_listener(CHANNEL, lambda conn, pid, channel, payload: self.deliver(payload))
+            logging.info("Шина инвалидаций подключена к Postgres")
+            while not connection.is_closed():
+                try:
+                    payload = await asyncio.wait_for(self._outbox.get(), timeout=5)
+                except asyncio.TimeoutError:
+                    # Проверка, что соединение живо
+                    await connection.execute("SELECT 1")
+                    continue
+                try:
+                    await connection.execute("SELECT pg_notify($1, $2)", CHANNEL, payload)
+                except Exception:
+                    self._outbox.put_nowait(payload)
+                    raise
+        finally:
+            await connection.close()
+
+    async def _run(self):
+        delay = 1.0
+        while True:
+            try:
+                await self._session()
+                delay = 1.0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Шина инвалидаций: соединение потеряно ({e}), переподключение через {delay:.0f} с")
+            self._drop_all()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
+
+    def start(self):
+        super().start()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await super().stop()
+
+
+def create_invalidation_bus() -> InvalidationBus:
+    if config.cache_bus == "postgres":
+        if asyncpg is None:
+            raise RuntimeError("CACHE_BUS=postgres требует пакет asyncpg")
+        if not config.database_url:
+            raise RuntimeError("CACHE_BUS=postgres требует DATABASE_URL")
+        return PostgresInvalidationBus(config.database_url.get_secret_value())
+    return LocalInvalidationBus()
+
+
+invalidation_bus = create_invalidation_bus()
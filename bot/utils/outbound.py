@@ -0,0 +1,220 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextvars import ContextVar
+from typing import Any, AsyncContextManager, Callable, Dict, List, Optional, Tuple
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+from bot.config_reader import config
+
+# Полосы приоритета исходящих запросов: меньше — раньше
+PRIORITY_HIGH = 0    # модерация, антиспам
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2     # развлекательные команды
+_PRIORITY_NAMES = {PRIORITY_HIGH: "high", PRIORITY_NORMAL: "normal", PRIORITY_LOW: "low"}
+
+# Приоритет запросов, отправляемых при обработке текущего апдейта
+outbound_priority: ContextVar[int] = ContextVar("outbound_priority", default=PRIORITY_NORMAL)
+# Обертка ожидания токенов: планировщик апдейтов подставляет сюда освобождение
+# слота хендлера, чтобы ожидание лимита Telegram не считалось выполнением
+outbound_wait_scope: ContextVar[Optional[Callable[[], AsyncContextManager[None]]]] = ContextVar(
+    "outbound_wait_scope", default=None
+)
+
+# Методы, на которые действуют лимиты Telegram на отправку сообщений
+_LIMITED_METHOD_PREFIXES = ("Send", "Copy", "Forward", "Edit")
+
+
+class PriorityTokenBucket:
+    """
+    Token bucket с очередью ожидания по приоритету: когда токенов нет,
+    первым получает токен запрос с меньшим priority (при равных — раньше пришедший).
+    pause() запрещает выдачу токенов на время (retry_after от Telegram).
+    """
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._pump: Optional[asyncio.Task] = None
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _delay(self) -> float:
+        """Сколько ждать до следующего токена (0 — токен есть)."""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        self._refill(now)
+        if self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    @property
+    def idle(self) -> bool:
+        """Нет ожидающих и ведро полное — состояние можно не хранить."""
+        return not self._waiters and self._delay() == 0.0 and self._tokens >= self.capacity
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def ready(self) -> bool:
+        """Токен выдается без ожидания."""
+        return not self._waiters and self._delay() == 0.0
+
+    async def acquire(self, priority: int = PRIORITY_NORMAL):
+        if not self._waiters and self._delay() == 0.0:
+            self._tokens -= 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.create_task(self._run())
+        await future
+
+    async def _run(self):
+        while self._waiters:
+            delay = self._delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            # Ожидание могли отменить (таймаут хендлера и т.п.) — токен не тратим
+            if future.done():
+                continue
+            self._tokens -= 1
+            future.set_result(None)
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        # Токены начинают копиться заново только после паузы
+        self._tokens = 0.0
+        self._updated = self._paused_until
+
+
+class OutboundLimiter(BaseRequestMiddleware):
+    """
+    Middleware сессии бота: все исходящие запросы проходят через него.
+    Отправка и редактирование сообщений ограничены общим token bucket на бота
+    и отдельным на каждый чат (для групп лимит строже), ожидание идет по
+    полосам приоритета. TelegramRetryAfter обрабатывается здесь: чат (или весь
+    бот, если чата нет) приостанавливается на retry_after и запрос повторяется.
+    """
+    def __init__(self):
+        # С несколькими воркерами общий лимит бота делится между ними поровну,
+        # а лимиты чатов точные: каждый чат обрабатывается одним воркером
+        self._global = PriorityTokenBucket(
+            config.telegram_global_rate / config.workers, config.telegram_global_burst / config.workers
+        )
+        self._chats: Dict[Any, PriorityTokenBucket] = {}
+        self.sent: Dict[int, int] = {priority: 0 for priority in _PRIORITY_NAMES}
+        self.throttled = 0
+        self.throttled_seconds = 0.0
+        self.retry_after = 0
+        self.retry_after_seconds = 0.0
+        self.failed_after_retries = 0
+
+    def _chat_bucket(self, chat_id: Any) -> PriorityTokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= config.telegram_chat_buckets_max:
+                # Выбрасываем ведра простаивающих чатов
+                for key in [key for key, value in self._chats.items() if value.idle]:
+                    del self._chats[key]
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            if is_group:
+                bucket = PriorityTokenBucket(config.telegram_group_rate, config.telegram_group_burst)
+            else:
+                bucket = PriorityTokenBucket(config.telegram_chat_rate, config.telegram_chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def _take_tokens(self, chat_bucket: Optional[PriorityTokenBucket], priority: int):
+        if chat_bucket is not None:
+            await chat_bucket.acquire(priority)
+        await self._global.acquire(priority)
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        method_name = type(method).__name__
+        chat_id = getattr(method, "chat_id", None)
+        limited = method_name.startswith(_LIMITED_METHOD_PREFIXES)
+        priority = outbound_priority.get()
+
+        for attempt in range(config.telegram_max_retries + 1):
+            if limited:
+                start = time.monotonic()
+                chat_bucket = self._chat_bucket(chat_id) if chat_id is not None else None
+                wait_scope = outbound_wait_scope.get()
+                if wait_scope is not None and not (self._global.ready and (chat_bucket is None or chat_bucket.ready)):
+                    async with wait_scope():
+                        await self._take_tokens(chat_bucket, priority)
+                else:
+                    await self._take_tokens(chat_bucket, priority)
+                waited = time.monotonic() - start
+                if waited > 0.001:
+                    self.throttled += 1
+                    self.throttled_seconds += waited
+
+            try:
+                response = await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                self.retry_after += 1
+                self.retry_after_seconds += e.retry_after
+                bucket = self._chat_bucket(chat_id) if chat_id is not None else self._global
+                bucket.pause(e.retry_after)
+                if attempt == config.telegram_max_retries:
+                    self.failed_after_retries += 1
+                    raise
+                logging.warning(
+                    f"Flood control Telegram: {method_name} в чате {chat_id}, "
+                    f"повтор через {e.retry_after} с (попытка {attempt + 1})"
+                )
+                if not limited:
+                    await asyncio.sleep(e.retry_after)
+                continue
+
+            if limited:
+                self.sent[priority] = self.sent.get(priority, 0) + 1
+            return response
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sent": {_PRIORITY_NAMES.get(priority, str(priority)): count for priority, count in self.sent.items()},
+            "queued": self._global.waiting + sum(bucket.waiting for bucket in self._chats.values()),
+            "chats": len(self._chats),
+            "throttled": self.throttled,
+            "throttled_seconds": self.throttled_seconds,
+            "retry_after": self.retry_after,
+            "retry_after_seconds": self.retry_after_seconds,
+            "failed_after_retries": self.failed_after_retries,
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        sent = ", ".join(f"{name} {count}" for name, count in stats["sent"].items())
+        logging.info(
+            f"Исходящие запросы Telegram: отправлено ({sent}), ждали лимита {stats['throttled']} раз "
+            f"({stats['throttled_seconds']:.1f} с), retry_after {stats['retry_after']} раз "
+            f"({stats['retry_after_seconds']:.0f} с), не отправлено после повторов {stats['failed_after_retries']}"
+        )
+
+
+outbound_limiter = OutboundLimiter()
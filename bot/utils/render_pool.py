@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from bot.config_reader import config
+from bot.modules.images import warm_up
+
+
+class RenderService:
+    """
+    Рисует картинки в отдельных процессах, чтобы Pillow и кодирование PNG
+    не блокировали event loop. На вход — функция из bot.modules.images и
+    простые данные, на выход — готовые байты.
+    Одновременно ждет не больше max_pending отрисовок: при перегрузке и по
+    таймауту возвращается None, и вызывающий отвечает без картинки.
+    """
+    def __init__(self, workers: int, max_pending: int, timeout: float):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self.rendered = 0
+        self.rejected = 0
+        self.failed = 0
+        self._total_ms = 0.0
+        self._max_ms = 0.0
+
+    def start(self):
+        if self._executor is None:
+            # spawn, а не fork: процесс бота многопоточный (httpx, event loop),
+            # а воркерам нужен только bot.modules.images. Шрифты и шаблоны
+            # загружаются при старте воркера, а не на первом запросе
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=warm_up
+            )
+
+    async def render(self, func: Callable[..., bytes], *args: Any) -> Optional[bytes]:
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            logging.warning(f"Очередь отрисовки заполнена ({self._pending}), {func.__name__} пропущен")
+            return None
+
+        self.start()
+        loop = asyncio.get_running_loop()
+        start = time.monotonic()
+        try:
+            future = self._executor.submit(func, *args)
+        except Exception as e:
+            self.failed += 1
+            logging.error(f"Ошибка отрисовки {func.__name__}: {e}")
+            return None
+        # Слот освобождается, когда отрисовка действительно закончилась (или снята с очереди),
+        # а не когда ее перестали ждать: иначе по таймаутам очередь пула росла бы без предела
+        self._pending += 1
+        future.add_done_callback(lambda _: self._release_threadsafe(loop))
+
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.failed += 1
+            logging.warning(f"Отрисовка {func.__name__} не уложилась в {self.timeout:.0f} с")
+            return None
+        except Exception as e:
+            self.failed += 1
+            logging.error(f"Ошибка отрисовки {func.__name__}: {e}")
+            return None
+
+        elapsed_ms = (time.monotonic() - start) * 1000
+        self.rendered += 1
+        self._total_ms += elapsed_ms
+        self._max_ms = max(self._max_ms, elapsed_ms)
+        logging.debug(f"Отрисовка {func.__name__}: {elapsed_ms:.0f} мс, {len(result) / 1024:.0f} КБ")
+        return result
+
+    def _release(self):
+        self._pending -= 1
+
+    def _release_threadsafe(self, loop: asyncio.AbstractEventLoop):
+        # Колбэк future вызывается из служебного потока пула
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            # Event loop уже закрыт (остановка бота)
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": self._pending,
+            "rendered": self.rendered,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "avg_ms": self._total_ms / self.rendered if self.rendered else 0.0,
+            "max_ms": self._max_ms,
+        }
+
+    def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+        stats = self.stats()
+        logging.info(
+            f"Отрисовка картинок: готово {stats['rendered']} (в среднем {stats['avg_ms']:.0f} мс, "
+            f"максимум {stats['max_ms']:.0f} мс), отклонено {stats['rejected']}, с ошибкой {stats['failed']}"
+        )
+
+
+render_pool = RenderService(config.render_workers, config.render_max_pending, config.render_timeout)
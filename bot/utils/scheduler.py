@@ -0,0 +1,321 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+from aiogram import BaseMiddleware, Router, types
+from bot.config_reader import config
+from bot.utils.outbound import outbound_priority, outbound_wait_scope, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+
+# Классы апдейтов по роутеру хендлера: меньше — раньше получает слот
+CLASS_MODERATION = 0
+CLASS_ECONOMY = 1
+CLASS_DEFAULT = 2
+CLASS_ENTERTAINMENT = 3  # При перегрузке отбрасывается
+_CLASS_NAMES = {
+    CLASS_MODERATION: "moderation",
+    CLASS_ECONOMY: "economy",
+    CLASS_DEFAULT: "default",
+    CLASS_ENTERTAINMENT: "entertainment",
+}
+# Полоса исходящих запросов Telegram для каждого класса
+_OUTBOUND_PRIORITY = {
+    CLASS_MODERATION: PRIORITY_HIGH,
+    CLASS_ECONOMY: PRIORITY_NORMAL,
+    CLASS_DEFAULT: PRIORITY_NORMAL,
+    CLASS_ENTERTAINMENT: PRIORITY_LOW,
+}
+
+
+class _ChatQueue:
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        # asyncio.Lock отдает захват ожидающим в порядке очереди — это и есть FIFO чата
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class _Slot:
+    """
+    Слот выполнения одного хендлера. На время ожидания токенов отправки (yielded)
+    слот отдается другим и затем занимается заново с тем же классом.
+    После завершения хендлера (closed) фоновые задачи, унаследовавшие контекст, слот не берут.
+    """
+    __slots__ = ("scheduler", "update_class", "held", "closed", "_yielded")
+
+    def __init__(self, scheduler: "UpdateScheduler", update_class: int):
+        self.scheduler = scheduler
+        self.update_class = update_class
+        self.held = False
+        self.closed = False
+        self._yielded = 0
+
+    async def acquire(self):
+        await self.scheduler._acquire(self.update_class)
+        self.held = True
+
+    def release(self):
+        if self.held:
+            self.held = False
+            self.scheduler._release()
+
+    def close(self):
+        self.closed = True
+        self.release()
+
+    @asynccontextmanager
+    async def yielded(self) -> AsyncIterator[None]:
+        self._yielded += 1
+        if self._yielded == 1:
+            self.release()
+        try:
+            yield
+        finally:
+            self._yielded -= 1
+        # Несколько одновременных отправок хендлера: слот берет последняя дождавшаяся
+        if self._yielded == 0 and not self.held and not self.closed:
+            await self.acquire()
+
+
+class _ClassStats:
+    __slots__ = ("handled", "shed", "wait_total", "wait_max", "recent")
+
+    def __init__(self):
+        self.handled = 0
+        self.shed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.recent: Deque[float] = deque(maxlen=1000)
+
+    def record(self, waited: float):
+        self.handled += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        self.recent.append(waited)
+
+
+class UpdateScheduler:
+    """
+    Планировщик выполнения хендлеров:
+    - апдейты одного чата выполняются строго по очереди (нет гонок read-modify-write):
+      очередь чата занимает outer middleware апдейта (ChatOrderMiddleware) до фильтров
+      роутеров, поэтому порядок не зависит от того, сколько роутеров проверяет апдейт;
+    - одновременно выполняется не больше max_in_flight хендлеров, свободный слот
+      получает ожидающий с меньшим классом (модерация, экономика, прочее, развлечения);
+      пока хендлер ждет токенов на отправку (OutboundLimiter), его слот свободен;
+    - при перегрузке развлекательные апдейты отбрасываются: сразу, если ожидающих
+      больше shed_queue, или при получении слота, если ждали дольше shed_wait.
+      Сразу отбрасывается и развлекательный апдейт, за которым в очереди чата
+      стоят другие, если свободного слота нет.
+
+    Более высокий класс не обгоняет очередь чата: команды модерации ссылаются на
+    предыдущие сообщения (ответом) и должны видеть результат их обработки
+    (антиспам, активность, варны), а класс становится известен только после
+    фильтров, то есть уже внутри очереди. Инверсию приоритетов ограничивает то,
+    что апдейт низкого класса, задерживающий очередь чата, отбрасывается при
+    перегрузке, а ожидание лимитов Telegram не занимает слот.
+    """
+    def __init__(self, max_in_flight: int, shed_queue: int, shed_wait: float):
+        self.max_in_flight = max_in_flight
+        self.shed_queue = shed_queue
+        self.shed_wait = shed_wait
+        self._in_flight = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._chats: Dict[Hashable, _ChatQueue] = {}
+        self._stats: Dict[int, _ClassStats] = {update_class: _ClassStats() for update_class in _CLASS_NAMES}
+
+    async def _acquire(self, update_class: int):
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._in_flight += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (update_class, next(self._seq), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Слот успели передать, но ожидание отменили — возвращаем его
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+
+    def _release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # Слот переходит следующему без изменения счетчика
+                future.set_result(None)
+                return
+        self._in_flight -= 1
+
+    def _chat_backlog(self, chat_key: Optional[Hashable]) -> int:
+        """Сколько апдейтов чата ждет своей очереди за текущим."""
+        chat = self._chats.get(chat_key) if chat_key is not None else None
+        return chat.users - 1 if chat else 0
+
+    async def _shed(self, update_class: int, on_shed: Optional[Callable[[], Awaitable[Any]]]) -> None:
+        self._stats[update_class].shed += 1
+        logging.debug(f"Апдейт класса {_CLASS_NAMES[update_class]} отброшен из-за перегрузки")
+        if on_shed is not None:
+            try:
+                await on_shed()
+            except Exception as e:
+                logging.warning(f"Не удалось сообщить об отброшенном апдейте: {e}")
+
+    @asynccontextmanager
+    async def chat_turn(self, chat_key: Optional[Hashable]) -> AsyncIterator[None]:
+        """Очередь чата: тело выполняется после всех апдейтов чата, пришедших раньше."""
+        if chat_key is None:
+            yield
+            return
+
+        chat = self._chats.get(chat_key)
+        if chat is None:
+            chat = self._chats[chat_key] = _ChatQueue()
+        chat.users += 1
+        try:
+            async with chat.lock:
+                yield
+        finally:
+            chat.users -= 1
+            if chat.users == 0:
+                del self._chats[chat_key]
+
+    async def run(
+        self,
+        update_class: int,
+        call: Callable[[], Awaitable[Any]],
+        start: Optional[float] = None,
+        chat_key: Optional[Hashable] = None,
+        on_shed: Optional[Callable[[], Awaitable[Any]]] = None
+    ) -> Any:
+        """
+        Выполняет call, когда освободится слот (очередь чата chat_key уже занята вызывающим).
+        start — момент получения апдейта, от него считается ожидание.
+        При отбрасывании вызывает on_shed (если задан) и возвращает None.
+        """
+        sheddable = update_class >= CLASS_ENTERTAINMENT
+        if sheddable:
+            saturated = self._in_flight >= self.max_in_flight or bool(self._waiters)
+            if len(self._waiters) >= self.shed_queue or (saturated and self._chat_backlog(chat_key) > 0):
+                await self._shed(update_class, on_shed)
+                return None
+
+        if start is None:
+            start = time.monotonic()
+        slot = _Slot(self, update_class)
+        try:
+            await slot.acquire()
+            waited = time.monotonic() - start
+            if sheddable and waited > self.shed_wait:
+                # Слот не нужен на время ответа об отказе
+                slot.release()
+                await self._shed(update_class, on_shed)
+                return None
+            self._stats[update_class].record(waited)
+            token = outbound_wait_scope.set(slot.yielded)
+            try:
+                return await call()
+            finally:
+                outbound_wait_scope.reset(token)
+        finally:
+            slot.close()
+
+    def stats(self) -> Dict[str, Any]:
+        classes = {}
+        for update_class, stats in self._stats.items():
+            recent = sorted(stats.recent)
+            classes[_CLASS_NAMES[update_class]] = {
+                "handled": stats.handled,
+                "shed": stats.shed,
+                "wait_avg_ms": stats.wait_total / stats.handled * 1000 if stats.handled else 0.0,
+                "wait_p95_ms": recent[min(len(recent) - 1, int(len(recent) * 0.95))] * 1000 if recent else 0.0,
+                "wait_max_ms": stats.wait_max * 1000,
+            }
+        return {
+            "in_flight": self._in_flight,
+            "waiting": len(self._waiters),
+            "chats": len(self._chats),
+            "classes": classes,
+        }
+
+    def log_stats(self):
+        for name, stats in self.stats()["classes"].items():
+            if not stats["handled"] and not stats["shed"]:
+                continue
+            logging.info(
+                f"Апдейты {name}: обработано {stats['handled']}, отброшено {stats['shed']}, "
+                f"ожидание в очереди: среднее {stats['wait_avg_ms']:.0f} мс, "
+                f"p95 {stats['wait_p95_ms']:.0f} мс, максимум {stats['wait_max_ms']:.0f} мс"
+            )
+
+
+update_scheduler = UpdateScheduler(
+    config.scheduler_max_in_flight, config.scheduler_shed_queue, config.scheduler_shed_wait
+)
+
+
+class ChatOrderMiddleware(BaseMiddleware):
+    """
+    Outer middleware dp.update: апдейты одного чата (или пользователя, если чата нет)
+    проходят фильтры, middleware и хендлеры строго в порядке получения.
+    Класс апдейта еще неизвестен — его назначает SchedulerMiddleware найденного роутера.
+    """
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any]
+    ) -> Any:
+        chat = data.get("event_chat")
+        user = data.get("event_from_user")
+        chat_key = chat.id if chat else (user.id if user else None)
+
+        data["scheduler_received_at"] = time.monotonic()
+        data["scheduler_chat"] = chat_key
+        async with update_scheduler.chat_turn(chat_key):
+            return await handler(event, data)
+
+
+class SchedulerMiddleware(BaseMiddleware):
+    """
+    Inner middleware роутера: хендлер выполняется через update_scheduler
+    с классом роутера, исходящие запросы хендлера идут в соответствующей полосе.
+    """
+    def __init__(self, update_class: int):
+        self.update_class = update_class
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any]
+    ) -> Any:
+        on_shed = None
+        if isinstance(event, types.CallbackQuery):
+            # Иначе у пользователя кнопка так и останется «загружаться»
+            on_shed = lambda: event.answer("⏳ Бот перегружен, попробуйте еще раз через несколько секунд")
+
+        token = outbound_priority.set(_OUTBOUND_PRIORITY[self.update_class])
+        try:
+            return await update_scheduler.run(
+                self.update_class, lambda: handler(event, data),
+                data.get("scheduler_received_at"), data.get("scheduler_chat"), on_shed
+            )
+        finally:
+            outbound_priority.reset(token)
+
+
+def set_update_class(router: Router, update_class: int):
+    """
+    Подключает планировщик к хендлерам роутера с заданным классом.
+    Назначается только конечным роутерам: inner middleware родителя действуют и на вложенные.
+    """
+    middleware = SchedulerMiddleware(update_class)
+    for observer in (router.message, router.callback_query, router.chat_member, router.my_chat_member):
+        observer.middleware(middleware)
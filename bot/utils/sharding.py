@@ -0,0 +1,230 @@
+import asyncio
+import logging
+import multiprocessing
+import queue
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# Разделы апдейта, в которых лежит чат (в порядке проверки)
+_CHAT_SECTIONS = (
+    "message", "edited_message", "channel_post", "edited_channel_post",
+    "chat_member", "my_chat_member", "chat_join_request", "message_reaction",
+)
+
+
+def update_shard_key(update: Dict[str, Any]) -> int:
+    """chat_id апдейта (для колбэков — чат сообщения с кнопкой, иначе пользователь)."""
+    for section in _CHAT_SECTIONS:
+        event = update.get(section)
+        if event and "chat" in event:
+            return event["chat"]["id"]
+
+    callback = update.get("callback_query")
+    if callback:
+        if callback.get("message"):
+            return callback["message"]["chat"]["id"]
+        return callback["from"]["id"]
+
+    for event in update.values():
+        if isinstance(event, dict) and isinstance(event.get("from"), dict):
+            return event["from"]["id"]
+    return 0
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """
+    Jump consistent hash (Lamping, Veach): при изменении числа воркеров
+    переезжает только 1/N чатов, остальные остаются на своих воркерах с их кэшами.
+    """
+    key &= 0xFFFFFFFFFFFFFFFF
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return b
+
+
+class _Worker:
+    def __init__(self, index: int):
+        self.index = index
+        self.updates: Any = None
+        self.processed: Any = None
+        self.process: Optional[multiprocessing.Process] = None
+        self.restart_task: Optional[asyncio.Task] = None
+        self.dispatched = 0
+        self.dropped = 0
+        # Обработано предыдущими процессами воркера (счетчик создается заново при каждом запуске)
+        self.processed_before = 0
+        self.restarts = 0
+        # Падения подряд: от них зависит задержка перезапуска, сбрасываются после минуты работы
+        self.failures = 0
+        self.started_at = 0.0
+
+
+class ShardManager:
+    """
+    Распределяет апдейты по N процессам-воркерам по хэшу chat_id.
+    Все апдейты одного чата попадают в один воркер — порядок внутри чата
+    сохраняется, а локальные кэши чата (ранги, админы, модули) живут в одном месте.
+    Упавший воркер перезапускается с новой очередью: процесс, убитый во время
+    ожидания в get(), оставляет заблокированным reader lock старой очереди,
+    и новый процесс из нее ничего бы не получил. Нагрузку по воркерам
+    показывает stats() и периодический лог.
+    """
+    def __init__(self, workers: int, target: Callable[..., Any], queue_size: int):
+        self._ctx = multiprocessing.get_context("spawn")
+        self.target = target
+        self.queue_size = queue_size
+        self.workers: List[_Worker] = [_Worker(index) for index in range(workers)]
+        self._monitor: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def _spawn(self, worker: _Worker):
+        # Главный процесс — единственный писатель, поэтому очередь можно просто заменить.
+        # Апдейты, оставшиеся в очереди упавшего воркера, теряются
+        if worker.processed is not None:
+            worker.processed_before += worker.processed.value
+        worker.updates = self._ctx.Queue(self.queue_size)
+        worker.processed = self._ctx.Value("q", 0)
+        worker.process = self._ctx.Process(
+            target=self.target,
+            args=(worker.index, worker.updates, worker.processed),
+            name=f"bot-worker-{worker.index}",
+            daemon=True,
+        )
+        worker.process.start()
+        worker.started_at = time.monotonic()
+        logging.info(f"Воркер {worker.index} запущен (pid {worker.process.pid})")
+
+    def start(self, restart_delay: float, stats_interval: float):
+        for worker in self.workers:
+            self._spawn(worker)
+        self._monitor = asyncio.create_task(self._watch(restart_delay, stats_interval))
+
+    def dispatch(self, update: Dict[str, Any]):
+        worker = self.workers[jump_hash(update_shard_key(update), len(self.workers))]
+        try:
+            worker.updates.put_nowait(update)
+            worker.dispatched += 1
+        except queue.Full:
+            worker.dropped += 1
+            logging.warning(f"Очередь воркера {worker.index} переполнена, апдейт {update.get('update_id')} отброшен")
+
+    async def _restart(self, worker: _Worker, restart_delay: float):
+        # Падение сразу после старта — ждем дольше, чтобы не перезапускать в цикле
+        if time.monotonic() - worker.started_at > 60:
+            worker.failures = 0
+        delay = min(restart_delay * 2 ** worker.failures, 60)
+        logging.error(
+            f"Воркер {worker.index} завершился (код {worker.process.exitcode}), "
+            f"перезапуск через {delay:.0f} с"
+        )
+        await asyncio.sleep(delay)
+        if self._stopping:
+            return
+        worker.failures += 1
+        worker.restarts += 1
+        self._spawn(worker)
+
+    async def _watch(self, restart_delay: float, stats_interval: float):
+        last_stats = time.monotonic()
+        while not self._stopping:
+            await asyncio.sleep(1)
+            for worker in self.workers:
+                if worker.restart_task and not worker.restart_task.done():
+                    continue
+                if worker.process.is_alive():
+                    if worker.failures and time.monotonic() - worker.started_at > 60:
+                        worker.failures = 0
+                    continue
+                # Каждый перезапуск ждет в своей задаче и не задерживает остальных
+                worker.restart_task = asyncio.create_task(self._restart(worker, restart_delay))
+
+            if time.monotonic() - last_stats >= stats_interval:
+                last_stats = time.monotonic()
+                self.log_stats()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        result = []
+        for worker in self.workers:
+            try:
+                queued = worker.updates.qsize()
+            except NotImplementedError:
+                # macOS не поддерживает qsize у multiprocessing.Queue
+                queued = None
+            result.append({
+                "worker": worker.index,
+                "pid": worker.process.pid if worker.process else None,
+                "alive": bool(worker.process and worker.process.is_alive()),
+                "restarts": worker.restarts,
+                "dispatched": worker.dispatched,
+                "processed": worker.processed_before + worker.processed.value,
+                "queued": queued,
+                "dropped": worker.dropped,
+            })
+        return result
+
+    def log_stats(self):
+        for item in self.stats():
+            logging.info(
+                f"Воркер {item['worker']}: передано {item['dispatched']}, обработано {item['processed']}, "
+                f"в очереди {item['queued']}, отброшено {item['dropped']}, перезапусков {item['restarts']}"
+            )
+
+    async def stop(self, timeout: float):
+        """Просит воркеров доработать очередь и завершиться, зависших останавливает принудительно."""
+        self._stopping = True
+        tasks = [self._monitor] + [worker.restart_task for worker in self.workers]
+        tasks = [task for task in tasks if task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        for worker in self.workers:
+            if worker.process and worker.process.is_alive():
+                worker.updates.put(None)
+
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + timeout
+        for worker in self.workers:
+            if worker.process is None:
+                continue
+            await loop.run_in_executor(None, worker.process.join, max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                logging.warning(f"Воркер {worker.index} не завершился за {timeout:.0f} с, останавливаем")
+                worker.process.terminate()
+        self.log_stats()
+
+
+async def consume_updates(
+    updates: Any,
+    processed: Any,
+    handle: Callable[[Dict[str, Any]], Awaitable[Any]],
+):
+    """
+    Цикл воркера: берет апдейты из очереди и обрабатывает их задачами, как polling.
+    None в очереди — сигнал остановки: новые апдейты не берутся, начатые дорабатываются.
+    """
+    loop = asyncio.get_running_loop()
+    tasks = set()
+
+    async def run(update: Dict[str, Any]):
+        try:
+            await handle(update)
+        except Exception as e:
+            logging.error(f"Ошибка обработки апдейта {update.get('update_id')}: {e}")
+        finally:
+            with processed.get_lock():
+                processed.value += 1
+
+    while True:
+        update = await loop.run_in_executor(None, updates.get)
+        if update is None:
+            break
+        task = asyncio.create_task(run(update))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
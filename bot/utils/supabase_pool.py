@@ -0,0 +1,119 @@
+import asyncio
+import time
+import logging
+from typing import Dict, Any
+import httpx
+from postgrest import AsyncPostgrestClient
+from postgrest.constants import DEFAULT_POSTGREST_CLIENT_HEADERS
+from bot.config_reader import config
+
+# HTTP/2 требует пакет h2 (ставится вместе с httpx[http2]), без него работаем по HTTP/1.1
+try:
+    import h2  # noqa: F401
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+
+class PoolMonitor:
+    """
+    Ограничивает число одновременных запросов размером пула соединений
+    и считает, сколько запросов ждали свободного слота и как долго.
+    """
+    def __init__(self, size: int):
+        self.size = size
+        self._semaphore = asyncio.Semaphore(size)
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.waiting = 0
+        self.total_requests = 0
+        self.queued_requests = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    async def __aenter__(self):
+        start = time.monotonic()
+        if self._semaphore.locked():
+            self.queued_requests += 1
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        wait = time.monotonic() - start
+        self.total_requests += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+        if wait * 1000 > config.supabase_queue_warn_ms:
+            logging.warning(
+                f"Пул Supabase переполнен: запрос ждал {wait * 1000:.0f} мс "
+                f"(в работе {self.in_flight}/{self.size}, в очереди {self.waiting})"
+            )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "waiting": self.waiting,
+            "saturation": self.in_flight / self.size if self.size else 0.0,
+            "total_requests": self.total_requests,
+            "queued_requests": self.queued_requests,
+            "avg_wait_ms": (self.total_wait / self.total_requests * 1000) if self.total_requests else 0.0,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+
+# Общий keep-alive клиент для всех запросов к PostgREST
+http_client = httpx.AsyncClient(
+    http2=config.supabase_http2 and _HTTP2_AVAILABLE,
+    limits=httpx.Limits(
+        max_connections=config.supabase_pool_size,
+        max_keepalive_connections=config.supabase_pool_keepalive,
+        keepalive_expiry=config.supabase_keepalive_expiry,
+    ),
+    timeout=httpx.Timeout(config.supabase_timeout, connect=config.supabase_connect_timeout),
+    follow_redirects=True,
+)
+
+if config.supabase_http2 and not _HTTP2_AVAILABLE:
+    logging.warning("Пакет h2 не установлен, соединение с Supabase работает по HTTP/1.1")
+
+_supabase_key = config.supabase_key.get_secret_value()
+
+supabase = AsyncPostgrestClient(
+    f"{config.supabase_url.rstrip('/')}/rest/v1",
+    headers={
+        **DEFAULT_POSTGREST_CLIENT_HEADERS,
+        "apikey": _supabase_key,
+        "Authorization": f"Bearer {_supabase_key}",
+    },
+    http_client=http_client,
+)
+
+pool_monitor = PoolMonitor(config.supabase_pool_size)
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Возвращает метрики загрузки пула соединений к Supabase."""
+    return pool_monitor.stats()
+
+
+async def close_supabase_pool():
+    """Закрывает соединения пула. Вызывается при остановке бота."""
+    stats = get_pool_stats()
+    logging.info(
+        f"Пул Supabase: {stats['total_requests']} запросов, пик {stats['peak_in_flight']}/{stats['size']}, "
+        f"в очереди побывало {stats['queued_requests']}, среднее ожидание {stats['avg_wait_ms']:.1f} мс, "
+        f"максимум {stats['max_wait_ms']:.0f} мс"
+    )
+    await http_client.aclose()
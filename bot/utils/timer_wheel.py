@@ -0,0 +1,91 @@
+from typing import Dict, Hashable, List, Set, Tuple
+
+
+class TimerWheel:
+    """
+    Иерархическое колесо таймеров (Varghese, Lauck).
+    Уровень L состоит из slots ячеек по slots**L тиков. Таймер кладется на уровень,
+    где помещается его остаток до срока; когда колесо доходит до ячейки
+    верхнего уровня, ее таймеры раскладываются ниже. Добавление, отмена и шаг
+    стоят O(1) независимо от числа таймеров, срабатывают сразу все таймеры ячейки.
+    Время — номер тика (целое), перевод из секунд делает вызывающий код.
+    """
+    def __init__(self, now_tick: int, slots: int = 64, levels: int = 4):
+        self.slots = slots
+        self.levels = levels
+        self.current = now_tick
+        self._wheel: List[List[Set[Hashable]]] = [[set() for _ in range(slots)] for _ in range(levels)]
+        self._deadlines: Dict[Hashable, int] = {}
+        self._where: Dict[Hashable, Tuple[int, int]] = {}
+        # Таймеры, срок которых уже наступил при добавлении
+        self._due: Set[Hashable] = set()
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._deadlines
+
+    def _place(self, key: Hashable, deadline: int):
+        remaining = deadline - self.current
+        if remaining <= 0:
+            self._due.add(key)
+            self._where[key] = (-1, -1)
+            return
+        level, span = 0, 1
+        while level < self.levels - 1 and remaining >= span * self.slots:
+            level += 1
+            span *= self.slots
+        # Дальше горизонта верхнего уровня: ячейка будет пройдена раньше срока,
+        # и таймер просто переложится заново
+        slot = (deadline // span) % self.slots
+        self._wheel[level][slot].add(key)
+        self._where[key] = (level, slot)
+
+    def add(self, key: Hashable, deadline: int):
+        """Добавляет (или переносит) таймер key со сроком на тике deadline."""
+        self.remove(key)
+        self._deadlines[key] = deadline
+        self._place(key, deadline)
+
+    def remove(self, key: Hashable) -> bool:
+        if key not in self._deadlines:
+            return False
+        del self._deadlines[key]
+        level, slot = self._where.pop(key)
+        if level < 0:
+            self._due.discard(key)
+        else:
+            self._wheel[level][slot].discard(key)
+        return True
+
+    def _pop_slot(self, level: int, slot: int) -> Set[Hashable]:
+        keys = self._wheel[level][slot]
+        self._wheel[level][slot] = set()
+        return keys
+
+    def advance(self, now_tick: int) -> List[Hashable]:
+        """Продвигает колесо до now_tick и возвращает сработавшие таймеры."""
+        expired: List[Hashable] = []
+        if self._due:
+            expired.extend(self._due)
+            self._due = set()
+
+        while self.current < now_tick:
+            self.current += 1
+            # Раскладываем верхние уровни, начиная со старшего
+            span = self.slots ** (self.levels - 1)
+            for level in range(self.levels - 1, 0, -1):
+                if self.current % span == 0:
+                    for key in self._pop_slot(level, (self.current // span) % self.slots):
+                        self._place(key, self._deadlines[key])
+                span //= self.slots
+            expired.extend(self._pop_slot(0, self.current % self.slots))
+            if self._due:
+                expired.extend(self._due)
+                self._due = set()
+
+        for key in expired:
+            self._deadlines.pop(key, None)
+            self._where.pop(key, None)
+        return expired
@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import math
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from aiogram import Bot
+from bot.config_reader import config
+from bot.utils.db_manager import save_timer, delete_timer, load_timers, claim_timers
+from bot.utils.outbound import outbound_priority, PRIORITY_LOW
+from bot.utils.timer_wheel import TimerWheel
+
+# Обработчик сработавших таймеров одного вида: получает их все за тик разом
+ExpiryHandler = Callable[[Bot, List[Dict[str, Any]]], Awaitable[None]]
+
+
+class TimerService:
+    """
+    Отложенные события с интерактивным состоянием (приглашение на дуэль,
+    предложение брака): строка в таблице timers плюс таймер в колесе.
+    - переживают перезапуск: при запуске и каждые sync_interval секунд из БД
+      подгружаются таймеры, срок которых подходит (в том числе созданные
+      другими воркерами);
+    - сработавшие за тик таймеры забираются одним вызовом claim_timers, который
+      удаляет строки, — событие обработает только один процесс, а отмененное
+      (строка уже удалена) не обработается вовсе;
+    - get/pending — состояние ожидающих событий этого процесса.
+    """
+    def __init__(self, tick: float, sync_interval: float):
+        self.tick = tick
+        self.sync_interval = sync_interval
+        self._wheel = TimerWheel(self._tick_of(time.time()))
+        self._timers: Dict[str, Dict[str, Any]] = {}
+        # Таймеры, которые не удалось сохранить в БД: работают только в этом процессе
+        self._local_only: Set[str] = set()
+        # Таймеры, чей claim_timers завершился ошибкой: сервер мог успеть удалить строки
+        self._unsure_claims: Set[str] = set()
+        self._handlers: Dict[str, ExpiryHandler] = {}
+        self._bot: Optional[Bot] = None
+        self._task: Optional[asyncio.Task] = None
+        self.fired = 0
+
+    def _tick_of(self, timestamp: float) -> int:
+        return math.ceil(timestamp / self.tick)
+
+    def register(self, kind: str, handler: ExpiryHandler):
+        self._handlers[kind] = handler
+
+    def _add_local(self, row: Dict[str, Any]):
+        self._timers[row["key"]] = row
+        fire_at = datetime.fromisoformat(row["fire_at"]).timestamp()
+        self._wheel.add(row["key"], self._tick_of(fire_at))
+
+    async def schedule(
+        self,
+        key: str,
+        kind: str,
+        delay: float,
+        chat_id: Optional[int] = None,
+        payload: Optional[Dict[str, Any]] = None
+    ):
+        """Событие kind через delay секунд. Повторный вызов с тем же key переносит срок."""
+        fire_at = datetime.now(timezone.utc) + timedelta(seconds=delay)
+        row = {
+            "key": key,
+            "kind": kind,
+            "chat_id": chat_id,
+            "fire_at": fire_at.isoformat(),
+            "payload": payload or {},
+        }
+        self._add_local(row)
+        if await save_timer(key, kind, chat_id, fire_at, row["payload"]):
+            self._local_only.discard(key)
+        else:
+            self._local_only.add(key)
+
+    async def cancel(self, key: str) -> bool:
+        """
+        Отменяет событие. True, если оно еще ожидало (значит, ответ на приглашение
+        успел до срока), False — уже сработало, отменено или его не было.
+        """
+        self._wheel.remove(key)
+        row = self._timers.pop(key, None)
+        self._unsure_claims.discard(key)
+        if key in self._local_only:
+            self._local_only.discard(key)
+            return row is not None
+
+        deleted = await delete_timer(key)
+        if deleted is None:
+            # БД недоступна — судим по локальному состоянию
+            return row is not None
+        return deleted
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._timers.get(key)
+
+    def pending(self, kind: Optional[str] = None, chat_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        return [
+            row for row in self._timers.values()
+            if (kind is None or row["kind"] == kind) and (chat_id is None or row["chat_id"] == chat_id)
+        ]
+
+    async def _sync(self):
+        """Подгружает из БД таймеры, срок которых наступит до следующей синхронизации."""
+        until = datetime.now(timezone.utc) + timedelta(seconds=self.sync_interval * 2)
+        rows = await load_timers(until)
+        if rows is None:
+            return
+        for row in rows:
+            if row["key"] not in self._timers:
+                self._add_local(row)
+
+    async def _fire(self, keys: List[str]):
+        rows = [self._timers.pop(key) for key in keys if key in self._timers]
+        local = [row for row in rows if row["key"] in self._local_only]
+        stored = [row for row in rows if row["key"] not in self._local_only]
+        self._local_only.difference_update(row["key"] for row in local)
+
+        claimed = await claim_timers([row["key"] for row in stored]) if stored else []
+        if claimed is None:
+            # Не получилось забрать — повторим через несколько тиков. Если сервер все же
+            # выполнил claim, строки уже удалены и повтор их не найдет
+            logging.warning(
+                f"claim_timers не выполнен для {len(stored)} таймеров, повтор через {self.tick * 5:.1f} с; "
+                f"если сервер успел их забрать, события будут потеряны"
+            )
+            retry_at = (datetime.now(timezone.utc) + timedelta(seconds=self.tick * 5)).isoformat()
+            for row in stored:
+                self._add_local({**row, "fire_at": retry_at})
+                self._unsure_claims.add(row["key"])
+            claimed = []
+        else:
+            claimed_keys = {row["key"] for row in claimed}
+            lost = [row["key"] for row in stored if row["key"] in self._unsure_claims and row["key"] not in claimed_keys]
+            if lost:
+                logging.error(
+                    f"Таймеры не найдены при повторном claim_timers (забраны неудачным вызовом, "
+                    f"отменены или обработаны другим воркером): {', '.join(lost)}"
+                )
+            self._unsure_claims.difference_update(row["key"] for row in stored)
+
+        by_kind: Dict[str, List[Dict[str, Any]]] = {}
+        for row in local + claimed:
+            by_kind.setdefault(row["kind"], []).append(row)
+
+        for kind, batch in by_kind.items():
+            handler = self._handlers.get(kind)
+            if handler is None:
+                logging.warning(f"Нет обработчика для таймеров {kind}, пропущено {len(batch)}")
+                continue
+            self.fired += len(batch)
+            try:
+                await handler(self._bot, batch)
+            except Exception as e:
+                logging.error(f"Ошибка обработки таймеров {kind} ({len(batch)} шт.): {e}")
+
+    async def _run(self):
+        # Сообщения об истечении приглашений не должны обгонять ответы на команды
+        outbound_priority.set(PRIORITY_LOW)
+        await self._sync()
+        last_sync = time.monotonic()
+        while True:
+            await asyncio.sleep(self.tick)
+            if time.monotonic() - last_sync >= self.sync_interval:
+                await self._sync()
+                last_sync = time.monotonic()
+
+            due = self._wheel.advance(self._tick_of(time.time()))
+            if due:
+                await self._fire(due)
+
+    def start(self, bot: Bot):
+        self._bot = bot
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Таймеры остаются в БД и сработают после запуска
+        logging.info(f"Таймеры: сработало {self.fired}, ожидают {len(self._timers)}")
+
+
+timer_service = TimerService(config.timer_tick, config.timer_sync_interval)
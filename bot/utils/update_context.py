@@ -0,0 +1,64 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from aiogram import types
+from bot.utils.db_manager import (
+    get_disabled_modules, get_permission_settings, get_user_rank_context,
+    get_nickname, rank_allows_modify, format_user_mention
+)
+
+
+class UpdateContext:
+    """
+    Данные чата и отправителя для одного апдейта. Создается ContextMiddleware
+    и передается фильтрам и хендлерам через data["ctx"].
+    Каждое значение загружается лениво и не больше одного раза за апдейт:
+    сколько бы роутеров ни проверяли модули и ранги, запрос делается один.
+    """
+    __slots__ = ("chat", "user_id", "_loaded")
+
+    def __init__(self, chat: Optional[types.Chat], user_id: Optional[int]):
+        object.__setattr__(self, "chat", chat)
+        object.__setattr__(self, "user_id", user_id)
+        object.__setattr__(self, "_loaded", {})
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError("UpdateContext неизменяемый")
+
+    async def _load(self, key: Tuple, factory: Callable[[], Awaitable[Any]]) -> Any:
+        # Храним задачу, а не результат, чтобы одновременные обращения ждали один запрос
+        task = self._loaded.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._loaded[key] = task
+        return await task
+
+    async def disabled_modules(self) -> List[str]:
+        if self.chat is None:
+            return []
+        return await self._load(("disabled_modules",), lambda: get_disabled_modules(self.chat.id))
+
+    async def permission_settings(self) -> Dict[str, int]:
+        if self.chat is None:
+            return {}
+        return await self._load(("permission_settings",), lambda: get_permission_settings(self.chat.id))
+
+    async def rank(self, user_id: Optional[int] = None) -> Tuple[int, str, bool]:
+        """Ранг пользователя в чате (по умолчанию отправителя): (уровень, название, супер)."""
+        user_id = self.user_id if user_id is None else user_id
+        return await self._load(("rank", user_id), lambda: get_user_rank_context(user_id, self.chat))
+
+    async def nickname(self, user_id: Optional[int] = None) -> Optional[str]:
+        user_id = self.user_id if user_id is None else user_id
+        return await self._load(("nickname", user_id), lambda: get_nickname(user_id))
+
+    async def mention(self, user: types.User) -> str:
+        """Ссылка на пользователя с никнеймом, как get_user_mention_with_nickname, но никнейм из контекста."""
+        return format_user_mention(user, await self.nickname(user.id))
+
+    async def can_modify(self, target_user_id: int) -> bool:
+        """То же, что can_user_modify_other для отправителя, но с рангами из контекста."""
+        if self.user_id == target_user_id:
+            return True
+        admin_rank, _, is_admin_super = await self.rank()
+        target_rank, _, is_target_super = await self.rank(target_user_id)
+        return rank_allows_modify(admin_rank, is_admin_super, target_rank, is_target_super)
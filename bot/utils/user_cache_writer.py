@@ -0,0 +1,38 @@
+import asyncio
+from typing import Optional
+from bot.config_reader import config
+from bot.utils.db_manager import flush_user_cache
+
+
+class UserCacheWriter:
+    """
+    Периодически записывает накопленные update_user_cache изменения имен
+    пользователей. Число запросов к users зависит от того, как часто люди
+    меняют username и имя, а не от количества сообщений.
+    """
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await flush_user_cache()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Останавливает таймер и записывает остатки в БД."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await flush_user_cache()
+
+
+user_cache_writer = UserCacheWriter(config.user_cache_flush_interval)
@@ -0,0 +1,92 @@
+import asyncio
+import hmac
+import logging
+from typing import Any, Callable, Dict, List, Optional
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from bot.config_reader import config
+
+
+class WebhookServer:
+    """
+    Прием апдейтов через webhook вместо long polling.
+    aiohttp-приложение с обработчиком апдейтов на webhook_path (проверяет
+    X-Telegram-Bot-Api-Secret-Token) и health-эндпоинтом для прокси и
+    оркестратора: 200, когда webhook зарегистрирован и бот принимает апдейты,
+    503 при запуске и остановке.
+    С feed апдейты не обрабатываются на месте, а передаются в feed как есть
+    (режим нескольких воркеров), stats добавляет данные в ответ health.
+    """
+    def __init__(
+        self,
+        dp: Optional[Dispatcher],
+        bot: Bot,
+        feed: Optional[Callable[[Dict[str, Any]], None]] = None,
+        stats: Optional[Callable[[], Any]] = None
+    ):
+        self.dp = dp
+        self.bot = bot
+        self.feed = feed
+        self.stats = stats
+        self.status = "starting"
+        self._secret = config.webhook_secret.get_secret_value() if config.webhook_secret else None
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        if not self._secret:
+            logging.warning("WEBHOOK_SECRET не задан: запросы к webhook не проверяются")
+
+        if self.feed:
+            app.router.add_post(config.webhook_path, self.receive)
+        else:
+            # Апдейт обрабатывается в фоне, Telegram сразу получает ответ 200
+            SimpleRequestHandler(dispatcher=self.dp, bot=self.bot, secret_token=self._secret).register(
+                app, path=config.webhook_path
+            )
+            setup_application(app, self.dp, bot=self.bot)
+        app.router.add_get(config.health_path, self.health)
+        return app
+
+    async def receive(self, request: web.Request) -> web.Response:
+        """Принимает апдейт и передает его в feed без разбора."""
+        if self._secret and not hmac.compare_digest(
+            request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), self._secret
+        ):
+            return web.Response(status=401)
+        self.feed(await request.json())
+        return web.Response()
+
+    async def health(self, request: web.Request) -> web.Response:
+        body = {"status": self.status, "mode": "webhook"}
+        if self.stats:
+            body["workers"] = self.stats()
+        return web.json_response(body, status=200 if self.status == "ready" else 503)
+
+    async def run(self, allowed_updates: List[str]):
+        """Поднимает сервер, регистрирует webhook в Telegram и работает до отмены."""
+        if not config.webhook_url:
+            raise ValueError("Для BOT_MODE=webhook нужно задать WEBHOOK_URL")
+
+        runner = web.AppRunner(self.build_app())
+        await runner.setup()
+        try:
+            site = web.TCPSite(runner, config.webhook_host, config.webhook_port)
+            await site.start()
+
+            await self.bot.set_webhook(
+                url=config.webhook_url.rstrip("/") + config.webhook_path,
+                secret_token=self._secret,
+                allowed_updates=allowed_updates,
+                max_connections=config.webhook_max_connections,
+            )
+            self.status = "ready"
+            logging.info(
+                f"Webhook запущен на {config.webhook_host}:{config.webhook_port}{config.webhook_path}, "
+                f"проверка готовности: {config.health_path}"
+            )
+            await asyncio.Event().wait()
+        finally:
+            self.status = "stopping"
+            # Webhook в Telegram не удаляем: апдейты дождутся следующего запуска
+            await runner.cleanup()
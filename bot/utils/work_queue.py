@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from bot.config_reader import config
+
+Job = Tuple[Callable[..., Awaitable[Any]], tuple, dict]
+
+
+class WorkQueue:
+    """
+    Ограниченная очередь фоновых задач с фиксированным числом воркеров.
+    Для второстепенной работы (кэш пользователей и т.п.), которая не должна
+    задерживать ответ хендлера. При переполнении новые задачи отбрасываются
+    (submit) либо ожидают места (put), при остановке очередь дорабатывается.
+    """
+    def __init__(self, name: str, maxsize: int, workers: int):
+        self.name = name
+        self.workers = workers
+        self._queue: "asyncio.Queue[Job]" = asyncio.Queue(maxsize)
+        self._tasks: List[asyncio.Task] = []
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self._last_drop_warning = 0.0
+
+    def submit(self, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> bool:
+        """Ставит задачу без ожидания. Если очередь заполнена — отбрасывает ее и возвращает False."""
+        try:
+            self._queue.put_nowait((func, args, kwargs))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            # Не чаще раза в 10 секунд, чтобы не забивать лог при перегрузке
+            now = time.monotonic()
+            if now - self._last_drop_warning > 10:
+                self._last_drop_warning = now
+                logging.warning(
+                    f"Очередь {self.name} переполнена ({self._queue.qsize()}), "
+                    f"задача {func.__name__} отброшена (всего отброшено {self.dropped})"
+                )
+            return False
+
+    async def put(self, func: Callable[..., Awaitable[Any]], *args, **kwargs):
+        """Ставит задачу, дожидаясь свободного места (для работы, которую нельзя терять)."""
+        await self._queue.put((func, args, kwargs))
+
+    async def _worker(self):
+        while True:
+            func, args, kwargs = await self._queue.get()
+            try:
+                await func(*args, **kwargs)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logging.error(f"Ошибка фоновой задачи {func.__name__} в очереди {self.name}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: Optional[float] = None):
+        """Дожидается выполнения поставленных задач (не дольше timeout) и останавливает воркеров."""
+        if self._tasks:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logging.warning(f"Очередь {self.name}: не успели выполнить {self._queue.qsize()} задач при остановке")
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._tasks = []
+
+        stats = self.stats()
+        logging.info(
+            f"Очередь {self.name}: выполнено {stats['processed']}, с ошибкой {stats['failed']}, "
+            f"отброшено {stats['dropped']}"
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "depth": self._queue.qsize(),
+            "maxsize": self._queue.maxsize,
+            "workers": len(self._tasks),
+            "processed": self.processed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
+
+
+background_queue = WorkQueue("background", config.work_queue_size, config.work_queue_workers)
+
+
+def get_work_queue_stats() -> Dict[str, Any]:
+    """Глубина очереди фоновых задач и счетчики выполненных/отброшенных."""
+    return background_queue.stats()
@@ -1,52 +1,195 @@
 import asyncio
 import logging
+import signal
 from aiogram import Bot, Dispatcher
 from aiogram.client.session.aiohttp import AiohttpSession
 from aiogram.client.default import DefaultBotProperties
 from bot.config_reader import config
 from bot.handlers import admin, groups, user
-from bot.middlewares import ActivityMiddleware, AntispamMiddleware
+from bot.middlewares import (
+    ActivityMiddleware, AntispamMiddleware, RankCacheMiddleware,
+    ContextMiddleware, CommandMiddleware
+)
+from bot.utils.supabase_pool import close_supabase_pool
+from bot.utils.activity_aggregator import activity_aggregator
+from bot.utils.blacklist_sync import antispam_blacklist
+from bot.utils.work_queue import background_queue
+from bot.utils.user_cache_writer import user_cache_writer
+from bot.utils.render_pool import render_pool
+from bot.utils.cache import log_cache_stats
+from bot.utils.outbound import outbound_limiter
+from bot.utils.webhook import WebhookServer
+from bot.utils.sharding import ShardManager, consume_updates
+from bot.utils.invalidation_bus import invalidation_bus
+from bot.utils.scheduler import update_scheduler, ChatOrderMiddleware
+from bot.utils.timers import timer_service
+from bot.utils.expiry_sweeper import expiry_sweeper
+from bot.modules.moderation import drain_pending_deletes
 
-async def main():
-    # Настройка логирования
+# Ограничиваем типы обновлений, чтобы бот не получал лишнего
+ALLOWED_UPDATES = ["message", "callback_query", "chat_member", "my_chat_member"]
+
+
+def setup_logging(prefix: str = ""):
     logging.basicConfig(
         level=logging.INFO,
-        format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
+        format=f"%(asctime)s - %(levelname)s - {prefix}%(name)s - %(message)s",
     )
 
+
+def create_bot() -> Bot:
     # Оптимизация сессии для Windows (WinError 121)
     # Используем увеличенный таймаут (в секундах)
     session = AiohttpSession(
         timeout=60
     )
-    
-    # Инициализация бота и диспетчера
-    bot = Bot(
+    # Лимиты Telegram, приоритеты и обработка retry_after для всех исходящих запросов
+    session.middleware(outbound_limiter)
+
+    return Bot(
         token=config.bot_token.get_secret_value(),
         session=session,
         default=DefaultBotProperties(parse_mode="HTML") # Устанавливаем HTML по умолчанию
     )
+
+
+def create_dispatcher() -> Dispatcher:
     dp = Dispatcher()
 
     # Регистрация middleware
+    # Очередь чата — до всех остальных middleware и фильтров роутеров
+    dp.update.outer_middleware(ChatOrderMiddleware())
+    dp.update.outer_middleware(ContextMiddleware())
+    dp.message.outer_middleware(CommandMiddleware())
     dp.message.outer_middleware(ActivityMiddleware())
     dp.message.outer_middleware(AntispamMiddleware())
+    dp.chat_member.outer_middleware(RankCacheMiddleware())
+    dp.my_chat_member.outer_middleware(RankCacheMiddleware())
 
     # Регистрация роутеров
     dp.include_router(admin.router)
     dp.include_router(groups.router)
     dp.include_router(user.router)
+    return dp
+
+
+def start_services(bot: Bot):
+    # Фоновый сброс активности в БД и синхронизация черного списка
+    activity_aggregator.start()
+    antispam_blacklist.start()
+    invalidation_bus.start()
+    background_queue.start()
+    user_cache_writer.start()
+    render_pool.start()
+    timer_service.start(bot)
+    expiry_sweeper.start()
+
+
+async def stop_services(bot: Bot):
+    await timer_service.stop()
+    await expiry_sweeper.stop()
+    await drain_pending_deletes()
+    await bot.session.close()
+    await background_queue.stop(config.work_queue_drain_timeout)
+    await user_cache_writer.stop()
+    render_pool.stop()
+    await activity_aggregator.stop()
+    await antispam_blacklist.stop()
+    await invalidation_bus.stop()
+    await close_supabase_pool()
+    log_cache_stats()
+    outbound_limiter.log_stats()
+    update_scheduler.log_stats()
+
+
+async def run_single():
+    """Один процесс: прием и обработка апдейтов."""
+    bot = create_bot()
+    dp = create_dispatcher()
+    start_services(bot)
 
     # Запуск бота
     try:
         print("Бот запущен...")
-        # Ограничиваем типы обновлений, чтобы бот не получал лишнего
-        await dp.start_polling(
-            bot, 
-            allowed_updates=["message", "callback_query", "chat_member", "my_chat_member"]
+        if config.bot_mode == "webhook":
+            await WebhookServer(dp, bot).run(ALLOWED_UPDATES)
+        else:
+            # Если раньше работал webhook, polling без его удаления не получит апдейтов
+            await bot.delete_webhook()
+            await dp.start_polling(
+                bot,
+                allowed_updates=ALLOWED_UPDATES
+            )
+    finally:
+        await stop_services(bot)
+
+
+async def poll_updates(bot: Bot, feed):
+    """Long polling без обработки: апдейты в сыром виде передаются в feed."""
+    await bot.delete_webhook()
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=30, allowed_updates=ALLOWED_UPDATES)
+        except Exception as e:
+            logging.error(f"Ошибка получения апдейтов: {e}")
+            await asyncio.sleep(1)
+            continue
+        for update in updates:
+            feed(update.model_dump(mode="json", exclude_none=True, by_alias=True))
+            offset = update.update_id + 1
+
+
+async def run_front():
+    """Режим нескольких воркеров: этот процесс только принимает апдейты и раздает их по chat_id."""
+    if config.cache_bus == "local":
+        logging.warning(
+            "Несколько воркеров с CACHE_BUS=local: изменения настроек дойдут до других воркеров "
+            "только по истечении TTL кэша. Для мгновенной инвалидации задайте CACHE_BUS=postgres"
         )
+
+    bot = create_bot()
+    shards = ShardManager(config.workers, worker_main, config.worker_queue_size)
+    shards.start(config.worker_restart_delay, config.worker_stats_interval)
+
+    try:
+        print(f"Бот запущен ({config.workers} воркеров)...")
+        if config.bot_mode == "webhook":
+            await WebhookServer(None, bot, feed=shards.dispatch, stats=shards.stats).run(ALLOWED_UPDATES)
+        else:
+            await poll_updates(bot, shards.dispatch)
     finally:
         await bot.session.close()
+        await shards.stop(config.work_queue_drain_timeout + 10)
+
+
+async def run_worker(index: int, updates, processed):
+    bot = create_bot()
+    dp = create_dispatcher()
+    start_services(bot)
+    await dp.emit_startup(bot=bot)
+    try:
+        await consume_updates(updates, processed, lambda update: dp.feed_raw_update(bot, update))
+    finally:
+        await dp.emit_shutdown(bot=bot)
+        await stop_services(bot)
+
+
+def worker_main(index: int, updates, processed):
+    """Точка входа процесса-воркера. Остановку координирует главный процесс через очередь."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    setup_logging(f"worker-{index} - ")
+    asyncio.run(run_worker(index, updates, processed))
+
+
+async def main():
+    # Настройка логирования
+    setup_logging()
+
+    if config.workers > 1:
+        await run_front()
+    else:
+        await run_single()
 
 
 if __name__ == "__main__":
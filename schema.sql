@@ -42,6 +42,12 @@ CREATE TABLE IF NOT EXISTS warns (
     date TIMESTAMPTZ DEFAULT NOW(),
     until TIMESTAMPTZ -- NULL для перманентного
 );
+CREATE INDEX IF NOT EXISTS idx_warns_chat_user ON warns(chat_id, user_id);
+
+-- Для пакетного удаления истекших наказаний (sweep_expired_punishments): бессрочные в индекс не попадают
+CREATE INDEX IF NOT EXISTS idx_mutes_until ON mutes(until) WHERE until IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_bans_until ON bans(until) WHERE until IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_warns_until ON warns(until) WHERE until IS NOT NULL;
 
 -- Награды
 CREATE TABLE IF NOT EXISTS awards (
@@ -124,6 +130,17 @@ CREATE TABLE IF NOT EXISTS activity_stats (
     PRIMARY KEY (user_id, date)
 );
 
+-- Итог сообщений за все время (поддерживается flush_activity, чтобы не суммировать всю историю)
+CREATE TABLE IF NOT EXISTS activity_totals (
+    user_id BIGINT PRIMARY KEY,
+    total BIGINT DEFAULT 0
+);
+
+-- Первичное заполнение из уже накопленной истории
+INSERT INTO activity_totals (user_id, total)
+SELECT user_id, SUM(count) FROM activity_stats GROUP BY user_id
+ON CONFLICT (user_id) DO NOTHING;
+
 -- Репутация
 CREATE TABLE IF NOT EXISTS reputation (
     chat_id BIGINT,
@@ -167,6 +184,8 @@ CREATE TABLE IF NOT EXISTS antispam_blacklist (
     reason TEXT DEFAULT 'Спам (HW-Антиспам)',
     added_at TIMESTAMPTZ DEFAULT NOW()
 );
+-- Для инкрементальной синхронизации черного списка ботом
+CREATE INDEX IF NOT EXISTS idx_antispam_blacklist_added_at ON antispam_blacklist(added_at);
 
 -- Экономика: Койны
 CREATE TABLE IF NOT EXISTS economy (
@@ -208,12 +227,275 @@ CREATE TABLE IF NOT EXISTS catalog_chats (
     created_at TIMESTAMPTZ DEFAULT NOW()
 );
 
+-- Отложенные события (истечение приглашений на дуэль, предложений брака).
+-- Срабатывают и после перезапуска бота, строку забирает один процесс (claim_timers)
+CREATE TABLE IF NOT EXISTS timers (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    chat_id BIGINT,
+    fire_at TIMESTAMPTZ NOT NULL,
+    payload JSONB DEFAULT '{}'::jsonb
+);
+CREATE INDEX IF NOT EXISTS idx_timers_fire_at ON timers(fire_at);
+
+-- ===== Функции (вызываются через PostgREST rpc) =====
+
+-- Пакетный сброс активности: прибавляет счетчики за день и обновляет время последнего сообщения.
+-- p_rows: [{"user_id": 1, "date": "2024-01-01", "count": 5, "last_message": "2024-01-01T12:00:00+00:00"}, ...]
+CREATE OR REPLACE FUNCTION flush_activity(p_rows JSONB)
+RETURNS VOID
+LANGUAGE sql
+AS $$
+    INSERT INTO activity_stats (user_id, date, count)
+    SELECT (r->>'user_id')::BIGINT, (r->>'date')::DATE, (r->>'count')::INT
+    FROM jsonb_array_elements(p_rows) AS r
+    ON CONFLICT (user_id, date) DO UPDATE
+        SET count = activity_stats.count + EXCLUDED.count;
+
+    INSERT INTO activity_totals (user_id, total)
+    SELECT (r->>'user_id')::BIGINT, SUM((r->>'count')::INT)
+    FROM jsonb_array_elements(p_rows) AS r
+    GROUP BY 1
+    ON CONFLICT (user_id) DO UPDATE
+        SET total = activity_totals.total + EXCLUDED.total;
+
+    INSERT INTO users (user_id, last_message)
+    SELECT (r->>'user_id')::BIGINT, MAX((r->>'last_message')::TIMESTAMPTZ)
+    FROM jsonb_array_elements(p_rows) AS r
+    GROUP BY 1
+    ON CONFLICT (user_id) DO UPDATE
+        SET last_message = GREATEST(users.last_message, EXCLUDED.last_message);
+$$;
+
+-- Атомарное изменение репутации. Возвращает обновленную запись.
+CREATE OR REPLACE FUNCTION increment_reputation(p_chat_id BIGINT, p_user_id BIGINT, p_delta INT)
+RETURNS JSONB
+LANGUAGE sql
+AS $$
+    INSERT INTO reputation AS r (chat_id, user_id, points, plus_count, minus_count)
+    VALUES (p_chat_id, p_user_id, p_delta, (p_delta > 0)::INT, (p_delta < 0)::INT)
+    ON CONFLICT (chat_id, user_id) DO UPDATE SET
+        points = r.points + EXCLUDED.points,
+        plus_count = r.plus_count + EXCLUDED.plus_count,
+        minus_count = r.minus_count + EXCLUDED.minus_count
+    RETURNING to_jsonb(r.*);
+$$;
+
+-- Атомарное изменение баланса пользователя. Возвращает новый баланс.
+CREATE OR REPLACE FUNCTION increment_user_balance(p_user_id BIGINT, p_amount BIGINT)
+RETURNS BIGINT
+LANGUAGE sql
+AS $$
+    INSERT INTO economy AS e (user_id, coins)
+    VALUES (p_user_id, p_amount)
+    ON CONFLICT (user_id) DO UPDATE SET coins = e.coins + EXCLUDED.coins
+    RETURNING e.coins;
+$$;
+
+-- Перевод койнов одной транзакцией: списание и зачисление, баланс не уходит в минус.
+CREATE OR REPLACE FUNCTION transfer_coins(p_from_id BIGINT, p_to_id BIGINT, p_amount BIGINT)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF p_amount <= 0 OR p_from_id = p_to_id THEN
+        RETURN FALSE;
+    END IF;
+
+    UPDATE economy SET coins = coins - p_amount
+    WHERE user_id = p_from_id AND coins >= p_amount;
+    IF NOT FOUND THEN
+        RETURN FALSE;
+    END IF;
+
+    INSERT INTO economy AS e (user_id, coins)
+    VALUES (p_to_id, p_amount)
+    ON CONFLICT (user_id) DO UPDATE SET coins = e.coins + EXCLUDED.coins;
+
+    RETURN TRUE;
+END;
+$$;
+
+-- Атомарное изменение баланса чата (не ниже нуля). Возвращает новый баланс.
+CREATE OR REPLACE FUNCTION increment_chat_balance(p_chat_id BIGINT, p_amount BIGINT)
+RETURNS BIGINT
+LANGUAGE sql
+AS $$
+    INSERT INTO chat_economy AS c (chat_id, coins)
+    VALUES (p_chat_id, GREATEST(0, p_amount))
+    ON CONFLICT (chat_id) DO UPDATE SET coins = GREATEST(0, c.coins + p_amount)
+    RETURNING c.coins;
+$$;
+
+-- Начисление опыта с повышением уровней и выдачей койнов за каждый уровень.
+-- Формулы должны совпадать с _xp_for_level и _coins_for_level в db_manager.py.
+CREATE OR REPLACE FUNCTION add_user_xp(p_user_id BIGINT, p_amount BIGINT)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_level INT;
+    v_xp BIGINT;
+    v_reward BIGINT;
+    v_total_reward BIGINT := 0;
+    v_leveled_up JSONB := '[]'::jsonb;
+BEGIN
+    INSERT INTO user_levels (user_id) VALUES (p_user_id)
+    ON CONFLICT (user_id) DO NOTHING;
+
+    SELECT level, xp INTO v_level, v_xp
+    FROM user_levels WHERE user_id = p_user_id
+    FOR UPDATE;
+
+    v_xp := v_xp + GREATEST(p_amount, 0);
+
+    WHILE v_xp >= 50 + v_level * 25 LOOP
+        v_xp := v_xp - (50 + v_level * 25);
+        v_level := v_level + 1;
+        v_reward := 100 * v_level;
+        v_total_reward := v_total_reward + v_reward;
+        v_leveled_up := v_leveled_up || jsonb_build_object('level', v_level, 'reward', v_reward);
+    END LOOP;
+
+    UPDATE user_levels SET level = v_level, xp = v_xp, updated_at = NOW()
+    WHERE user_id = p_user_id;
+
+    IF v_total_reward > 0 THEN
+        INSERT INTO economy AS e (user_id, coins)
+        VALUES (p_user_id, v_total_reward)
+        ON CONFLICT (user_id) DO UPDATE SET coins = e.coins + EXCLUDED.coins;
+    END IF;
+
+    RETURN jsonb_build_object(
+        'level', v_level,
+        'xp', v_xp,
+        'leveled_up', v_leveled_up,
+        'total_reward_coins', v_total_reward
+    );
+END;
+$$;
+
+-- Атомарный учет взаимодействия в отношениях. Возвращает обновленную запись.
+CREATE OR REPLACE FUNCTION increment_relationship(p_user1_id BIGINT, p_user2_id BIGINT, p_action TEXT)
+RETURNS JSONB
+LANGUAGE sql
+AS $$
+    INSERT INTO relationships AS r (user1_id, user2_id, total_interactions, last_interaction, actions)
+    VALUES (LEAST(p_user1_id, p_user2_id), GREATEST(p_user1_id, p_user2_id), 1, NOW(), jsonb_build_object(p_action, 1))
+    ON CONFLICT (user1_id, user2_id) DO UPDATE SET
+        total_interactions = r.total_interactions + 1,
+        last_interaction = NOW(),
+        actions = r.actions || jsonb_build_object(p_action, COALESCE((r.actions->>p_action)::INT, 0) + 1)
+    RETURNING to_jsonb(r.*);
+$$;
+
+-- Все данные профиля одним запросом: пользователь, ранг и кастомные названия рангов чата,
+-- брак с данными партнера, награды, репутация, баланс, клан, кружки и активность за p_days дней.
+CREATE OR REPLACE FUNCTION get_profile(p_chat_id BIGINT, p_user_id BIGINT, p_days INT DEFAULT 30)
+RETURNS JSONB
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT jsonb_build_object(
+        'user', (SELECT to_jsonb(u.*) FROM users u WHERE u.user_id = p_user_id),
+        'rank_level', (
+            SELECT cm.rank FROM chat_members cm
+            WHERE cm.chat_id = p_chat_id AND cm.user_id = p_user_id
+        ),
+        'rank_names', (
+            SELECT jsonb_object_agg(gr.rank_number, gr.name_nom) FROM group_ranks gr
+            WHERE gr.chat_id = p_chat_id
+        ),
+        'marriage', (
+            SELECT jsonb_build_object(
+                'user1_id', m.user1_id,
+                'user2_id', m.user2_id,
+                'created_at', m.created_at,
+                'partner', (
+                    SELECT jsonb_build_object('nickname', pu.nickname, 'username', pu.username, 'full_name', pu.full_name)
+                    FROM users pu
+                    WHERE pu.user_id = CASE WHEN m.user1_id = p_user_id THEN m.user2_id ELSE m.user1_id END
+                )
+            )
+            FROM marriages m
+            WHERE m.user1_id = p_user_id OR m.user2_id = p_user_id
+            LIMIT 1
+        ),
+        'has_awards', EXISTS (
+            SELECT 1 FROM awards a WHERE a.chat_id = p_chat_id AND a.user_id = p_user_id
+        ),
+        'reputation', (
+            SELECT jsonb_build_object('points', r.points, 'plus_count', r.plus_count, 'minus_count', r.minus_count)
+            FROM reputation r WHERE r.chat_id = p_chat_id AND r.user_id = p_user_id
+        ),
+        'balance', COALESCE((SELECT e.coins FROM economy e WHERE e.user_id = p_user_id), 0),
+        'clan', (
+            SELECT to_jsonb(c.*) FROM clan_members cm JOIN clans c ON c.id = cm.clan_id
+            WHERE cm.chat_id = p_chat_id AND cm.user_id = p_user_id
+            LIMIT 1
+        ),
+        'clubs', COALESCE((
+            SELECT jsonb_agg(to_jsonb(c.*) ORDER BY c.created_at) FROM club_members cm JOIN clubs c ON c.id = cm.club_id
+            WHERE cm.chat_id = p_chat_id AND cm.user_id = p_user_id
+        ), '[]'::jsonb),
+        'activity', COALESCE((
+            SELECT jsonb_agg(jsonb_build_object('date', s.date, 'count', s.count) ORDER BY s.date)
+            FROM activity_stats s
+            WHERE s.user_id = p_user_id AND s.date > (NOW() AT TIME ZONE 'UTC')::DATE - p_days
+        ), '[]'::jsonb),
+        'activity_total', COALESCE((SELECT t.total FROM activity_totals t WHERE t.user_id = p_user_id), 0)
+    );
+$$;
+
+-- Забирает сработавшие таймеры: удаляет и возвращает удаленные строки.
+-- Если несколько процессов забирают одни и те же ключи, каждую строку получит только один
+CREATE OR REPLACE FUNCTION claim_timers(p_keys TEXT[])
+RETURNS SETOF timers
+LANGUAGE sql
+AS $$
+    DELETE FROM timers WHERE key = ANY(p_keys) RETURNING *;
+$$;
+
+-- Удаляет истекшие муты, баны и варны: из каждой таблицы не больше p_limit строк
+-- с самым ранним until (проход по частичному индексу). Возвращает число удаленных строк
+CREATE OR REPLACE FUNCTION sweep_expired_punishments(p_limit INT DEFAULT 1000)
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_total INT := 0;
+    v_count INT;
+BEGIN
+    DELETE FROM mutes WHERE ctid IN (
+        SELECT ctid FROM mutes WHERE until <= NOW() ORDER BY until LIMIT p_limit
+    );
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    v_total := v_total + v_count;
+
+    DELETE FROM bans WHERE ctid IN (
+        SELECT ctid FROM bans WHERE until <= NOW() ORDER BY until LIMIT p_limit
+    );
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    v_total := v_total + v_count;
+
+    DELETE FROM warns WHERE id IN (
+        SELECT id FROM warns WHERE until <= NOW() ORDER BY until LIMIT p_limit
+    );
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    v_total := v_total + v_count;
+
+    RETURN v_total;
+END;
+$$;
+
 -- ВАЖНО: Отключите RLS для этих таблиц в Supabase SQL Editor, если возникают ошибки 42501:
 -- ALTER TABLE chat_economy DISABLE ROW LEVEL SECURITY;
 -- ALTER TABLE catalog_categories DISABLE ROW LEVEL SECURITY;
 -- ALTER TABLE catalog_chats DISABLE ROW LEVEL SECURITY;
 -- ALTER TABLE antispam_reports DISABLE ROW LEVEL SECURITY;
 -- ALTER TABLE antispam_blacklist DISABLE ROW LEVEL SECURITY;
+-- ALTER TABLE activity_totals DISABLE ROW LEVEL SECURITY;
+-- ALTER TABLE timers DISABLE ROW LEVEL SECURITY;
 -- ALTER TABLE economy DISABLE ROW LEVEL SECURITY;
 -- ALTER TABLE group_ranks DISABLE ROW LEVEL SECURITY;
 -- ALTER TABLE group_settings DISABLE ROW LEVEL SECURITY;